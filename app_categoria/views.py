@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Categoria
 from .forms import CategoriaForm
+from biblioteca.pagination import paginar
 from biblioteca.decorators import funcionario_or_leitor_required, funcionario_required
 
 @login_required
@@ -10,12 +11,15 @@ from biblioteca.decorators import funcionario_or_leitor_required, funcionario_re
 def categoria_list(request):
     search = request.GET.get('search', '')
     if search:
-        categorias = Categoria.objects.filter(nome__icontains=search).order_by('nome')
+        categorias = Categoria.objects.filter(nome__icontains=search)
     else:
-        categorias = Categoria.objects.all().order_by('nome')
+        categorias = Categoria.objects.all()
+    
+    pagina = paginar(request, categorias, ['nome'])
     
     context = {
-        'categorias': categorias,
+        'categorias': pagina.object_list,
+        'pagina': pagina,
         'search': search
     }
     return render(request, 'app_categoria/list.html', context)
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import ResumoDiario
 
-# Register your models here.
+@admin.register(ResumoDiario)
+class ResumoDiarioAdmin(admin.ModelAdmin):
+    list_display = ('dia', 'dimensao', 'chave', 'emprestimos', 'renovacoes', 'devolucoes', 'devolucoes_atrasadas', 'multas')
+    list_filter = ('dimensao',)
+    date_hierarchy = 'dia'
@@ -0,0 +1,98 @@
+"""
+Contadores do balcão ao vivo (empréstimos ativos, atrasados e livros
+disponíveis), enviados por server-sent events (views.eventos).
+
+Cada empréstimo, devolução ou renovação envia circulacao_alterada
+(app_emprestimo.signals); depois do commit, os totais são lidos uma vez
+(totais.obter) e distribuídos pelo transmissor a todas as conexões abertas
+neste processo. As abas abertas não consultam o banco a cada evento: o
+custo é um cálculo por alteração, não por aba.
+
+O transmissor padrão é em memória e só alcança as conexões do próprio
+processo; testes (ou outro meio de distribuição) trocam o objeto do módulo
+por outro com os mesmos métodos (veja TransmissorLocal).
+"""
+import asyncio
+import threading
+
+from . import totais
+
+CAMPOS = ('emprestimos_ativos', 'emprestimos_atrasados', 'livros_disponiveis')
+
+# Mensagens guardadas por conexão; uma conexão lenta só precisa da mais recente
+MENSAGENS_POR_CONEXAO = 10
+
+
+class Transmissor:
+    """Distribui mensagens às conexões abertas (filas asyncio) deste processo"""
+
+    def __init__(self):
+        self._filas = {}
+        self._trava = threading.Lock()
+        self._ultima = None
+
+    def assinar(self):
+        """Nova fila de mensagens; chamar de dentro do laço de eventos da conexão"""
+        fila = asyncio.Queue(maxsize=MENSAGENS_POR_CONEXAO)
+        with self._trava:
+            self._filas[fila] = asyncio.get_running_loop()
+        return fila
+
+    def cancelar(self, fila):
+        with self._trava:
+            self._filas.pop(fila, None)
+
+    def __len__(self):
+        return len(self._filas)
+
+    def publicar(self, mensagem):
+        """Entrega a mensagem a todas as filas; pode ser chamado de qualquer thread"""
+        with self._trava:
+            if mensagem == self._ultima:
+                return
+            self._ultima = mensagem
+            assinaturas = list(self._filas.items())
+        for fila, laco in assinaturas:
+            laco.call_soon_threadsafe(_entregar, fila, mensagem)
+
+
+class TransmissorLocal:
+    """Substituto para testes: guarda as mensagens publicadas"""
+
+    def __init__(self, assinantes=1):
+        self.assinantes = assinantes
+        self.publicadas = []
+
+    def assinar(self):
+        return asyncio.Queue()
+
+    def cancelar(self, fila):
+        pass
+
+    def __len__(self):
+        return self.assinantes
+
+    def publicar(self, mensagem):
+        self.publicadas.append(mensagem)
+
+
+def _entregar(fila, mensagem):
+    if fila.full():
+        fila.get_nowait()
+    fila.put_nowait(mensagem)
+
+
+transmissor = Transmissor()
+
+
+def contadores():
+    """Contadores enviados às telas (dos totais em cache)"""
+    valores = totais.obter()
+    return {campo: valores[campo] for campo in CAMPOS}
+
+
+def publicar():
+    """Envia os contadores atuais às conexões abertas (nada a fazer sem nenhuma)"""
+    if not len(transmissor):
+        return
+    transmissor.publicar(contadores())
@@ -0,0 +1,184 @@
+import gc
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app_emprestimo.consultas import filtrar_emprestimos
+from app_emprestimo.consultas import para_listagem as emprestimos_para_listagem
+from app_emprestimo.models import Emprestimo
+from app_funcionario.consultas import filtrar_funcionarios
+from app_funcionario.consultas import para_listagem as funcionarios_para_listagem
+from app_funcionario.models import Funcionario
+from app_leitor.consultas import filtrar_leitores
+from app_leitor.consultas import para_listagem as leitores_para_listagem
+from app_leitor.models import Leitor
+from app_livro.models import Livro
+
+POR_BLOCO = 10000
+
+
+def _leitores(linhas):
+    leitores, ordem = filtrar_leitores({})
+    completo = leitores.order_by(*ordem, 'pk')[:linhas]
+    enxuto = leitores_para_listagem(leitores).order_by(*ordem, 'pk')[:linhas]
+    return completo, enxuto
+
+
+def _funcionarios(linhas):
+    funcionarios, ordem = filtrar_funcionarios({})
+    completo = funcionarios.order_by(*ordem, 'pk')[:linhas]
+    enxuto = funcionarios_para_listagem(funcionarios).order_by(*ordem, 'pk')[:linhas]
+    return completo, enxuto
+
+
+def _emprestimos(linhas):
+    # Como a listagem fazia antes: instâncias com livro, leitor e funcionário
+    emprestimos, ordem = filtrar_emprestimos({})
+    completo = emprestimos.select_related('livro', 'leitor', 'emprestado_por').order_by(*ordem, 'pk')[:linhas]
+    enxuto = emprestimos_para_listagem(emprestimos).order_by(*ordem, 'pk')[:linhas]
+    return completo, enxuto
+
+
+LISTAGENS = {
+    'leitores': _leitores,
+    'funcionarios': _funcionarios,
+    'emprestimos': _emprestimos,
+}
+
+
+def _inserir_herdeiros(modelo, usuarios, objetos):
+    """
+    Grava as linhas filhas de modelos que herdam de User (bulk_create não
+    aceita herança multi-tabela): auth_user em lote e depois a tabela do modelo.
+    """
+    User.objects.bulk_create(usuarios)
+    campos = modelo._meta.local_concrete_fields
+    for usuario, objeto in zip(usuarios, objetos):
+        objeto.user_ptr_id = usuario.pk
+    colunas = ', '.join(connection.ops.quote_name(campo.column) for campo in campos)
+    marcadores = ', '.join(['%s'] * len(campos))
+    valores = [
+        [campo.get_db_prep_save(campo.pre_save(objeto, True), connection) for campo in campos]
+        for objeto in objetos
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {connection.ops.quote_name(modelo._meta.db_table)} ({colunas}) VALUES ({marcadores})',
+            valores,
+        )
+
+
+def _gerar(quantidade):
+    """Leitores, funcionários e empréstimos sintéticos (desfeitos ao final)"""
+    senha = make_password('benchmark')
+
+    def usuario(prefixo, numero):
+        return User(
+            username=f'{prefixo}{numero}', password=senha, first_name=f'Nome{numero}',
+            last_name=f'Sobrenome{numero}', email=f'{prefixo}{numero}@exemplo.org',
+        )
+
+    usuarios = [usuario('bench_leitor_', numero) for numero in range(quantidade)]
+    leitores = [
+        Leitor(
+            cpf=f'{numero:011d}', telefone='11999990000', endereco=f'Rua {numero}, 100 - Centro',
+            data_nascimento=date(1990, 1, 1), nome_normalizado=f'nome{numero} sobrenome{numero}',
+        )
+        for numero in range(quantidade)
+    ]
+    _inserir_herdeiros(Leitor, usuarios, leitores)
+
+    usuarios = [usuario('bench_funcionario_', numero) for numero in range(quantidade)]
+    funcionarios = [
+        Funcionario(
+            cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+            nome_normalizado=f'nome{numero} sobrenome{numero}',
+        )
+        for numero in range(quantidade)
+    ]
+    _inserir_herdeiros(Funcionario, usuarios, funcionarios)
+
+    livros = Livro.objects.bulk_create(
+        Livro(titulo=f'Livro {numero}', autor=f'Autor {numero}', ano=2000, genero='Romance')
+        for numero in range(quantidade)
+    )
+    hoje = date.today()
+    # Encerrados, para não esbarrar no limite de um empréstimo aberto por livro
+    Emprestimo.objects.bulk_create((
+        Emprestimo(
+            livro=livro, leitor_id=leitor.user_ptr_id, emprestado_por_id=funcionario.user_ptr_id,
+            data_devolucao_prevista=hoje - timedelta(days=7), data_devolucao=hoje - timedelta(days=numero % 14),
+        )
+        for numero, (livro, leitor, funcionario) in enumerate(zip(livros, leitores, funcionarios))
+    ), batch_size=2000)
+
+
+def _medir(queryset, repeticoes):
+    """(linhas, melhor tempo em s, memória retida e pico em bytes) para materializar o queryset"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        list(queryset.all())
+        tempos.append(time.perf_counter() - inicio)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        linhas = list(queryset.all())
+        retida, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(linhas), min(tempos), retida, pico
+
+
+class Command(BaseCommand):
+    help = ('Compara, por 10 mil linhas, tempo e memória das listagens com instâncias completas '
+            'e com as linhas enxutas (para_listagem)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('listagens', nargs='*',
+                            help=f'Listagens a medir: {", ".join(sorted(LISTAGENS))} (padrão: todas)')
+        parser.add_argument('--linhas', type=int, default=POR_BLOCO,
+                            help='Linhas lidas de cada listagem')
+        parser.add_argument('--repeticoes', type=int, default=5,
+                            help='Execuções cronometradas (vale a mais rápida)')
+        parser.add_argument('--gerar', type=int, default=0,
+                            help='Cria N leitores, funcionários e empréstimos sintéticos, desfeitos ao final')
+
+    def handle(self, *args, **options):
+        desconhecidas = set(options['listagens']) - set(LISTAGENS)
+        if desconhecidas:
+            raise CommandError(f'Listagem desconhecida: {", ".join(sorted(desconhecidas))}')
+        with transaction.atomic():
+            if options['gerar']:
+                _gerar(options['gerar'])
+            for nome in options['listagens'] or sorted(LISTAGENS):
+                self._comparar(nome, *LISTAGENS[nome](options['linhas']), options['repeticoes'])
+            # Nada do que foi gerado fica no banco
+            transaction.set_rollback(True)
+
+    def _comparar(self, nome, completo, enxuto, repeticoes):
+        resultados = {'completo': _medir(completo, repeticoes), 'enxuto': _medir(enxuto, repeticoes)}
+        linhas = resultados['completo'][0]
+        if not linhas:
+            self.stdout.write(self.style.WARNING(f'{nome}: nenhuma linha (use --gerar)'))
+            return
+        escala = POR_BLOCO / linhas
+        if linhas < POR_BLOCO // 10:
+            self.stdout.write(self.style.WARNING(f'{nome}: só {linhas} linhas, a projeção é imprecisa (use --gerar)'))
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{nome} ({linhas} linhas; valores por {POR_BLOCO} linhas)'))
+        for modo, (_, tempo, retida, pico) in resultados.items():
+            self.stdout.write(
+                f'  {modo:<9} {tempo * escala * 1000:9.1f} ms  '
+                f'{retida * escala / 2**20:8.2f} MB retidos  {pico * escala / 2**20:8.2f} MB de pico'
+            )
+        _, tempo_completo, retida_completo, _ = resultados['completo']
+        _, tempo_enxuto, retida_enxuto, _ = resultados['enxuto']
+        self.stdout.write(self.style.SUCCESS(
+            f'  enxuto: {tempo_completo / tempo_enxuto:.1f}x mais rápido, '
+            f'{retida_completo / max(retida_enxuto, 1):.1f}x menos memória'
+        ))
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_dashboard import resumos
+
+
+class Command(BaseCommand):
+    help = 'Gera os resumos diários de circulação dos dias completos desde a última execução (rodar diariamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Reprocessa a partir desta data AAAA-MM-DD, ignorando a marca d\'água')
+        parser.add_argument('--ate', help='Último dia a resumir AAAA-MM-DD (padrão: ontem)')
+        parser.add_argument('--dias-por-bloco', type=int, default=resumos.DIAS_POR_BLOCO)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else None
+            ate = date.fromisoformat(options['ate']) if options['ate'] else None
+        except ValueError as erro:
+            raise CommandError(f'Data inválida: {erro}')
+        dias, gravados = resumos.processar(
+            desde=desde, ate=ate,
+            dias_por_bloco=options['dias_por_bloco'], batch_size=options['batch_size'],
+        )
+        if not dias:
+            self.stdout.write('Nenhum dia novo para resumir.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{dias} dias resumidos ({gravados} resumos) até {resumos.marca_dagua()}.'
+        ))
@@ -0,0 +1,71 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from app_emprestimo.consultas import COLUNAS_EXPORTACAO as COLUNAS_EMPRESTIMOS
+from app_emprestimo.consultas import filtrar_emprestimos, para_exportacao
+from app_leitor.consultas import COLUNAS_EXPORTACAO as COLUNAS_LEITORES
+from app_leitor.consultas import filtrar_leitores
+from app_livro.consultas import COLUNAS_EXPORTACAO as COLUNAS_LIVROS
+from app_livro.consultas import filtrar_livros
+from biblioteca.exportacao import CHUNK_SIZE, gerar, linhas
+
+
+def _livros(params):
+    livros, ordem = filtrar_livros(params)
+    return livros.order_by(*ordem, 'pk'), COLUNAS_LIVROS
+
+
+def _leitores(params):
+    leitores, ordem = filtrar_leitores(params)
+    return leitores.order_by(*ordem, 'pk'), COLUNAS_LEITORES
+
+
+def _emprestimos(params):
+    emprestimos, ordem = filtrar_emprestimos(params)
+    return para_exportacao(emprestimos).order_by(*ordem, 'pk'), COLUNAS_EMPRESTIMOS
+
+
+# Os mesmos parâmetros de filtro das listagens (inclusive as facetas do acervo)
+PARAMETROS = ('search', 'categoria', 'genero', 'editora', 'decada', 'disponivel', 'status', 'ordem')
+
+TABELAS = {
+    'livros': _livros,
+    'leitores': _leitores,
+    'emprestimos': _emprestimos,
+}
+
+
+class Command(BaseCommand):
+    help = 'Exporta livros, leitores ou empréstimos em CSV/JSONL com os mesmos filtros das listagens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tabela', choices=sorted(TABELAS))
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: saída padrão)')
+        parser.add_argument('--search', default='')
+        parser.add_argument('--categoria', default='', help='Id da categoria; apenas para livros')
+        parser.add_argument('--genero', default='', help='Apenas para livros')
+        parser.add_argument('--editora', default='', help='Apenas para livros')
+        parser.add_argument('--decada', default='', help='Ano inicial da década (ex.: 1990); apenas para livros')
+        parser.add_argument('--disponivel', default='', choices=['', '0', '1'], help='Apenas para livros')
+        parser.add_argument('--status', default='', choices=['', 'ativo', 'atrasado', 'devolvido'],
+                            help='Apenas para empréstimos')
+        parser.add_argument('--ordem', default='', choices=['', 'recentes', 'atraso', 'multa'],
+                            help='Apenas para empréstimos')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        params = {chave: options[chave] for chave in PARAMETROS}
+        queryset, colunas = TABELAS[options['tabela']](params)
+        cabecalho = [titulo for titulo, _ in colunas]
+        conteudo = gerar(options['formato'], cabecalho, linhas(queryset, colunas, options['chunk_size']))
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+                for bloco in conteudo:
+                    arquivo.write(bloco)
+            self.stderr.write(self.style.SUCCESS(f'Exportação gravada em {options["saida"]}'))
+        else:
+            for bloco in conteudo:
+                sys.stdout.write(bloco)
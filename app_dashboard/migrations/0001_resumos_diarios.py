@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessamentoResumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ate', models.DateField()),
+                ('processado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Processamento de resumos',
+                'verbose_name_plural': 'Processamentos de resumos',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('dimensao', models.CharField(choices=[('categoria', 'Categoria'), ('funcionario', 'Funcionário'), ('hora', 'Hora do empréstimo')], max_length=20)),
+                ('chave', models.PositiveIntegerField()),
+                ('emprestimos', models.PositiveIntegerField(default=0)),
+                ('renovacoes', models.PositiveIntegerField(default=0)),
+                ('devolucoes', models.PositiveIntegerField(default=0)),
+                ('devolucoes_atrasadas', models.PositiveIntegerField(default=0)),
+                ('multas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Resumo diário',
+                'verbose_name_plural': 'Resumos diários',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumodiario',
+            constraint=models.UniqueConstraint(fields=('dimensao', 'dia', 'chave'), name='resumo_dimensao_dia_chave'),
+        ),
+    ]
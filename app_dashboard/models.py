@@ -1 +1,48 @@
 from django.db import models
+
+class ResumoDiario(models.Model):
+    """
+    Totais de circulação de um dia por categoria do livro, por funcionário
+    (emprestado_por) ou por hora do empréstimo, gerados pelo comando
+    build_daily_rollups. A página de análises lê só esta tabela.
+    """
+    DIMENSAO_CATEGORIA = 'categoria'
+    DIMENSAO_FUNCIONARIO = 'funcionario'
+    DIMENSAO_HORA = 'hora'
+    DIMENSOES = [
+        (DIMENSAO_CATEGORIA, 'Categoria'),
+        (DIMENSAO_FUNCIONARIO, 'Funcionário'),
+        (DIMENSAO_HORA, 'Hora do empréstimo'),
+    ]
+
+    dia = models.DateField()
+    dimensao = models.CharField(max_length=20, choices=DIMENSOES)
+    # Id da categoria ou do funcionário (0 = sem categoria/sem funcionário) ou a hora (0 a 23)
+    chave = models.PositiveIntegerField()
+    emprestimos = models.PositiveIntegerField(default=0)
+    renovacoes = models.PositiveIntegerField(default=0)
+    devolucoes = models.PositiveIntegerField(default=0)
+    devolucoes_atrasadas = models.PositiveIntegerField(default=0)
+    multas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.dia} {self.dimensao}={self.chave}"
+
+    class Meta:
+        verbose_name = 'Resumo diário'
+        verbose_name_plural = 'Resumos diários'
+        constraints = [
+            models.UniqueConstraint(fields=['dimensao', 'dia', 'chave'], name='resumo_dimensao_dia_chave'),
+        ]
+
+class ProcessamentoResumo(models.Model):
+    """Marca d'água do build_daily_rollups: dias até `ate` já estão resumidos"""
+    ate = models.DateField()
+    processado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Resumos até {self.ate}"
+
+    class Meta:
+        verbose_name = 'Processamento de resumos'
+        verbose_name_plural = 'Processamentos de resumos'
@@ -0,0 +1,145 @@
+"""
+Resumos diários de circulação (tabela ResumoDiario) e as consultas da
+página de análises, que leem só os resumos.
+
+O comando build_daily_rollups processa os dias completos desde a última
+marca d'água (ProcessamentoResumo), em blocos de dias: para cada bloco, três
+consultas agrupadas sobre o histórico (tabela viva e arquivo, pela visão
+EmprestimoHistorico) e a regravação dos resumos do bloco numa transação.
+
+Eventos de cada dia:
+- empréstimo: empréstimo original criado no dia;
+- renovação: renovação criada no dia;
+- devolução: empréstimo encerrado no dia sem ter sido renovado (atrasada se
+  depois da data prevista); multas somam a multa dos encerrados no dia.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, IntegerField, Min, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate, TruncMonth
+from django.utils import timezone
+
+from app_emprestimo.models import EmprestimoHistorico
+from .models import ProcessamentoResumo, ResumoDiario
+
+DIAS_POR_BLOCO = 31
+
+CHAVES = {
+    ResumoDiario.DIMENSAO_CATEGORIA: Coalesce('livro__categoria_id', Value(0), output_field=IntegerField()),
+    ResumoDiario.DIMENSAO_FUNCIONARIO: Coalesce('emprestado_por_id', Value(0), output_field=IntegerField()),
+}
+METRICAS = ('emprestimos', 'renovacoes', 'devolucoes', 'devolucoes_atrasadas', 'multas')
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _novo():
+    return {'emprestimos': 0, 'renovacoes': 0, 'devolucoes': 0, 'devolucoes_atrasadas': 0, 'multas': Decimal('0.00')}
+
+
+def calcular(inicio, fim):
+    """Resumos dos dias de `inicio` a `fim` (inclusive): {(dimensao, dia, chave): métricas}"""
+    resumos = defaultdict(_novo)
+    historico = EmprestimoHistorico.objects.order_by()
+
+    criados = historico.filter(
+        data_emprestimo__gte=_inicio_do_dia(inicio),
+        data_emprestimo__lt=_inicio_do_dia(fim + timedelta(days=1)),
+    ).annotate(dia=TruncDate('data_emprestimo'))
+    contagens = {
+        'emprestimos': Count('pk', filter=Q(renovacao__isnull=True)),
+        'renovacoes': Count('pk', filter=Q(renovacao__isnull=False)),
+    }
+    agrupamentos = dict(CHAVES, **{ResumoDiario.DIMENSAO_HORA: ExtractHour('data_emprestimo')})
+    for dimensao, chave in agrupamentos.items():
+        for linha in criados.annotate(chave=chave).values('dia', 'chave').annotate(**contagens):
+            resumo = resumos[(dimensao, linha['dia'], linha['chave'])]
+            resumo['emprestimos'] += linha['emprestimos']
+            resumo['renovacoes'] += linha['renovacoes']
+
+    encerrados = historico.filter(data_devolucao__gte=inicio, data_devolucao__lte=fim).annotate(
+        renovado=Exists(EmprestimoHistorico.objects.filter(renovacao=OuterRef('pk'))),
+    )
+    devolvido = Q(renovado=False)
+    for dimensao, chave in CHAVES.items():
+        for linha in encerrados.annotate(chave=chave).values('data_devolucao', 'chave').annotate(
+            devolucoes=Count('pk', filter=devolvido),
+            devolucoes_atrasadas=Count('pk', filter=devolvido & Q(data_devolucao__gt=F('data_devolucao_prevista'))),
+            multas=Sum('multa'),
+        ):
+            resumo = resumos[(dimensao, linha['data_devolucao'], linha['chave'])]
+            resumo['devolucoes'] += linha['devolucoes']
+            resumo['devolucoes_atrasadas'] += linha['devolucoes_atrasadas']
+            resumo['multas'] += Decimal(linha['multas'] or 0)
+    return resumos
+
+
+def marca_dagua():
+    """Último dia já resumido (None se nunca rodou)"""
+    ultimo = ProcessamentoResumo.objects.order_by('-ate', '-pk').first()
+    return ultimo.ate if ultimo else None
+
+
+def processar(desde=None, ate=None, dias_por_bloco=DIAS_POR_BLOCO, batch_size=2000):
+    """
+    Resume os dias completos depois da marca d'água (ou a partir de `desde`,
+    para reprocessar) até `ate` (padrão: ontem). Retorna (dias, resumos gravados).
+    """
+    ate = ate or timezone.localdate() - timedelta(days=1)
+    if desde is None:
+        marca = marca_dagua()
+        if marca is not None:
+            desde = marca + timedelta(days=1)
+        else:
+            primeiro = EmprestimoHistorico.objects.aggregate(primeiro=Min('data_emprestimo'))['primeiro']
+            desde = timezone.localdate(primeiro) if primeiro else ate
+    if desde > ate:
+        return 0, 0
+
+    gravados = 0
+    inicio = desde
+    while inicio <= ate:
+        fim = min(inicio + timedelta(days=dias_por_bloco - 1), ate)
+        resumos = calcular(inicio, fim)
+        with transaction.atomic():
+            ResumoDiario.objects.filter(dia__gte=inicio, dia__lte=fim).delete()
+            ResumoDiario.objects.bulk_create((
+                ResumoDiario(dimensao=dimensao, dia=dia, chave=chave, **metricas)
+                for (dimensao, dia, chave), metricas in resumos.items()
+            ), batch_size=batch_size)
+            ProcessamentoResumo.objects.create(ate=fim)
+        gravados += len(resumos)
+        inicio = fim + timedelta(days=1)
+    return (ate - desde).days + 1, gravados
+
+
+def por_dia(desde, dimensao=ResumoDiario.DIMENSAO_CATEGORIA):
+    """Totais por dia a partir de `desde` (cada dimensão soma o dia inteiro)"""
+    return (ResumoDiario.objects
+            .filter(dimensao=dimensao, dia__gte=desde)
+            .values('dia')
+            .annotate(**{metrica: Sum(metrica) for metrica in METRICAS})
+            .order_by('dia'))
+
+
+def por_mes(desde, dimensao=ResumoDiario.DIMENSAO_CATEGORIA):
+    return (ResumoDiario.objects
+            .filter(dimensao=dimensao, dia__gte=desde)
+            .annotate(mes=TruncMonth('dia'))
+            .values('mes')
+            .annotate(**{metrica: Sum(metrica) for metrica in METRICAS})
+            .order_by('mes'))
+
+
+def por_chave(dimensao, desde):
+    """Totais do período por categoria, funcionário ou hora"""
+    return (ResumoDiario.objects
+            .filter(dimensao=dimensao, dia__gte=desde)
+            .values('chave')
+            .annotate(**{metrica: Sum(metrica) for metrica in METRICAS})
+            .order_by('chave'))
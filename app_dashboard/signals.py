@@ -0,0 +1,29 @@
+"""
+Sinais que mantêm os totais do painel em cache (totais.py). Livro e
+Emprestimo já invalidam pela versão do catálogo (app_livro.facetas), que só
+muda depois do commit.
+Alterações de circulação também atualizam os contadores ao vivo (ao_vivo.py).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app_emprestimo.signals import circulacao_alterada
+from app_leitor.models import Leitor
+from . import ao_vivo, totais
+
+
+@receiver(post_save, sender=Leitor)
+@receiver(post_delete, sender=Leitor)
+def invalidar_totais(sender, raw=False, **kwargs):
+    if raw:
+        return
+    # Depois do commit, pelo mesmo motivo de facetas.invalidar: apagada antes,
+    # uma leitura concorrente guardaria de novo os totais antigos
+    transaction.on_commit(totais.invalidar)
+
+
+@receiver(circulacao_alterada)
+def publicar_contadores(sender, **kwargs):
+    # Depois do commit, para as telas não verem uma transação desfeita
+    transaction.on_commit(ao_vivo.publicar)
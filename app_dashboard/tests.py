@@ -1,3 +1,251 @@
+import asyncio
+import csv
+import json
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app_emprestimo import balcao
+from app_emprestimo.models import Emprestimo
+from app_funcionario.models import Funcionario
+from app_leitor.models import Leitor
+from app_livro.models import Livro
+from . import ao_vivo, resumos, totais
+
+
+class ContadoresAoVivoTest(TestCase):
+    """Empréstimos e devoluções publicam os contadores do balcão uma vez, depois do commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.funcionario.groups.add(Group.objects.create(name='Funcionarios'))
+        cls.leitor = Leitor.objects.create_user(
+            'leitor', password='senha', first_name='Ana', last_name='Souza',
+            cpf='52998224725', telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+        )
+        cls.livros = [
+            Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000, genero='Romance')
+            for numero in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.transmissor = ao_vivo.TransmissorLocal()
+        substituicao = mock.patch.object(ao_vivo, 'transmissor', self.transmissor)
+        substituicao.start()
+        self.addCleanup(substituicao.stop)
+
+    def test_emprestimo_e_devolucao_publicam_contadores(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            balcao.emprestar(self.livros[0], self.leitor, self.funcionario)
+        self.assertEqual(self.transmissor.publicadas, [
+            {'emprestimos_ativos': 1, 'emprestimos_atrasados': 0, 'livros_disponiveis': 1},
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            balcao.processar_lote(balcao.ACAO_DEVOLVER, [str(self.livros[0].pk)], self.funcionario)
+        self.assertEqual(self.transmissor.publicadas[-1], {
+            'emprestimos_ativos': 0, 'emprestimos_atrasados': 0, 'livros_disponiveis': 2,
+        })
+
+    def test_sem_conexoes_nada_e_consultado(self):
+        self.transmissor.assinantes = 0
+        with self.captureOnCommitCallbacks() as callbacks:
+            balcao.emprestar(self.livros[0], self.leitor, self.funcionario)
+        with CaptureQueriesContext(connection) as consultas:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual(self.transmissor.publicadas, [])
+
+    def test_transmissor_entrega_de_outra_thread(self):
+        async def receber():
+            transmissor = ao_vivo.Transmissor()
+            fila = transmissor.assinar()
+            thread = threading.Thread(target=transmissor.publicar, args=({'emprestimos_ativos': 1},))
+            thread.start()
+            mensagem = await asyncio.wait_for(fila.get(), 1)
+            thread.join()
+            transmissor.cancelar(fila)
+            return mensagem, len(transmissor)
+
+        self.assertEqual(asyncio.run(receber()), ({'emprestimos_ativos': 1}, 0))
+
+
+class ResumosDiariosTest(TestCase):
+    """Os resumos retomam da marca d'água e o reprocessamento não duplica totais"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.leitor = Leitor.objects.create_user(
+            'leitor', password='senha', first_name='Ana', last_name='Souza',
+            cpf='52998224725', telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+        )
+        cls.dia = date(2026, 3, 10)
+
+    def emprestimo(self, numero, dia, devolvido=None, multa='0.00'):
+        livro = Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000, genero='Romance')
+        emprestimo = Emprestimo.objects.create(
+            livro=livro, leitor=self.leitor, emprestado_por=self.funcionario,
+            data_devolucao_prevista=dia + timedelta(days=1), data_devolucao=devolvido, multa=Decimal(multa),
+        )
+        # data_emprestimo é auto_now_add
+        Emprestimo.objects.filter(pk=emprestimo.pk).update(
+            data_emprestimo=timezone.make_aware(datetime.combine(dia, time(10))),
+        )
+        return emprestimo
+
+    def totais(self):
+        return {
+            linha['dia']: (linha['emprestimos'], linha['devolucoes'], linha['devolucoes_atrasadas'], linha['multas'])
+            for linha in resumos.por_dia(self.dia)
+        }
+
+    def test_retoma_da_marca_dagua(self):
+        self.emprestimo(1, self.dia, devolvido=self.dia + timedelta(days=3), multa='0.20')
+        ate = self.dia + timedelta(days=3)
+
+        self.assertEqual(resumos.processar(ate=ate, dias_por_bloco=2)[0], 4)
+        self.assertEqual(resumos.marca_dagua(), ate)
+        self.assertEqual(resumos.processar(ate=ate), (0, 0))
+
+        # Um dia novo só resume o próprio dia
+        self.emprestimo(2, ate + timedelta(days=1))
+        self.assertEqual(resumos.processar(ate=ate + timedelta(days=1)), (1, 3))
+        self.assertEqual(self.totais(), {
+            self.dia: (1, 0, 0, Decimal('0.00')),
+            ate: (0, 1, 1, Decimal('0.20')),
+            ate + timedelta(days=1): (1, 0, 0, Decimal('0.00')),
+        })
+
+    def test_reprocessar_regrava_sem_duplicar(self):
+        emprestimo = self.emprestimo(1, self.dia, devolvido=self.dia, multa='0.00')
+        resumos.processar(ate=self.dia)
+        # Correção no histórico depois do resumo: só --desde a enxerga
+        Emprestimo.objects.filter(pk=emprestimo.pk).update(multa=Decimal('0.50'))
+        self.emprestimo(2, self.dia)
+        self.assertEqual(resumos.processar(ate=self.dia), (0, 0))
+        self.assertEqual(self.totais(), {self.dia: (1, 1, 0, Decimal('0.00'))})
+
+        self.assertEqual(resumos.processar(desde=self.dia, ate=self.dia)[0], 1)
+        self.assertEqual(self.totais(), {self.dia: (2, 1, 0, Decimal('0.50'))})
+        self.assertEqual(resumos.marca_dagua(), self.dia)
+
+
+class TotaisTest(TestCase):
+    """Totais do painel numa consulta, servidos do cache e invalidados depois do commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.leitor = Leitor.objects.create_user(
+            'leitor', password='senha', first_name='Ana', last_name='Souza',
+            cpf='52998224725', telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+        )
+        cls.livros = [
+            Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000, genero='Romance')
+            for numero in range(3)
+        ]
+        emprestimo = balcao.emprestar(cls.livros[0], cls.leitor, cls.funcionario)
+        Emprestimo.objects.filter(pk=emprestimo.pk).update(data_devolucao_prevista=date.today() - timedelta(days=1))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_calcula_numa_consulta_e_serve_do_cache(self):
+        with CaptureQueriesContext(connection) as consultas:
+            valores = totais.obter()
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(valores, {
+            'total_livros': 3, 'livros_disponiveis': 2, 'total_leitores': 1,
+            'emprestimos_ativos': 1, 'emprestimos_atrasados': 1,
+        })
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(totais.obter(), valores)
+        self.assertEqual(len(consultas), 0)
+
+    def test_emprestimo_invalida_depois_do_commit(self):
+        totais.obter()
+        with self.captureOnCommitCallbacks(execute=True):
+            balcao.emprestar(self.livros[1], self.leitor, self.funcionario)
+            # Uma leitura antes do commit não troca o que está em cache
+            self.assertEqual(totais.obter()['emprestimos_ativos'], 1)
+        self.assertEqual(totais.obter()['emprestimos_ativos'], 2)
+
+    def test_leitor_invalida_depois_do_commit(self):
+        totais.obter()
+        with self.captureOnCommitCallbacks(execute=True):
+            Leitor.objects.filter(pk=self.leitor.pk).update(ativo=False)
+            Leitor.objects.get(pk=self.leitor.pk).save()
+            self.assertIsNotNone(cache.get(totais.CHAVE))
+        self.assertEqual(totais.obter()['total_leitores'], 0)
+
+    def test_virada_do_dia_recalcula(self):
+        totais.obter()
+        amanha = timezone.now() + timedelta(days=1)
+        with mock.patch.object(timezone, 'now', return_value=amanha), \
+                CaptureQueriesContext(connection) as consultas:
+            totais.obter()
+        self.assertEqual(len(consultas), 1)
+
+
+class ExportacaoTest(TestCase):
+    """A exportação em streaming repete os filtros das listagens, pela web e pelo export_data"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.funcionario.groups.add(Group.objects.create(name='Funcionarios'))
+        for titulo, ano, genero, editora, disponivel in [
+            ('Dom Casmurro', 1899, 'Romance', 'Garnier', True),
+            ('Quincas Borba', 1891, 'Romance', 'Garnier', False),
+            ('Os Sertões', 1902, 'Ensaio', 'Laemmert', True),
+        ]:
+            Livro.objects.create(titulo=titulo, autor='Autor', ano=ano, genero=genero, editora=editora,
+                                 disponivel=disponivel)
+
+    def exportar(self, *argumentos):
+        saida = StringIO()
+        with mock.patch('sys.stdout', saida):
+            call_command('export_data', *argumentos)
+        return saida.getvalue()
+
+    def test_comando_aceita_as_facetas_do_acervo(self):
+        linhas = self.exportar('livros', '--formato', 'jsonl', '--genero', 'Romance', '--disponivel', '1')
+        self.assertEqual([json.loads(linha)['titulo'] for linha in linhas.splitlines()], ['Dom Casmurro'])
+        linhas = self.exportar('livros', '--formato', 'jsonl', '--editora', 'Garnier', '--decada', '1890')
+        self.assertEqual([json.loads(linha)['titulo'] for linha in linhas.splitlines()],
+                         ['Dom Casmurro', 'Quincas Borba'])
 
-# Create your tests here.
+    def test_comando_e_listagem_exportam_o_mesmo(self):
+        cache.clear()
+        self.client.force_login(self.funcionario)
+        resposta = self.client.get(reverse('app_livro:exportar'), {'genero': 'Romance', 'disponivel': '0'})
+        self.assertTrue(resposta.streaming)
+        self.assertIn('attachment; filename="livros_', resposta['Content-Disposition'])
+        web = b''.join(resposta.streaming_content).decode()
+        self.assertEqual(web, self.exportar('livros', '--genero', 'Romance', '--disponivel', '0'))
+        linhas = list(csv.reader(StringIO(web)))
+        self.assertEqual(linhas[0][:3], ['id', 'titulo', 'autor'])
+        self.assertEqual([linha[1] for linha in linhas[1:]], ['Quincas Borba'])
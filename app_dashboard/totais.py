@@ -0,0 +1,65 @@
+"""
+Totais do painel inicial (livros, livros disponíveis, leitores ativos,
+empréstimos ativos e atrasados), calculados numa única consulta com
+agregação condicional e servidos do cache.
+
+O valor guardado leva a versão do catálogo (facetas.versao_catalogo), que
+os sinais e as operações em lote de Livro e Emprestimo incrementam depois
+do commit, e o dia de referência dos atrasos; os sinais de Leitor apagam a
+chave, também depois do commit (veja signals.py). Com o cache quente o
+painel não consulta o banco.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from app_emprestimo.models import Emprestimo
+from app_leitor.models import Leitor
+from app_livro import facetas
+from app_livro.models import Livro
+
+CHAVE = 'dashboard:totais'
+TEMPO_CACHE = 60 * 60
+
+CAMPOS = ('total_livros', 'livros_disponiveis', 'total_leitores', 'emprestimos_ativos', 'emprestimos_atrasados')
+
+
+def calcular(hoje=None):
+    """Calcula os totais no banco, numa consulta só"""
+    hoje = hoje or timezone.now().date()
+    sql = f'''
+        SELECT livros.total, livros.disponiveis, leitores.ativos, emprestimos.ativos, emprestimos.atrasados
+        FROM (
+            SELECT COUNT(*) AS total,
+                   COALESCE(SUM(CASE WHEN disponivel THEN 1 ELSE 0 END), 0) AS disponiveis
+            FROM {Livro._meta.db_table}
+        ) AS livros,
+        (
+            SELECT COUNT(*) AS ativos FROM {Leitor._meta.db_table} WHERE ativo
+        ) AS leitores,
+        (
+            SELECT COUNT(*) AS ativos,
+                   COALESCE(SUM(CASE WHEN data_devolucao_prevista < %s THEN 1 ELSE 0 END), 0) AS atrasados
+            FROM {Emprestimo._meta.db_table}
+            WHERE data_devolucao IS NULL
+        ) AS emprestimos
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [hoje])
+        return dict(zip(CAMPOS, cursor.fetchone()))
+
+
+def obter():
+    """Totais do cache, recalculados se o catálogo mudou, o dia virou ou um leitor mudou"""
+    hoje = timezone.now().date()
+    versao = (facetas.versao_catalogo(), hoje.isoformat())
+    guardado = cache.get(CHAVE)
+    if guardado and guardado[0] == versao:
+        return guardado[1]
+    totais = calcular(hoje)
+    cache.set(CHAVE, (versao, totais), TEMPO_CACHE)
+    return totais
+
+
+def invalidar():
+    cache.delete(CHAVE)
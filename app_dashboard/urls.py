@@ -5,4 +5,6 @@ app_name = 'app_dashboard'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('analises/', views.analises, name='analises'),
+    path('eventos/', views.eventos, name='eventos'),
 ]
\ No newline at end of file
@@ -1,53 +1,175 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
+from django.http import HttpResponseForbidden, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
-from app_livro.models import Livro
 from app_leitor.models import Leitor
 from app_emprestimo.models import Emprestimo
+from app_emprestimo.consultas import recomendados_para_leitor
 from django.utils import timezone
-from biblioteca.decorators import funcionario_or_leitor_required
+from datetime import timedelta
+from app_categoria.models import Categoria
+from app_funcionario.models import Funcionario
+from biblioteca.decorators import funcionario_or_leitor_required, funcionario_required
+from biblioteca.papeis import FUNCIONARIOS, e_funcionario
+from . import ao_vivo, resumos, totais
+from .models import ResumoDiario
 
 @login_required
 @funcionario_or_leitor_required
 def home(request):
     # Verificar se é funcionário
-    is_funcionario = request.user.groups.filter(name='Funcionarios').exists()
+    is_funcionario = FUNCIONARIOS in request.papeis
     
     context = {}
     
     if is_funcionario:
-        # Dados administrativos para funcionários
-        context.update({
-            'total_livros': Livro.objects.count(),
-            'total_leitores': Leitor.objects.filter(ativo=True).count(),
-            'emprestimos_ativos': Emprestimo.objects.filter(data_devolucao__isnull=True).count(),
-            'emprestimos_atrasados': Emprestimo.objects.filter(
-                data_devolucao__isnull=True,
-                data_devolucao_prevista__lt=timezone.now().date()
-            ).count(),
-        })
+        # Dados administrativos para funcionários: uma consulta só,
+        # servida do cache enquanto nada mudar (totais.py)
+        context.update(totais.obter())
     else:
         # Dados limitados para leitores
         try:
             leitor = Leitor.objects.get(pk=request.user.pk)
-            meus_emprestimos = Emprestimo.objects.filter(
-                leitor=leitor,
-                data_devolucao__isnull=True
-            )
+            # Contadores desnormalizados no próprio leitor; os empréstimos
+            # só são buscados se houver algum em aberto
+            meus_emprestimos = []
+            if leitor.emprestimos_ativos:
+                meus_emprestimos = list(
+                    Emprestimo.objects.abertos().filter(leitor=leitor).com_situacao().select_related('livro')[:3]  # Últimos 3 empréstimos
+                )
+            tem_atraso = leitor.proxima_devolucao is not None and leitor.proxima_devolucao < timezone.now().date()
             context.update({
-                'total_livros': Livro.objects.filter(disponivel=True).count(),  # Apenas disponíveis
-                'meus_emprestimos_ativos': meus_emprestimos.count(),
-                'meus_emprestimos_atrasados': meus_emprestimos.filter(
-                    data_devolucao_prevista__lt=timezone.now().date()
-                ).count(),
-                'meus_emprestimos': meus_emprestimos[:3],  # Últimos 3 empréstimos
+                'total_livros': totais.obter()['livros_disponiveis'],  # Apenas disponíveis
+                'meus_emprestimos_ativos': leitor.emprestimos_ativos,
+                'meus_emprestimos_atrasados': sum(1 for emprestimo in meus_emprestimos if emprestimo.atrasado) if tem_atraso else 0,
+                'meu_saldo_multas': leitor.saldo_multas,
+                'meus_emprestimos': meus_emprestimos,
+                'recomendacoes': recomendados_para_leitor(leitor),
             })
         except Leitor.DoesNotExist:
             context.update({
-                'total_livros': Livro.objects.filter(disponivel=True).count(),
+                'total_livros': totais.obter()['livros_disponiveis'],
                 'meus_emprestimos_ativos': 0,
                 'meus_emprestimos_atrasados': 0,
                 'meus_emprestimos': [],
+                'recomendacoes': [],
             })
     
     return render(request, 'app_dashboard/home.html', context)
+
+
+def _taxa_atraso(linha):
+    if not linha['devolucoes']:
+        return 0
+    return round(100 * linha['devolucoes_atrasadas'] / linha['devolucoes'], 1)
+
+
+@login_required
+@funcionario_required
+def analises(request):
+    """Gráficos de circulação lidos só dos resumos diários (build_daily_rollups)"""
+    hoje = timezone.now().date()
+    inicio_mes = hoje.replace(day=1)
+    doze_meses = (inicio_mes - timedelta(days=335)).replace(day=1)
+    trinta_dias = hoje - timedelta(days=30)
+
+    diario = [
+        {'dia': linha['dia'].isoformat(), 'emprestimos': linha['emprestimos'],
+         'renovacoes': linha['renovacoes'], 'devolucoes': linha['devolucoes']}
+        for linha in resumos.por_dia(trinta_dias)
+    ]
+    mensal = [
+        {'mes': linha['mes'].strftime('%m/%Y'), 'emprestimos': linha['emprestimos'],
+         'renovacoes': linha['renovacoes'], 'devolucoes': linha['devolucoes'],
+         'multas': float(linha['multas'] or 0)}
+        for linha in resumos.por_mes(doze_meses)
+    ]
+    horas = {linha['chave']: linha['emprestimos'] for linha in resumos.por_chave(ResumoDiario.DIMENSAO_HORA, doze_meses)}
+
+    por_categoria = list(resumos.por_chave(ResumoDiario.DIMENSAO_CATEGORIA, doze_meses))
+    nomes_categorias = dict(Categoria.objects.filter(
+        pk__in=[linha['chave'] for linha in por_categoria],
+    ).values_list('pk', 'nome'))
+    categorias = sorted((
+        {'nome': nomes_categorias.get(linha['chave'], 'Sem categoria'), 'emprestimos': linha['emprestimos'],
+         'devolucoes': linha['devolucoes'], 'devolucoes_atrasadas': linha['devolucoes_atrasadas'],
+         'taxa_atraso': _taxa_atraso(linha), 'multas': linha['multas']}
+        for linha in por_categoria
+    ), key=lambda categoria: -categoria['taxa_atraso'])
+
+    por_funcionario = list(resumos.por_chave(ResumoDiario.DIMENSAO_FUNCIONARIO, doze_meses))
+    nomes_funcionarios = {
+        pk: f"{nome} {sobrenome}".strip()
+        for pk, nome, sobrenome in Funcionario.objects.filter(
+            pk__in=[linha['chave'] for linha in por_funcionario],
+        ).values_list('pk', 'first_name', 'last_name')
+    }
+    funcionarios = sorted((
+        {'nome': nomes_funcionarios.get(linha['chave'], 'Não informado'), 'emprestimos': linha['emprestimos'],
+         'renovacoes': linha['renovacoes'], 'devolucoes': linha['devolucoes'], 'multas': linha['multas']}
+        for linha in por_funcionario
+    ), key=lambda funcionario: -funcionario['emprestimos'])
+
+    context = {
+        'atualizado_ate': resumos.marca_dagua(),
+        'graficos': {
+            'diario': diario,
+            'mensal': mensal,
+            'horas': [horas.get(hora, 0) for hora in range(24)],
+            'categorias': [
+                {'nome': categoria['nome'], 'taxa_atraso': categoria['taxa_atraso']} for categoria in categorias
+            ],
+        },
+        'categorias': categorias,
+        'funcionarios': funcionarios,
+    }
+    return render(request, 'app_dashboard/analises.html', context)
+
+
+# Comentário enviado de tempos em tempos para manter a conexão aberta
+INTERVALO_PULSO = 15
+# O navegador reconecta sozinho; conexões longas não ficam presas a um processo
+DURACAO_MAXIMA = 5 * 60
+
+
+def _evento(contadores):
+    return f"event: contadores\ndata: {json.dumps(contadores)}\n\n"
+
+
+async def _fluxo(fila):
+    laco = asyncio.get_running_loop()
+    fim = laco.time() + DURACAO_MAXIMA
+    try:
+        yield "retry: 3000\n\n"
+        dia = timezone.now().date()
+        yield _evento(await sync_to_async(ao_vivo.contadores)())
+        while laco.time() < fim:
+            try:
+                contadores = await asyncio.wait_for(fila.get(), INTERVALO_PULSO)
+            except asyncio.TimeoutError:
+                if timezone.now().date() == dia:
+                    yield ": pulso\n\n"
+                    continue
+                # Virou o dia: empréstimos passam a atrasados sem nenhum evento
+                dia = timezone.now().date()
+                contadores = await sync_to_async(ao_vivo.contadores)()
+            yield _evento(contadores)
+    finally:
+        ao_vivo.transmissor.cancelar(fila)
+
+
+async def eventos(request):
+    """
+    Server-sent events com os contadores do balcão (view assíncrona, servida
+    por biblioteca/asgi.py). Envia os valores atuais ao conectar e depois só
+    quando a circulação muda (ao_vivo.py).
+    """
+    if not await sync_to_async(e_funcionario)(request.user):
+        return HttpResponseForbidden()
+    # Assina antes de ler os valores iniciais para não perder nenhum evento
+    resposta = StreamingHttpResponse(_fluxo(ao_vivo.transmissor.assinar()), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Emprestimo
+from .models import Emprestimo, EmprestimoArquivado, LancamentoMulta, Recomendacao
 
 @admin.register(Emprestimo)
 class EmprestimoAdmin(admin.ModelAdmin):
@@ -7,3 +7,22 @@ class EmprestimoAdmin(admin.ModelAdmin):
     list_filter = ('data_emprestimo', 'data_devolucao_prevista', 'data_devolucao')
     search_fields = ('livro__titulo', 'leitor__first_name', 'leitor__last_name')
     date_hierarchy = 'data_emprestimo'
+
+@admin.register(EmprestimoArquivado)
+class EmprestimoArquivadoAdmin(admin.ModelAdmin):
+    list_display = ('livro', 'leitor', 'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao', 'multa')
+    list_filter = ('data_devolucao',)
+    raw_id_fields = ('livro', 'leitor', 'emprestado_por', 'renovacao', 'emprestimo_original')
+    date_hierarchy = 'data_emprestimo'
+
+@admin.register(Recomendacao)
+class RecomendacaoAdmin(admin.ModelAdmin):
+    list_display = ('livro', 'posicao', 'recomendado', 'pontuacao')
+    raw_id_fields = ('livro', 'recomendado')
+
+@admin.register(LancamentoMulta)
+class LancamentoMultaAdmin(admin.ModelAdmin):
+    list_display = ('data', 'leitor', 'emprestimo', 'origem', 'valor', 'saldo')
+    list_filter = ('origem', 'data')
+    raw_id_fields = ('leitor', 'emprestimo', 'emprestimo_arquivado')
+    date_hierarchy = 'data'
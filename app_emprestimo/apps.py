@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppEmprestimoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_emprestimo'
+
+    def ready(self):
+        from . import signals  # noqa: F401
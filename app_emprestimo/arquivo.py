@@ -0,0 +1,95 @@
+"""
+Arquivo de empréstimos encerrados.
+
+Cada renovação cria uma linha nova, então Emprestimo cresce rápido com
+histórico que as telas do dia a dia nunca mostram. O comando archive_loans
+move para EmprestimoArquivado as cadeias de renovação inteiramente
+devolvidas há mais de N dias, mantendo os ids. A cópia é feita em lotes,
+cada um na sua transação curta (INSERT ... SELECT, ajuste do razão de
+multas e DELETE), para não segurar a escrita do banco por muito tempo.
+
+O histórico (listagem de devolvidos e exportações) lê as duas tabelas pela
+visão EmprestimoHistorico; veja consultas.filtrar_emprestimos.
+"""
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Emprestimo, EmprestimoArquivado, LancamentoMulta
+
+DIAS_PARA_ARQUIVAR = 365
+CADEIAS_POR_LOTE = 200
+
+COLUNAS = (
+    'id', 'livro_id', 'leitor_id', 'emprestado_por_id', 'data_emprestimo', 'data_devolucao_prevista',
+    'data_devolucao', 'multa', 'renovacao_id', 'emprestimo_original_id', 'numero_renovacao',
+)
+
+
+def cadeias_encerradas(antes_de):
+    """Raízes das cadeias sem empréstimo em aberto e com a última devolução antes da data"""
+    return (Emprestimo.objects
+            .annotate(raiz=Coalesce('emprestimo_original_id', 'id'))
+            .values('raiz')
+            .annotate(
+                abertos=Count('pk', filter=Q(data_devolucao__isnull=True)),
+                ultima_devolucao=Max('data_devolucao'),
+            )
+            .filter(abertos=0, ultima_devolucao__lt=antes_de)
+            .order_by('raiz')
+            .values_list('raiz', flat=True))
+
+
+def _mover(raizes):
+    """Move as cadeias das raízes informadas; retorna quantos empréstimos moveu"""
+    cadeias = Emprestimo.objects.filter(Q(pk__in=raizes) | Q(emprestimo_original_id__in=raizes))
+    with transaction.atomic():
+        # Uma cadeia renovada depois da seleção fica para a próxima vez
+        reabertas = set(cadeias.filter(data_devolucao__isnull=True).annotate(
+            raiz=Coalesce('emprestimo_original_id', 'id'),
+        ).values_list('raiz', flat=True))
+        if reabertas:
+            raizes = [raiz for raiz in raizes if raiz not in reabertas]
+            cadeias = Emprestimo.objects.filter(Q(pk__in=raizes) | Q(emprestimo_original_id__in=raizes))
+        ids = list(cadeias.order_by('pk').values_list('pk', flat=True))
+        if not ids:
+            return 0
+
+        marcadores = ', '.join(['%s'] * len(ids))
+        colunas = ', '.join(COLUNAS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {EmprestimoArquivado._meta.db_table} ({colunas}) '
+                f'SELECT {colunas} FROM {Emprestimo._meta.db_table} WHERE id IN ({marcadores}) ORDER BY id',
+                ids,
+            )
+            # O razão de multas passa a apontar para a cópia arquivada
+            cursor.execute(
+                f'UPDATE {LancamentoMulta._meta.db_table} '
+                f'SET emprestimo_arquivado_id = emprestimo_id, emprestimo_id = NULL '
+                f'WHERE emprestimo_id IN ({marcadores})',
+                ids,
+            )
+            # DELETE direto: só há empréstimos encerrados, sem sinais a disparar
+            cursor.execute(f'DELETE FROM {Emprestimo._meta.db_table} WHERE id IN ({marcadores})', ids)
+    return len(ids)
+
+
+def arquivar(dias=DIAS_PARA_ARQUIVAR, cadeias_por_lote=CADEIAS_POR_LOTE, pausa=0, hoje=None):
+    """
+    Arquiva as cadeias encerradas há mais de `dias` dias, `cadeias_por_lote`
+    por transação, esperando `pausa` segundos entre os lotes. Retorna
+    (cadeias, empréstimos) movidos.
+    """
+    hoje = hoje or timezone.now().date()
+    raizes = list(cadeias_encerradas(hoje - timedelta(days=dias)).iterator())
+    movidos = 0
+    for inicio in range(0, len(raizes), cadeias_por_lote):
+        if inicio and pausa:
+            time.sleep(pausa)
+        movidos += _mover(raizes[inicio:inicio + cadeias_por_lote])
+    return len(raizes), movidos
@@ -0,0 +1,301 @@
+"""
+Operações em lote do balcão de circulação.
+
+O funcionário lê vários livros (ISBN ou id) de uma vez e escolhe a ação:
+devolver, emprestar para um leitor ou renovar. Todo o lote roda numa única
+transação, com consultas e gravações em massa (bulk_create/bulk_update e
+UPDATE ... WHERE pk IN) em vez de uma ida ao banco por livro, e retorna o
+resultado de cada item lido.
+
+Nenhum empréstimo usa trava de tabela: o livro é tomado com um UPDATE
+condicional (... WHERE disponivel) que precisa afetar a linha, e o índice
+único parcial emprestimo_aberto_por_livro impede dois empréstimos em aberto
+do mesmo livro. O limite de empréstimos do leitor vale do mesmo jeito: o
+contador é incrementado com um UPDATE condicional. Quem perde a corrida
+recebe um erro claro na hora.
+"""
+import re
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from app_leitor.models import Leitor
+from app_livro import facetas
+from app_livro.models import Livro, normalizar_isbn
+from . import multas, situacao
+from .models import LIMITE_EMPRESTIMOS_ATIVOS, LIMITE_RENOVACOES, Emprestimo, LancamentoMulta, multa_diaria
+from .signals import circulacao_alterada
+
+ACAO_DEVOLVER = 'devolver'
+ACAO_EMPRESTAR = 'emprestar'
+ACAO_RENOVAR = 'renovar'
+ACOES = [
+    (ACAO_DEVOLVER, 'Devolver'),
+    (ACAO_EMPRESTAR, 'Emprestar'),
+    (ACAO_RENOVAR, 'Renovar'),
+]
+MAXIMO_ITENS = 200
+
+
+class LoteRejeitado(Exception):
+    """Outro atendimento alterou os livros do lote; nada foi gravado"""
+
+
+class LivroIndisponivel(Exception):
+    """O livro já está emprestado (possivelmente por outro balcão agora mesmo)"""
+
+
+INDISPONIVEL = 'Este livro acabou de ser emprestado em outro atendimento'
+
+
+def emprestar(livro, leitor, funcionario, dias=14):
+    """
+    Empresta um livro sem travar tabelas: toma o livro com um UPDATE
+    condicional e grava o empréstimo, que o índice único parcial protege.
+    Levanta LivroIndisponivel (e nada é gravado) se outro atendimento
+    chegou antes.
+    """
+    try:
+        with transaction.atomic():
+            if not Livro.objects.filter(pk=livro.pk, disponivel=True).update(disponivel=False):
+                raise LivroIndisponivel(INDISPONIVEL)
+            emprestimo = Emprestimo.objects.create(
+                livro=livro, leitor=leitor, emprestado_por=funcionario,
+                data_devolucao_prevista=timezone.now().date() + timedelta(days=dias),
+            )
+    except IntegrityError:
+        # Um empréstimo em aberto do livro já existia (disponivel desatualizado)
+        raise LivroIndisponivel(INDISPONIVEL)
+    livro.disponivel = False
+    transaction.on_commit(facetas.invalidar)
+    return emprestimo
+
+
+def separar_identificadores(texto):
+    """Divide o texto lido (um por linha, ou separados por vírgula/espaço)"""
+    return [item for item in re.split(r'[\s,;]+', texto or '') if item]
+
+
+def _resultado(identificador, livro=None, emprestimo=None, erro=None, **extra):
+    return {
+        'identificador': identificador,
+        'ok': erro is None,
+        'mensagem': erro or extra.pop('mensagem', 'OK'),
+        'livro_id': livro.pk if livro else None,
+        'livro': livro.titulo if livro else None,
+        'emprestimo_id': emprestimo.pk if emprestimo else None,
+        **extra,
+    }
+
+
+def _resolver_livros(identificadores):
+    """
+    Resolve cada identificador para um livro com duas consultas (uma por
+    ISBN, outra por id). Retorna {identificador: livro ou None}.
+    """
+    isbns, ids = {}, {}
+    for identificador in identificadores:
+        try:
+            isbn = normalizar_isbn(identificador)
+        except ValidationError:
+            isbn = ''
+        if isbn:
+            isbns[identificador] = isbn
+        elif identificador.isdigit():
+            ids[identificador] = int(identificador)
+
+    por_isbn = {}
+    if isbns:
+        # Mesma condição do índice parcial livro_isbn_unico (veja filtro_isbn)
+        filtro = Q(isbn__in=set(isbns.values())) & ~Q(isbn='')
+        por_isbn = {livro.isbn: livro for livro in Livro.objects.filter(filtro)}
+    por_id = Livro.objects.in_bulk(set(ids.values())) if ids else {}
+
+    return {
+        identificador: por_isbn.get(isbns[identificador]) if identificador in isbns
+        else por_id.get(ids.get(identificador))
+        for identificador in identificadores
+    }
+
+
+def _marcar_livros(ids, disponivel):
+    """
+    Atualiza a disponibilidade só dos livros que ainda estão no estado
+    oposto; se algum mudou no meio do caminho, desfaz o lote inteiro.
+    """
+    if not ids:
+        return
+    alterados = Livro.objects.filter(pk__in=ids, disponivel=not disponivel).update(disponivel=disponivel)
+    if alterados != len(ids):
+        raise LoteRejeitado('Outro atendimento alterou algum dos livros; tente novamente')
+
+
+def _reservar_vagas(leitor, quantidade, hoje):
+    """
+    Soma os novos empréstimos ao contador do leitor só se, relido dentro da
+    transação, ele ainda comporta todos e não tem atraso; se outro
+    atendimento chegou antes, desfaz o lote inteiro, como _marcar_livros.
+    """
+    if not quantidade:
+        return
+    reservado = Leitor.objects.filter(
+        Q(proxima_devolucao__isnull=True) | Q(proxima_devolucao__gte=hoje),
+        pk=leitor.pk, emprestimos_ativos__lte=LIMITE_EMPRESTIMOS_ATIVOS - quantidade,
+    ).update(emprestimos_ativos=F('emprestimos_ativos') + quantidade)
+    if not reservado:
+        raise LoteRejeitado('Outro atendimento alterou os empréstimos do leitor; tente novamente')
+
+
+def _emprestimos_abertos(livros):
+    abertos = Emprestimo.objects.filter(
+        livro_id__in=[livro.pk for livro in livros], data_devolucao__isnull=True,
+    ).order_by('-data_emprestimo')
+    por_livro = {}
+    for emprestimo in abertos:
+        por_livro.setdefault(emprestimo.livro_id, emprestimo)
+    return por_livro
+
+
+def _devolver(itens, hoje, **kwargs):
+    abertos = _emprestimos_abertos([livro for _, livro in itens])
+    taxa = multa_diaria()
+    resultados, devolvidos, lancamentos = [], [], []
+    for identificador, livro in itens:
+        emprestimo = abertos.pop(livro.pk, None)
+        if emprestimo is None:
+            resultados.append(_resultado(identificador, livro, erro='Livro sem empréstimo em aberto'))
+            continue
+        dias_atraso = max((hoje - emprestimo.data_devolucao_prevista).days, 0)
+        multa_acumulada = emprestimo.multa
+        emprestimo.data_devolucao = hoje
+        emprestimo.multa = dias_atraso * taxa
+        devolvidos.append(emprestimo)
+        lancamentos.append((emprestimo, emprestimo.multa - multa_acumulada))
+        resultados.append(_resultado(identificador, livro, emprestimo, multa=str(emprestimo.multa)))
+
+    Emprestimo.objects.bulk_update(devolvidos, ['data_devolucao', 'multa'])
+    _marcar_livros([emprestimo.livro_id for emprestimo in devolvidos], disponivel=True)
+    multas.registrar_varios(lancamentos, LancamentoMulta.ORIGEM_DEVOLUCAO, hoje)
+    situacao.atualizar(emprestimo.leitor_id for emprestimo in devolvidos)
+    return resultados
+
+
+def _emprestar(itens, hoje, leitor, funcionario, dias, **kwargs):
+    # Situação de circulação desnormalizada no próprio leitor (situacao.py)
+    if leitor.proxima_devolucao and leitor.proxima_devolucao < hoje:
+        return [_resultado(identificador, livro, erro='Leitor possui empréstimos em atraso')
+                for identificador, livro in itens]
+    vagas = LIMITE_EMPRESTIMOS_ATIVOS - leitor.emprestimos_ativos
+
+    resultados, novos = [], []
+    for identificador, livro in itens:
+        if not livro.disponivel:
+            resultados.append(_resultado(identificador, livro, erro='Livro não está disponível'))
+        elif len(novos) >= vagas:
+            resultados.append(_resultado(
+                identificador, livro,
+                erro=f'Leitor atingiu o limite de {LIMITE_EMPRESTIMOS_ATIVOS} empréstimos simultâneos',
+            ))
+        else:
+            novos.append(Emprestimo(
+                livro=livro, leitor=leitor, emprestado_por=funcionario,
+                data_devolucao_prevista=hoje + timedelta(days=dias),
+            ))
+            resultados.append(_resultado(identificador, livro))
+
+    _reservar_vagas(leitor, len(novos), hoje)
+    _marcar_livros([emprestimo.livro_id for emprestimo in novos], disponivel=False)
+    criados = iter(Emprestimo.objects.bulk_create(novos))
+    for resultado in resultados:
+        if resultado['ok']:
+            resultado['emprestimo_id'] = next(criados).pk
+    if novos:
+        situacao.atualizar([leitor])
+    return resultados
+
+
+def _renovar(itens, hoje, funcionario, dias, **kwargs):
+    abertos = _emprestimos_abertos([livro for _, livro in itens])
+    resultados, renovados, novos = [], [], []
+    for identificador, livro in itens:
+        emprestimo = abertos.pop(livro.pk, None)
+        if emprestimo is None:
+            resultados.append(_resultado(identificador, livro, erro='Livro sem empréstimo em aberto'))
+        elif emprestimo.data_devolucao_prevista < hoje:
+            resultados.append(_resultado(identificador, livro, emprestimo, erro='Empréstimo em atraso não pode ser renovado'))
+        elif emprestimo.numero_renovacao >= LIMITE_RENOVACOES:
+            resultados.append(_resultado(identificador, livro, emprestimo, erro='Limite de renovações atingido'))
+        else:
+            # bulk_create não passa pelo save(): a cadeia é preenchida aqui
+            novos.append(Emprestimo(
+                livro_id=emprestimo.livro_id, leitor_id=emprestimo.leitor_id, emprestado_por=funcionario,
+                data_devolucao_prevista=emprestimo.data_devolucao_prevista + timedelta(days=dias),
+                renovacao=emprestimo,
+                emprestimo_original_id=emprestimo.emprestimo_original_pk,
+                numero_renovacao=emprestimo.numero_renovacao + 1,
+            ))
+            emprestimo.data_devolucao = hoje
+            renovados.append(emprestimo)
+            resultados.append(_resultado(identificador, livro))
+
+    Emprestimo.objects.bulk_update(renovados, ['data_devolucao'])
+    criados = iter(Emprestimo.objects.bulk_create(novos))
+    for resultado in resultados:
+        if resultado['ok']:
+            novo = next(criados)
+            resultado['emprestimo_id'] = novo.pk
+            resultado['devolver_ate'] = novo.data_devolucao_prevista.isoformat()
+    situacao.atualizar(emprestimo.leitor_id for emprestimo in renovados)
+    return resultados
+
+
+OPERACOES = {
+    ACAO_DEVOLVER: _devolver,
+    ACAO_EMPRESTAR: _emprestar,
+    ACAO_RENOVAR: _renovar,
+}
+
+
+def _processar(acao, identificadores, funcionario, leitor, dias, hoje):
+    livros = _resolver_livros(identificadores)
+    resultados = [None] * len(identificadores)
+    itens, posicoes, vistos = [], [], set()
+    for posicao, identificador in enumerate(identificadores):
+        livro = livros[identificador]
+        if livro is None:
+            resultados[posicao] = _resultado(identificador, erro='Livro não encontrado')
+        elif livro.pk in vistos:
+            resultados[posicao] = _resultado(identificador, livro, erro='Livro repetido no lote')
+        else:
+            vistos.add(livro.pk)
+            itens.append((identificador, livro))
+            posicoes.append(posicao)
+
+    # Cada operação devolve um resultado por item, na ordem recebida
+    processados = OPERACOES[acao](itens, hoje, leitor=leitor, funcionario=funcionario, dias=dias)
+    for posicao, resultado in zip(posicoes, processados):
+        resultados[posicao] = resultado
+    return resultados
+
+
+def processar_lote(acao, identificadores, funcionario, leitor=None, dias=14):
+    """
+    Executa a ação sobre os livros identificados numa única transação.
+    Retorna uma lista com o resultado de cada identificador, na ordem lida;
+    itens com erro não impedem os demais. Levanta LoteRejeitado (e nada é
+    gravado) se outro atendimento mexer nos mesmos livros ao mesmo tempo.
+    """
+    hoje = timezone.now().date()
+    try:
+        with transaction.atomic():
+            resultados = _processar(acao, identificadores, funcionario, leitor, dias, hoje)
+    except IntegrityError:
+        # Outro balcão abriu empréstimo para um dos livros ao mesmo tempo
+        raise LoteRejeitado('Outro atendimento alterou algum dos livros; tente novamente')
+    if any(resultado['livro_id'] for resultado in resultados):
+        transaction.on_commit(facetas.invalidar)
+        circulacao_alterada.send(sender=Emprestimo)
+    return resultados
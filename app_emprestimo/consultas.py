@@ -0,0 +1,137 @@
+"""
+Filtros da listagem de empréstimos, compartilhados com a exportação, e
+leitura das recomendações calculadas por recomendacoes.py
+
+Empréstimos em aberto ficam sempre na tabela viva (Emprestimo); o histórico
+com devolvidos lê também o arquivo, pela visão EmprestimoHistorico.
+
+A listagem lê linhas leves (para_listagem): só as colunas que o template
+mostra, sem instanciar Emprestimo, Livro nem Leitor (que traria a linha
+inteira de auth_user).
+"""
+from django.db.models import F, Q, Sum, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat, Trim
+
+from app_livro.models import Livro
+from app_livro.search import ids_por_titulo
+from biblioteca.texto import normalizar
+from .models import Emprestimo, EmprestimoHistorico, Recomendacao
+
+COLUNAS_EXPORTACAO = [
+    ('id', 'id'),
+    ('livro_id', 'livro_id'),
+    ('livro_titulo', 'livro__titulo'),
+    ('livro_isbn', 'livro__isbn'),
+    ('leitor_id', 'leitor_id'),
+    ('leitor_nome', 'leitor_nome'),
+    ('leitor_cpf', 'leitor__cpf'),
+    ('emprestado_por', 'funcionario_nome'),
+    ('data_emprestimo', 'data_emprestimo'),
+    ('data_devolucao_prevista', 'data_devolucao_prevista'),
+    ('data_devolucao', 'data_devolucao'),
+    ('multa', 'multa'),
+    ('renovacao_de', 'renovacao_id'),
+    ('emprestimo_original', 'emprestimo_original_id'),
+    ('numero_renovacao', 'numero_renovacao'),
+    ('atrasado', 'atrasado'),
+    ('dias_atraso', 'dias_atraso'),
+    ('multa_estimada', 'multa_estimada'),
+]
+
+# Colunas das linhas da listagem (inclui as usadas nas ordenações abaixo)
+COLUNAS_LISTAGEM = (
+    'pk', 'data_emprestimo', 'data_devolucao_prevista', 'data_devolucao',
+    'atrasado', 'dias_atraso', 'renovavel', 'multa_estimada',
+    'livro_titulo', 'livro_autor', 'leitor_username', 'leitor_first_name', 'leitor_last_name',
+)
+
+# Ordenações oferecidas na listagem (parâmetro "ordem")
+ORDENACOES = {
+    'recentes': ['-data_emprestimo'],
+    'atraso': ['-dias_atraso', '-data_emprestimo'],
+    'multa': ['-multa_estimada', '-data_emprestimo'],
+}
+
+EMPRESTIMOS_RECENTES = 20
+
+
+def filtrar_emprestimos(params):
+    """
+    Aplica os filtros da listagem (search, status), anota a situação de
+    cada empréstimo e retorna (queryset, ordenação) para paginação ou
+    exportação.
+    """
+    search = params.get('search', '')
+    status = params.get('status', '')
+    ordem = ORDENACOES.get(params.get('ordem', ''), ORDENACOES['recentes'])
+    
+    # Ativos e atrasados só existem na tabela viva; o resto inclui o arquivo
+    modelo = Emprestimo if status in ('ativo', 'atrasado') else EmprestimoHistorico
+    emprestimos = modelo.objects.com_situacao()
+    
+    if search:
+        # Título do livro pelo índice de busca do acervo
+        subconsulta_titulo = ids_por_titulo(search)
+        if subconsulta_titulo:
+            filtro_livro = Q(livro_id__in=RawSQL(*subconsulta_titulo))
+        else:
+            filtro_livro = Q(livro__titulo_normalizado__contains=normalizar(search))
+        emprestimos = emprestimos.filter(
+            filtro_livro |
+            Q(leitor__nome_normalizado__contains=normalizar(search))
+        )
+    
+    if status == 'ativo':
+        emprestimos = emprestimos.abertos()
+    elif status == 'atrasado':
+        emprestimos = emprestimos.atrasados()
+    elif status == 'devolvido':
+        emprestimos = emprestimos.filter(data_devolucao__isnull=False)
+    
+    return emprestimos, ordem
+
+
+def para_listagem(emprestimos):
+    """Linhas leves (tuplas nomeadas) com as colunas da listagem"""
+    return emprestimos.annotate(
+        livro_titulo=F('livro__titulo'),
+        livro_autor=F('livro__autor'),
+        leitor_username=F('leitor__username'),
+        leitor_first_name=F('leitor__first_name'),
+        leitor_last_name=F('leitor__last_name'),
+    ).values_list(*COLUNAS_LISTAGEM, named=True)
+
+
+def para_exportacao(emprestimos):
+    """Anota os nomes do leitor e do funcionário para a exportação"""
+    return emprestimos.annotate(
+        leitor_nome=Trim(Concat('leitor__first_name', Value(' '), 'leitor__last_name')),
+        funcionario_nome=Trim(Concat('emprestado_por__first_name', Value(' '), 'emprestado_por__last_name')),
+    )
+
+
+def recomendados_para_livro(livro, limite=6):
+    """Livros mais pegos por quem também pegou este livro"""
+    return (Recomendacao.objects
+            .filter(livro=livro)
+            .select_related('recomendado')
+            .order_by('posicao')[:limite])
+
+
+def recomendados_para_leitor(leitor, limite=6):
+    """
+    Livros disponíveis vizinhos dos últimos livros que o leitor pegou,
+    excluindo os que ele já leu, somando a similaridade quando o mesmo livro
+    aparece para mais de um.
+    """
+    recentes = (Emprestimo.objects
+                .filter(leitor=leitor, renovacao__isnull=True)
+                .order_by('-data_emprestimo')
+                .values('livro_id')[:EMPRESTIMOS_RECENTES])
+    lidos = Emprestimo.objects.filter(leitor=leitor).values('livro_id')
+    return (Livro.objects
+            .filter(recomendado_em__livro__in=recentes, disponivel=True)
+            .exclude(pk__in=lidos)
+            .annotate(pontuacao=Sum('recomendado_em__pontuacao'))
+            .order_by('-pontuacao', 'pk')[:limite])
@@ -1,9 +1,12 @@
 from django import forms
+from django.urls import reverse_lazy
 from django.utils import timezone
 from datetime import timedelta
-from .models import Emprestimo
+from .models import LIMITE_EMPRESTIMOS_ATIVOS, Emprestimo
+from . import balcao
 from app_livro.models import Livro
 from app_leitor.models import Leitor
+from biblioteca.widgets import AutocompleteSelect
 
 class EmprestimoForm(forms.ModelForm):
     dias_emprestimo = forms.IntegerField(
@@ -22,11 +25,11 @@ class EmprestimoForm(forms.ModelForm):
         model = Emprestimo
         fields = ['livro', 'leitor']
         widgets = {
-            'livro': forms.Select(attrs={
+            'livro': AutocompleteSelect(reverse_lazy('app_livro:autocomplete'), attrs={
                 'class': 'form-control',
                 'required': True
             }),
-            'leitor': forms.Select(attrs={
+            'leitor': AutocompleteSelect(reverse_lazy('app_leitor:autocomplete'), attrs={
                 'class': 'form-control',
                 'required': True
             }),
@@ -39,8 +42,10 @@ class EmprestimoForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Filtrar apenas livros disponíveis
+        # As opções são carregadas sob demanda pelo AutocompleteSelect
         self.fields['livro'].queryset = Livro.objects.filter(disponivel=True).order_by('titulo')
         self.fields['livro'].empty_label = "Selecione um livro"
+        self.fields['livro'].label_from_instance = lambda livro: f'{livro.titulo} - {livro.autor}'
         
         # Filtrar apenas leitores ativos
         self.fields['leitor'].queryset = Leitor.objects.filter(ativo=True).order_by('first_name')
@@ -64,23 +69,13 @@ class EmprestimoForm(forms.ModelForm):
         if not leitor.ativo:
             raise forms.ValidationError('Este leitor está inativo')
         
-        # Verificar se o leitor já tem 3 empréstimos ativos (limite)
-        emprestimos_ativos = Emprestimo.objects.filter(
-            leitor=leitor,
-            data_devolucao__isnull=True
-        ).count()
-        
-        if emprestimos_ativos >= 3:
-            raise forms.ValidationError('Este leitor já atingiu o limite de 3 empréstimos simultâneos')
+        # Limite e atraso pela situação desnormalizada do leitor (situacao.py),
+        # já carregada com ele: nenhuma consulta a mais
+        if leitor.emprestimos_ativos >= LIMITE_EMPRESTIMOS_ATIVOS:
+            raise forms.ValidationError(f'Este leitor já atingiu o limite de {LIMITE_EMPRESTIMOS_ATIVOS} empréstimos simultâneos')
         
         # Verificar se o leitor tem empréstimos atrasados
-        emprestimos_atrasados = Emprestimo.objects.filter(
-            leitor=leitor,
-            data_devolucao__isnull=True,
-            data_devolucao_prevista__lt=timezone.now().date()
-        ).count()
-        
-        if emprestimos_atrasados > 0:
+        if leitor.proxima_devolucao and leitor.proxima_devolucao < timezone.now().date():
             raise forms.ValidationError('Este leitor possui empréstimos em atraso e não pode fazer novos empréstimos')
         
         return leitor
@@ -172,4 +167,56 @@ class DevolucaoForm(forms.Form):
             if self.emprestimo.data_devolucao:
                 raise forms.ValidationError('Este empréstimo já foi devolvido.')
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class LoteForm(forms.Form):
+    """Balcão de circulação: vários livros lidos de uma vez e uma ação"""
+    acao = forms.ChoiceField(
+        choices=balcao.ACOES,
+        label='Ação',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    identificadores = forms.CharField(
+        label='Livros',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 8,
+            'placeholder': 'Um ISBN ou código de livro por linha'
+        }),
+        help_text=f'ISBN ou código do livro, um por linha (máximo {balcao.MAXIMO_ITENS})'
+    )
+    leitor = forms.ModelChoiceField(
+        queryset=Leitor.objects.filter(ativo=True).order_by('first_name'),
+        required=False,
+        label='Leitor',
+        empty_label='Selecione um leitor',
+        widget=AutocompleteSelect(reverse_lazy('app_leitor:autocomplete'), attrs={'class': 'form-control'}),
+        help_text='Obrigatório para empréstimos'
+    )
+    dias = forms.IntegerField(
+        initial=14,
+        required=False,
+        min_value=1,
+        max_value=30,
+        label='Dias',
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        help_text='Prazo do empréstimo ou da renovação (máximo 30 dias)'
+    )
+
+    def clean_identificadores(self):
+        identificadores = balcao.separar_identificadores(self.cleaned_data.get('identificadores'))
+        if not identificadores:
+            raise forms.ValidationError('Informe pelo menos um livro')
+        if len(identificadores) > balcao.MAXIMO_ITENS:
+            raise forms.ValidationError(f'No máximo {balcao.MAXIMO_ITENS} livros por lote')
+        return identificadores
+
+    def clean_dias(self):
+        return self.cleaned_data.get('dias') or 14
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('acao') == balcao.ACAO_EMPRESTAR and not cleaned_data.get('leitor'):
+            self.add_error('leitor', 'Selecione o leitor do empréstimo')
+        return cleaned_data
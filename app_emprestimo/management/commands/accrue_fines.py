@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_emprestimo import multas
+
+
+class Command(BaseCommand):
+    help = ('Atualiza a multa dos empréstimos atrasados (settings.MULTA_DIARIA por dia) e lança as variações '
+            'no razão de multas (rodar diariamente)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Data de referência AAAA-MM-DD (padrão: hoje)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            hoje = date.fromisoformat(options['data']) if options['data'] else None
+        except ValueError as erro:
+            raise CommandError(f'Parâmetro inválido: {erro}')
+        atualizados, lancamentos = multas.acumular(hoje=hoje, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{atualizados} empréstimos com multa atualizada, {lancamentos} lançamentos gravados.'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from app_emprestimo import arquivo
+
+
+class Command(BaseCommand):
+    help = 'Move para o arquivo as cadeias de empréstimos devolvidas há mais de N dias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=arquivo.DIAS_PARA_ARQUIVAR,
+                            help='Idade mínima, em dias, da última devolução da cadeia')
+        parser.add_argument('--lote', type=int, default=arquivo.CADEIAS_POR_LOTE,
+                            help='Cadeias movidas por transação')
+        parser.add_argument('--pausa', type=float, default=0,
+                            help='Segundos de espera entre os lotes, para dar vez a outras escritas')
+
+    def handle(self, *args, **options):
+        cadeias, emprestimos = arquivo.arquivar(
+            dias=options['dias'], cadeias_por_lote=options['lote'], pausa=options['pausa'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{cadeias} cadeias arquivadas ({emprestimos} empréstimos).'))
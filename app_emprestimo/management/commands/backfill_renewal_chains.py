@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_emprestimo.models import Emprestimo
+
+
+def calcular_cadeias(anteriores):
+    """
+    Recebe {id: id do empréstimo renovado} e retorna {id: (raiz, número da
+    renovação)}, percorrendo cada cadeia uma única vez.
+    """
+    cadeias = {}
+    for pk in anteriores:
+        caminho = []
+        atual = pk
+        while atual not in cadeias and anteriores.get(atual):
+            caminho.append(atual)
+            atual = anteriores[atual]
+        if atual not in cadeias:
+            cadeias[atual] = (None, 0)
+        raiz, numero = cadeias[atual]
+        raiz = raiz or atual
+        for item in reversed(caminho):
+            numero += 1
+            cadeias[item] = (raiz, numero)
+    return cadeias
+
+
+class Command(BaseCommand):
+    help = 'Preenche a raiz e o número de renovação das cadeias de empréstimos renovados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        registros = Emprestimo.objects.values_list(
+            'pk', 'renovacao_id', 'emprestimo_original_id', 'numero_renovacao',
+        ).order_by('pk')
+        anteriores = {}
+        atuais = {}
+        for pk, renovacao, original, numero in registros.iterator(chunk_size=batch_size):
+            anteriores[pk] = renovacao
+            atuais[pk] = (original, numero)
+
+        lote = []
+        atualizados = 0
+        for pk, valores in calcular_cadeias(anteriores).items():
+            if atuais[pk] != valores:
+                original, numero = valores
+                lote.append(Emprestimo(pk=pk, emprestimo_original_id=original, numero_renovacao=numero))
+            if len(lote) >= batch_size:
+                atualizados += self._salvar(lote)
+                lote = []
+        atualizados += self._salvar(lote)
+        self.stdout.write(self.style.SUCCESS(f'{atualizados} empréstimos atualizados.'))
+
+    def _salvar(self, lote):
+        if not lote:
+            return 0
+        with transaction.atomic():
+            Emprestimo.objects.bulk_update(lote, ['emprestimo_original', 'numero_renovacao'])
+        return len(lote)
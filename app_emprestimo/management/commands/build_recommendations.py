@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from app_emprestimo import recomendacoes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as recomendações "quem pegou este livro também pegou" a partir dos empréstimos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vizinhos', type=int, default=recomendacoes.VIZINHOS_POR_LIVRO,
+                            help='Quantidade de recomendações guardadas por livro')
+        parser.add_argument('--bloco', type=int, default=recomendacoes.LIVROS_POR_BLOCO,
+                            help='Livros por bloco na multiplicação de matrizes')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if recomendacoes.sparse is None:
+            self.stdout.write(self.style.WARNING(
+                'NumPy/SciPy não instalados; usando o cálculo em Python puro.'
+            ))
+        total = recomendacoes.reconstruir(
+            k=options['vizinhos'],
+            bloco=options['bloco'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{total} recomendações gravadas.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_emprestimo import situacao
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a situação desnormalizada dos leitores (empréstimos ativos, próxima devolução e saldo de multas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Leitores por UPDATE')
+
+    def handle(self, *args, **options):
+        total = situacao.reparar(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} leitores recalculados.'))
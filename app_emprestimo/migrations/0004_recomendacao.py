@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0005_chave_duplicidade'),
+        ('app_emprestimo', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recomendacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveSmallIntegerField()),
+                ('pontuacao', models.FloatField()),
+                ('livro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recomendacoes', to='app_livro.livro')),
+                ('recomendado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recomendado_em', to='app_livro.livro')),
+            ],
+            options={
+                'verbose_name': 'Recomendação',
+                'verbose_name_plural': 'Recomendações',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recomendacao',
+            constraint=models.UniqueConstraint(fields=('livro', 'posicao'), name='recomendacao_livro_posicao'),
+        ),
+    ]
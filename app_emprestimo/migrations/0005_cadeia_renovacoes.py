@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def preencher_cadeias(apps, schema_editor):
+    Emprestimo = apps.get_model('app_emprestimo', 'Emprestimo')
+    anteriores = dict(Emprestimo.objects.values_list('pk', 'renovacao_id'))
+    lote = []
+    for pk in anteriores:
+        numero, raiz = 0, pk
+        while anteriores.get(raiz):
+            numero += 1
+            raiz = anteriores[raiz]
+        if numero:
+            lote.append(Emprestimo(pk=pk, emprestimo_original_id=raiz, numero_renovacao=numero))
+    Emprestimo.objects.bulk_update(lote, ['emprestimo_original', 'numero_renovacao'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_emprestimo', '0004_recomendacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emprestimo',
+            name='emprestimo_original',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cadeia', to='app_emprestimo.emprestimo'),
+        ),
+        migrations.AddField(
+            model_name='emprestimo',
+            name='numero_renovacao',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_cadeias, migrations.RunPython.noop),
+    ]
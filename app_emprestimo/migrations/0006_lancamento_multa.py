@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_leitor', '0002_normalizados'),
+        ('app_emprestimo', '0005_cadeia_renovacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LancamentoMulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('origem', models.CharField(choices=[('acumulo', 'Acúmulo diário'), ('devolucao', 'Devolução')], max_length=20)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('emprestimo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lancamentos_multa', to='app_emprestimo.emprestimo')),
+                ('leitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos_multa', to='app_leitor.leitor')),
+            ],
+            options={
+                'verbose_name': 'Lançamento de multa',
+                'verbose_name_plural': 'Lançamentos de multa',
+                'indexes': [models.Index(fields=['leitor', '-id'], name='lancamento_leitor_recente')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_emprestimo', '0006_lancamento_multa'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='emprestimo',
+            constraint=models.UniqueConstraint(condition=models.Q(('data_devolucao__isnull', True)), fields=('livro',), name='emprestimo_aberto_por_livro'),
+        ),
+    ]
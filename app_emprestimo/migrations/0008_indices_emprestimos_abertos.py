@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_emprestimo', '0007_emprestimo_aberto_por_livro'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(condition=models.Q(('data_devolucao__isnull', True)), fields=['leitor', 'data_devolucao_prevista'], name='emprestimo_aberto_leitor'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(condition=models.Q(('data_devolucao__isnull', True)), fields=['data_devolucao_prevista'], name='emprestimo_aberto_prevista'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['-data_emprestimo'], name='emprestimo_recentes'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+COLUNAS = (
+    'id, livro_id, leitor_id, emprestado_por_id, data_emprestimo, data_devolucao_prevista, '
+    'data_devolucao, multa, renovacao_id, emprestimo_original_id, numero_renovacao'
+)
+
+CRIAR_HISTORICO = f"""
+CREATE VIEW app_emprestimo_historico AS
+SELECT {COLUNAS}, FALSE AS arquivado FROM app_emprestimo_emprestimo
+UNION ALL
+SELECT {COLUNAS}, TRUE AS arquivado FROM app_emprestimo_emprestimoarquivado
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_funcionario', '0002_normalizados'),
+        ('app_livro', '0007_livrotrigrama'),
+        ('app_leitor', '0003_situacao_circulacao'),
+        ('app_emprestimo', '0008_indices_emprestimos_abertos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmprestimoHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_emprestimo', models.DateTimeField()),
+                ('data_devolucao_prevista', models.DateField()),
+                ('data_devolucao', models.DateField(null=True)),
+                ('multa', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('numero_renovacao', models.PositiveSmallIntegerField()),
+                ('arquivado', models.BooleanField()),
+            ],
+            options={
+                'verbose_name': 'Empréstimo (histórico)',
+                'verbose_name_plural': 'Empréstimos (histórico)',
+                'db_table': 'app_emprestimo_historico',
+                'ordering': ['-data_emprestimo'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='EmprestimoArquivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_emprestimo', models.DateTimeField()),
+                ('data_devolucao_prevista', models.DateField()),
+                ('data_devolucao', models.DateField(blank=True, null=True)),
+                ('multa', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('numero_renovacao', models.PositiveSmallIntegerField(default=0)),
+                ('emprestado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app_funcionario.funcionario')),
+                ('emprestimo_original', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cadeia', to='app_emprestimo.emprestimoarquivado')),
+                ('leitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emprestimos_arquivados', to='app_leitor.leitor')),
+                ('livro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emprestimos_arquivados', to='app_livro.livro')),
+                ('renovacao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='renovacoes', to='app_emprestimo.emprestimoarquivado')),
+            ],
+            options={
+                'verbose_name': 'Empréstimo arquivado',
+                'verbose_name_plural': 'Empréstimos arquivados',
+                'ordering': ['-data_emprestimo'],
+            },
+        ),
+        migrations.AddField(
+            model_name='lancamentomulta',
+            name='emprestimo_arquivado',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lancamentos_multa', to='app_emprestimo.emprestimoarquivado'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimoarquivado',
+            index=models.Index(fields=['-data_emprestimo'], name='arquivado_recentes'),
+        ),
+        migrations.RunSQL(CRIAR_HISTORICO, 'DROP VIEW app_emprestimo_historico'),
+    ]
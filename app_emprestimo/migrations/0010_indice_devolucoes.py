@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_emprestimo', '0009_arquivo_emprestimos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(condition=models.Q(('data_devolucao__isnull', False)), fields=['data_devolucao'], name='emprestimo_devolvidos'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimoarquivado',
+            index=models.Index(fields=['data_devolucao'], name='arquivado_devolucao'),
+        ),
+    ]
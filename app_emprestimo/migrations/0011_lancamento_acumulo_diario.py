@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_emprestimo', '0010_indice_devolucoes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='lancamentomulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('origem', 'acumulo')), fields=('emprestimo', 'data'), name='lancamento_acumulo_diario'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from decimal import Decimal
@@ -5,6 +6,84 @@ from app_livro.models import Livro
 from app_leitor.models import Leitor
 from app_funcionario.models import Funcionario
 
+LIMITE_RENOVACOES = 2
+LIMITE_EMPRESTIMOS_ATIVOS = 3
+CENTAVO = Decimal('0.01')
+
+def multa_diaria():
+    """Valor da multa por dia de atraso (settings.MULTA_DIARIA), em Decimal"""
+    return Decimal(str(getattr(settings, 'MULTA_DIARIA', '2.00'))).quantize(CENTAVO)
+
+class DiasEntre(models.Func):
+    """Número inteiro de dias de `inicio` até `fim` (datas), calculado no banco"""
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+    output_field = models.IntegerField()
+    
+    def __init__(self, inicio, fim, **extra):
+        super().__init__(fim, inicio, **extra)
+    
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+    
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='DATEDIFF(%(expressions)s)', arg_joiner=', ', **extra_context)
+
+class EmprestimoQuerySet(models.QuerySet):
+    def abertos(self):
+        """Empréstimos ainda não devolvidos (atendidos pelos índices parciais)"""
+        return self.filter(data_devolucao__isnull=True)
+    
+    def atrasados(self, hoje=None):
+        """Empréstimos em aberto com a devolução prevista antes de hoje"""
+        return self.abertos().filter(data_devolucao_prevista__lt=hoje or timezone.now().date())
+    
+    def com_situacao(self, hoje=None):
+        """
+        Anota a situação de cada empréstimo calculada no banco, com as mesmas
+        regras de esta_atrasado, calcular_multa e pode_renovar:
+        atrasado, dias_atraso, multa_estimada (a multa gravada, se já
+        devolvido) e renovavel. Permite filtrar e ordenar por elas.
+        """
+        hoje = hoje or timezone.now().date()
+        taxa = multa_diaria()
+        em_atraso = models.Q(data_devolucao__isnull=True, data_devolucao_prevista__lt=hoje)
+        devolvido_com_atraso = models.Q(data_devolucao__gt=models.F('data_devolucao_prevista'))
+        decimal = models.DecimalField(max_digits=8, decimal_places=2)
+        return self.annotate(
+            atrasado=models.Case(
+                models.When(em_atraso, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+            dias_atraso=models.Case(
+                models.When(em_atraso, then=DiasEntre(
+                    'data_devolucao_prevista', models.Value(hoje, output_field=models.DateField()),
+                )),
+                models.When(devolvido_com_atraso, then=DiasEntre('data_devolucao_prevista', 'data_devolucao')),
+                default=models.Value(0),
+                output_field=models.IntegerField(),
+            ),
+            renovavel=models.Case(
+                models.When(~em_atraso & models.Q(numero_renovacao__lt=LIMITE_RENOVACOES), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        ).annotate(
+            multa_estimada=models.Case(
+                models.When(data_devolucao__isnull=False, then=models.F('multa')),
+                default=models.ExpressionWrapper(
+                    models.F('dias_atraso') * models.Value(taxa), output_field=decimal,
+                ),
+                output_field=decimal,
+            ),
+        )
+
 class Emprestimo(models.Model):
     livro = models.ForeignKey(Livro, on_delete=models.CASCADE)
     leitor = models.ForeignKey(Leitor, on_delete=models.CASCADE)
@@ -14,31 +93,43 @@ class Emprestimo(models.Model):
     data_devolucao = models.DateField(null=True, blank=True)
     multa = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     renovacao = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='renovacoes')
+    # Raiz da cadeia de renovações (vazio no próprio empréstimo original) e
+    # quantas renovações levaram até este empréstimo, preenchidos no save
+    emprestimo_original = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='cadeia')
+    numero_renovacao = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    objects = EmprestimoQuerySet.as_manager()
     
     def esta_atrasado(self):
         """Verifica se o empréstimo está atrasado"""
         return not self.data_devolucao and self.data_devolucao_prevista < timezone.now().date()
     
     def contar_renovacoes(self):
-        """Conta quantas renovações foram feitas recursivamente"""
-        count = 0
-        emprestimo_atual = self
-        while emprestimo_atual.renovacao:
-            count += 1
-            emprestimo_atual = emprestimo_atual.renovacao
-        return count
+        """Quantas renovações foram feitas até este empréstimo"""
+        return self.numero_renovacao
+    
+    @property
+    def emprestimo_original_pk(self):
+        """Id da raiz da cadeia de renovações, sem consultar o banco"""
+        return self.emprestimo_original_id or self.pk
     
     def get_emprestimo_original(self):
         """Retorna o empréstimo original (raiz da cadeia de renovações)"""
-        emprestimo_atual = self
-        while emprestimo_atual.renovacao:
-            emprestimo_atual = emprestimo_atual.renovacao
-        return emprestimo_atual
+        if self.emprestimo_original_id is None:
+            return self
+        return self.emprestimo_original
     
     def pode_renovar(self):
         """Verifica se o empréstimo pode ser renovado"""
         # Não pode renovar se está atrasado ou já foi renovado 2 vezes
-        return not self.esta_atrasado() and self.contar_renovacoes() < 2
+        return not self.esta_atrasado() and self.contar_renovacoes() < LIMITE_RENOVACOES
+    
+    def save(self, *args, **kwargs):
+        if self.renovacao_id and not self.numero_renovacao:
+            anterior = self.renovacao
+            self.emprestimo_original_id = anterior.emprestimo_original_pk
+            self.numero_renovacao = anterior.numero_renovacao + 1
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.livro.titulo} - {self.leitor}"
@@ -47,3 +138,156 @@ class Emprestimo(models.Model):
         verbose_name = 'Empréstimo'
         verbose_name_plural = 'Empréstimos'
         ordering = ['-data_emprestimo']
+        indexes = [
+            # Quase toda consulta do dia a dia olha só os empréstimos em
+            # aberto; os índices parciais ficam do tamanho deles, não do
+            # histórico. O índice por livro em aberto é o da restrição abaixo.
+            models.Index(
+                fields=['leitor', 'data_devolucao_prevista'],
+                condition=models.Q(data_devolucao__isnull=True),
+                name='emprestimo_aberto_leitor',
+            ),
+            models.Index(
+                fields=['data_devolucao_prevista'],
+                condition=models.Q(data_devolucao__isnull=True),
+                name='emprestimo_aberto_prevista',
+            ),
+            models.Index(fields=['-data_emprestimo'], name='emprestimo_recentes'),
+            # Devoluções por dia (resumos diários do painel de análises)
+            models.Index(
+                fields=['data_devolucao'],
+                condition=models.Q(data_devolucao__isnull=False),
+                name='emprestimo_devolvidos',
+            ),
+        ]
+        constraints = [
+            # Um exemplar só pode ter um empréstimo em aberto: dois balcões
+            # emprestando o mesmo livro ao mesmo tempo falham no banco
+            models.UniqueConstraint(
+                fields=['livro'],
+                condition=models.Q(data_devolucao__isnull=True),
+                name='emprestimo_aberto_por_livro',
+            ),
+        ]
+
+class EmprestimoArquivado(models.Model):
+    """
+    Empréstimos antigos já encerrados, movidos de Emprestimo pelo comando
+    archive_loans com a cadeia de renovações inteira e o mesmo id. Mesmas
+    colunas de Emprestimo; as telas de histórico leem as duas tabelas por
+    EmprestimoHistorico.
+    """
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='emprestimos_arquivados')
+    leitor = models.ForeignKey(Leitor, on_delete=models.CASCADE, related_name='emprestimos_arquivados')
+    emprestado_por = models.ForeignKey(Funcionario, on_delete=models.SET_NULL, null=True, related_name='+')
+    data_emprestimo = models.DateTimeField()
+    data_devolucao_prevista = models.DateField()
+    data_devolucao = models.DateField(null=True, blank=True)
+    multa = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    renovacao = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='renovacoes')
+    emprestimo_original = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='cadeia')
+    numero_renovacao = models.PositiveSmallIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.livro_id} - {self.leitor_id} ({self.data_devolucao})"
+    
+    class Meta:
+        verbose_name = 'Empréstimo arquivado'
+        verbose_name_plural = 'Empréstimos arquivados'
+        ordering = ['-data_emprestimo']
+        indexes = [
+            models.Index(fields=['-data_emprestimo'], name='arquivado_recentes'),
+            models.Index(fields=['data_devolucao'], name='arquivado_devolucao'),
+        ]
+
+class EmprestimoHistorico(models.Model):
+    """
+    Visão (VIEW app_emprestimo_historico) com os empréstimos em uso e os
+    arquivados, para as telas de histórico e exportações. Somente leitura;
+    as telas do dia a dia usam Emprestimo, que só tem a tabela viva.
+    """
+    livro = models.ForeignKey(Livro, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    leitor = models.ForeignKey(Leitor, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    emprestado_por = models.ForeignKey(Funcionario, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    data_emprestimo = models.DateTimeField()
+    data_devolucao_prevista = models.DateField()
+    data_devolucao = models.DateField(null=True)
+    multa = models.DecimalField(max_digits=6, decimal_places=2)
+    renovacao = models.ForeignKey('self', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    emprestimo_original = models.ForeignKey('self', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    numero_renovacao = models.PositiveSmallIntegerField()
+    arquivado = models.BooleanField()
+    
+    objects = EmprestimoQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"{self.livro_id} - {self.leitor_id}"
+    
+    class Meta:
+        managed = False
+        db_table = 'app_emprestimo_historico'
+        verbose_name = 'Empréstimo (histórico)'
+        verbose_name_plural = 'Empréstimos (histórico)'
+        ordering = ['-data_emprestimo']
+
+class Recomendacao(models.Model):
+    """
+    Vizinhos de cada livro pelo histórico de empréstimos ("quem pegou este
+    livro também pegou"), gerados em lote pelo comando build_recommendations.
+    """
+    # Coberto pelo índice único (livro, posicao), que também serve a ordenação
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='recomendacoes', db_index=False)
+    recomendado = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='recomendado_em')
+    posicao = models.PositiveSmallIntegerField()
+    pontuacao = models.FloatField()
+    
+    def __str__(self):
+        return f"{self.livro_id} -> {self.recomendado_id} ({self.pontuacao:.3f})"
+    
+    class Meta:
+        verbose_name = 'Recomendação'
+        verbose_name_plural = 'Recomendações'
+        constraints = [
+            models.UniqueConstraint(fields=['livro', 'posicao'], name='recomendacao_livro_posicao'),
+        ]
+
+class LancamentoMulta(models.Model):
+    """
+    Livro-razão das multas: cada variação da multa de um empréstimo vira um
+    lançamento, com o saldo acumulado do leitor logo após ele.
+    """
+    ORIGEM_ACUMULO = 'acumulo'
+    ORIGEM_DEVOLUCAO = 'devolucao'
+    ORIGENS = [
+        (ORIGEM_ACUMULO, 'Acúmulo diário'),
+        (ORIGEM_DEVOLUCAO, 'Devolução'),
+    ]
+    
+    leitor = models.ForeignKey(Leitor, on_delete=models.CASCADE, related_name='lancamentos_multa')
+    emprestimo = models.ForeignKey(Emprestimo, on_delete=models.SET_NULL, null=True, blank=True, related_name='lancamentos_multa')
+    # Preenchido (e emprestimo esvaziado) quando o empréstimo vai para o arquivo
+    emprestimo_arquivado = models.ForeignKey(EmprestimoArquivado, on_delete=models.SET_NULL, null=True, blank=True, related_name='lancamentos_multa')
+    data = models.DateField()
+    origem = models.CharField(max_length=20, choices=ORIGENS)
+    valor = models.DecimalField(max_digits=8, decimal_places=2)
+    saldo = models.DecimalField(max_digits=10, decimal_places=2)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.leitor_id} {self.data} {self.valor} (saldo {self.saldo})"
+    
+    class Meta:
+        verbose_name = 'Lançamento de multa'
+        verbose_name_plural = 'Lançamentos de multa'
+        indexes = [
+            # Último lançamento (saldo atual) de cada leitor
+            models.Index(fields=['leitor', '-id'], name='lancamento_leitor_recente'),
+        ]
+        constraints = [
+            # Um acúmulo por empréstimo e dia: accrue_fines repetido não lança de novo
+            models.UniqueConstraint(
+                fields=['emprestimo', 'data'],
+                condition=models.Q(origem='acumulo'),
+                name='lancamento_acumulo_diario',
+            ),
+        ]
@@ -0,0 +1,149 @@
+"""
+Acúmulo de multas e livro-razão (LancamentoMulta).
+
+O acúmulo noturno (comando accrue_fines) atualiza a multa de todos os
+empréstimos em atraso com um único UPDATE, calculando no banco dias de
+atraso x multa diária. Antes disso, um único SELECT calcula a variação de
+cada empréstimo e o saldo acumulado por leitor (função de janela), e os
+lançamentos são gravados em lote. Rodar de novo no mesmo dia não gera nada
+(e o índice único lancamento_acumulo_diario garante isso no banco).
+
+O saldo de cada leitor também fica em Leitor.saldo_multas, gravado junto
+com os lançamentos (veja situacao.py).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    DecimalField, Exists, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value, Window,
+)
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+
+from app_leitor.models import Leitor
+from .models import CENTAVO, DiasEntre, Emprestimo, LancamentoMulta, multa_diaria
+
+ZERO = Decimal('0.00')
+DECIMAL = DecimalField(max_digits=10, decimal_places=2)
+
+
+def subconsulta_saldo(leitor):
+    """
+    Subconsulta com o saldo do último lançamento do leitor (0 se não houver),
+    para UPDATEs e anotações; saldo_atual é a versão para um leitor só
+    """
+    return Coalesce(
+        Subquery(
+            LancamentoMulta.objects.filter(leitor=leitor).order_by('-id').values('saldo')[:1],
+            output_field=DECIMAL,
+        ),
+        Value(ZERO),
+        output_field=DECIMAL,
+    )
+
+
+def saldo_atual(leitor):
+    """Saldo de multas do leitor, pelo último lançamento"""
+    ultimo = LancamentoMulta.objects.filter(leitor=leitor).order_by('-id').values_list('saldo', flat=True).first()
+    return ultimo if ultimo is not None else ZERO
+
+
+def registrar(emprestimo, valor, origem, data=None):
+    """Lança uma variação de multa do empréstimo, atualizando o saldo do leitor"""
+    valor = Decimal(valor).quantize(CENTAVO)
+    if not valor:
+        return None
+    with transaction.atomic():
+        # Serializa os lançamentos do mesmo leitor (no SQLite a escrita já é exclusiva)
+        Leitor.objects.select_for_update().filter(pk=emprestimo.leitor_id).exists()
+        lancamento = LancamentoMulta.objects.create(
+            leitor_id=emprestimo.leitor_id,
+            emprestimo=emprestimo,
+            data=data or timezone.now().date(),
+            origem=origem,
+            valor=valor,
+            saldo=saldo_atual(emprestimo.leitor_id) + valor,
+        )
+        Leitor.objects.filter(pk=emprestimo.leitor_id).update(saldo_multas=lancamento.saldo)
+        return lancamento
+
+
+def registrar_varios(variacoes, origem, data=None):
+    """
+    Lança de uma vez as variações [(emprestimo, valor)] de vários
+    empréstimos (balcão em lote), com o saldo corrente de cada leitor.
+    Retorna os lançamentos gravados.
+    """
+    variacoes = [(emprestimo, Decimal(valor).quantize(CENTAVO)) for emprestimo, valor in variacoes]
+    variacoes = [(emprestimo, valor) for emprestimo, valor in variacoes if valor]
+    if not variacoes:
+        return []
+    data = data or timezone.now().date()
+    leitores = {emprestimo.leitor_id for emprestimo, _ in variacoes}
+    with transaction.atomic():
+        list(Leitor.objects.select_for_update().filter(pk__in=leitores).values_list('pk', flat=True))
+        saldos = dict(Leitor.objects.filter(pk__in=leitores).annotate(
+            saldo=subconsulta_saldo(OuterRef('pk')),
+        ).values_list('pk', 'saldo'))
+        lancamentos = []
+        for emprestimo, valor in variacoes:
+            saldos[emprestimo.leitor_id] = Decimal(saldos[emprestimo.leitor_id]).quantize(CENTAVO) + valor
+            lancamentos.append(LancamentoMulta(
+                leitor_id=emprestimo.leitor_id, emprestimo=emprestimo, data=data,
+                origem=origem, valor=valor, saldo=saldos[emprestimo.leitor_id],
+            ))
+        for leitor, saldo in saldos.items():
+            Leitor.objects.filter(pk=leitor).update(saldo_multas=saldo)
+        return LancamentoMulta.objects.bulk_create(lancamentos)
+
+
+def acumular(hoje=None, batch_size=2000):
+    """
+    Atualiza a multa dos empréstimos em aberto e atrasados para dias de
+    atraso x multa diária (a mesma de calcular_multa e do balcão) e lança
+    as variações. Retorna (empréstimos atualizados, lançamentos gravados).
+
+    As contas são feitas em centavos inteiros no banco (no SQLite, decimal
+    vira ponto flutuante), e empréstimos que já têm o acúmulo do dia são
+    ignorados: rodar de novo para a mesma data não lança nada.
+    """
+    hoje = hoje or timezone.now().date()
+    taxa_centavos = int(multa_diaria() / CENTAVO)
+    centavos = DiasEntre('data_devolucao_prevista', Value(hoje)) * Value(taxa_centavos)
+    multa_centavos = Cast(Round(F('multa') * Value(100)), IntegerField())
+    # Centavos x 0,01: exato onde há decimal de verdade; no SQLite a leitura arredonda
+    nova_multa = ExpressionWrapper(centavos * Value(CENTAVO), output_field=DECIMAL)
+    acumulado_hoje = Exists(LancamentoMulta.objects.filter(
+        emprestimo=OuterRef('pk'), data=hoje, origem=LancamentoMulta.ORIGEM_ACUMULO,
+    ))
+    com_variacao = (Emprestimo.objects
+                    .filter(data_devolucao__isnull=True, data_devolucao_prevista__lt=hoje)
+                    .annotate(variacao=ExpressionWrapper(centavos - multa_centavos, output_field=IntegerField()))
+                    .exclude(variacao=0))
+
+    with transaction.atomic():
+        variacoes = (com_variacao
+                     .exclude(acumulado_hoje)
+                     .annotate(
+                         saldo_anterior=subconsulta_saldo(OuterRef('leitor_id')),
+                         acumulado=Window(Sum('variacao'), partition_by=[F('leitor_id')], order_by=F('pk').asc()),
+                     )
+                     .order_by('leitor_id', 'pk')
+                     .values_list('pk', 'leitor_id', 'variacao', 'saldo_anterior', 'acumulado'))
+        lancamentos = [
+            LancamentoMulta(
+                leitor_id=leitor, emprestimo_id=pk, data=hoje, origem=LancamentoMulta.ORIGEM_ACUMULO,
+                valor=variacao * CENTAVO,
+                saldo=Decimal(saldo_anterior).quantize(CENTAVO) + acumulado * CENTAVO,
+            )
+            for pk, leitor, variacao, saldo_anterior, acumulado in variacoes.iterator(chunk_size=batch_size)
+        ]
+        LancamentoMulta.objects.bulk_create(lancamentos, batch_size=batch_size)
+        if not lancamentos:
+            return 0, 0
+        Leitor.objects.filter(pk__in=LancamentoMulta.objects.filter(
+            data=hoje, origem=LancamentoMulta.ORIGEM_ACUMULO,
+        ).values('leitor_id')).update(saldo_multas=subconsulta_saldo(OuterRef('pk')))
+        # Só os empréstimos lançados agora (os de antes já estão com a multa do dia)
+        atualizados = com_variacao.filter(acumulado_hoje).update(multa=nova_multa)
+    return atualizados, len(lancamentos)
@@ -0,0 +1,127 @@
+"""
+Recomendações "quem pegou este livro também pegou".
+
+O cálculo roda em lote (comando build_recommendations): monta a matriz
+esparsa leitor x livro a partir dos empréstimos, calcula a similaridade do
+cosseno entre livros pela coocorrência de leitores e grava os k vizinhos
+mais próximos de cada livro na tabela Recomendacao. As páginas só leem
+essa tabela, pelo índice (livro, posicao); veja consultas.py.
+
+Com NumPy/SciPy instalados a coocorrência é uma multiplicação de matrizes
+esparsas feita em blocos de livros; sem eles o mesmo resultado é calculado
+em Python puro, o que serve para acervos pequenos.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import EmprestimoHistorico, Recomendacao
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+VIZINHOS_POR_LIVRO = 10
+LIVROS_POR_BLOCO = 2000
+
+
+def pares_leitor_livro():
+    """
+    Pares (leitor, livro) distintos do histórico, incluindo o arquivo.
+    Renovações repetem o leitor e o livro do empréstimo original, então só a
+    raiz de cada cadeia entra na conta.
+    """
+    return (EmprestimoHistorico.objects
+            .filter(renovacao__isnull=True)
+            .values_list('leitor_id', 'livro_id')
+            .distinct()
+            .order_by())
+
+
+def _vizinhos_scipy(pares, k, bloco):
+    dados = np.array(pares, dtype=np.int64).reshape(-1, 2)
+    leitores, linhas = np.unique(dados[:, 0], return_inverse=True)
+    livros, colunas = np.unique(dados[:, 1], return_inverse=True)
+    matriz = sparse.csr_matrix(
+        (np.ones(len(dados), dtype=np.float64), (linhas, colunas)),
+        shape=(len(leitores), len(livros)),
+    )
+    # Com pares distintos a matriz é binária: a norma de cada coluna é a
+    # raiz do número de leitores do livro
+    normas = np.sqrt(np.asarray(matriz.sum(axis=0)).ravel())
+    transposta = matriz.T.tocsr()
+
+    for inicio in range(0, len(livros), bloco):
+        coocorrencia = (transposta[inicio:inicio + bloco] @ matriz).tocsr()
+        for linha in range(coocorrencia.shape[0]):
+            livro = inicio + linha
+            ini, fim = coocorrencia.indptr[linha], coocorrencia.indptr[linha + 1]
+            vizinhos = coocorrencia.indices[ini:fim]
+            valores = coocorrencia.data[ini:fim] / (normas[livro] * normas[vizinhos])
+            outros = vizinhos != livro
+            vizinhos, valores = vizinhos[outros], valores[outros]
+            if not len(vizinhos):
+                continue
+            # Empates ficam com o livro de menor id, como no cálculo em Python
+            ordem = np.lexsort((livros[vizinhos], -valores))[:k]
+            yield int(livros[livro]), [
+                (int(livros[vizinhos[i]]), float(valores[i])) for i in ordem
+            ]
+
+
+def _vizinhos_python(pares, k, bloco=None):
+    livros_por_leitor = defaultdict(list)
+    for leitor, livro in pares:
+        livros_por_leitor[leitor].append(livro)
+
+    leitores_por_livro = Counter()
+    coocorrencia = defaultdict(Counter)
+    for livros in livros_por_leitor.values():
+        leitores_por_livro.update(livros)
+        for livro in livros:
+            contagem = coocorrencia[livro]
+            for outro in livros:
+                if outro != livro:
+                    contagem[outro] += 1
+
+    for livro in sorted(coocorrencia):
+        norma = math.sqrt(leitores_por_livro[livro])
+        similares = heapq.nsmallest(k, (
+            (-n / (norma * math.sqrt(leitores_por_livro[outro])), outro)
+            for outro, n in coocorrencia[livro].items()
+        ))
+        yield livro, [(outro, -valor) for valor, outro in similares]
+
+
+def calcular_vizinhos(pares, k=VIZINHOS_POR_LIVRO, bloco=LIVROS_POR_BLOCO):
+    """Gera (livro_id, [(vizinho_id, similaridade), ...]) em ordem decrescente"""
+    calcular = _vizinhos_scipy if sparse is not None else _vizinhos_python
+    return calcular(pares, k, bloco)
+
+
+def reconstruir(k=VIZINHOS_POR_LIVRO, bloco=LIVROS_POR_BLOCO, batch_size=2000):
+    """Recalcula e substitui todas as recomendações. Retorna quantas gravou."""
+    pares = list(pares_leitor_livro().iterator(chunk_size=batch_size))
+    vizinhos = list(calcular_vizinhos(pares, k, bloco))
+
+    total = 0
+    lote = []
+    with transaction.atomic():
+        Recomendacao.objects.all().delete()
+        for livro, similares in vizinhos:
+            for posicao, (recomendado, pontuacao) in enumerate(similares, 1):
+                lote.append(Recomendacao(
+                    livro_id=livro, recomendado_id=recomendado,
+                    posicao=posicao, pontuacao=pontuacao,
+                ))
+            if len(lote) >= batch_size:
+                Recomendacao.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        Recomendacao.objects.bulk_create(lote)
+        total += len(lote)
+    return total
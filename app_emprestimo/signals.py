@@ -0,0 +1,43 @@
+"""
+Sinais de Emprestimo que invalidam dados derivados do catálogo e mantêm a
+situação de circulação do leitor.
+
+circulacao_alterada avisa que empréstimos foram criados, devolvidos ou
+renovados; é enviado dentro da transação, também pelas operações em lote
+do balcão, que não passam pelos sinais de modelo.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from app_livro import facetas
+from . import situacao
+from .models import Emprestimo
+
+circulacao_alterada = Signal()
+
+
+@receiver(post_save, sender=Emprestimo)
+@receiver(post_delete, sender=Emprestimo)
+def invalidar_facetas(sender, raw=False, **kwargs):
+    # Empréstimos mudam a disponibilidade dos livros
+    if raw:
+        return
+    transaction.on_commit(facetas.invalidar)
+
+
+@receiver(post_save, sender=Emprestimo)
+@receiver(post_delete, sender=Emprestimo)
+def atualizar_situacao_do_leitor(sender, instance, raw=False, **kwargs):
+    # Mesma transação do save: contadores do leitor nunca ficam para trás
+    if raw:
+        return
+    situacao.atualizar([instance.leitor_id])
+
+
+@receiver(post_save, sender=Emprestimo)
+@receiver(post_delete, sender=Emprestimo)
+def avisar_circulacao(sender, raw=False, **kwargs):
+    if raw:
+        return
+    circulacao_alterada.send(sender=Emprestimo)
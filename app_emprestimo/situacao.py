@@ -0,0 +1,60 @@
+"""
+Situação de circulação desnormalizada de cada leitor.
+
+Leitor guarda quantos empréstimos tem em aberto, a devolução prevista mais
+próxima e o saldo de multas, para que a elegibilidade do empréstimo
+(EmprestimoForm.clean_leitor) e o painel do leitor leiam uma única linha.
+
+Os contadores são recalculados a cada empréstimo, devolução e renovação,
+dentro da mesma transação, com um UPDATE por subconsulta restrito aos
+leitores afetados (pelo índice emprestimo_aberto_leitor, que já cobre as
+duas colunas). O saldo de multas é gravado por multas.py junto com cada
+lançamento. O comando repair_reader_state recalcula tudo de uma vez.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from app_leitor.models import Leitor
+from .models import Emprestimo
+from .multas import subconsulta_saldo
+
+
+def _contadores():
+    abertos = Emprestimo.objects.abertos().filter(leitor=OuterRef('pk')).order_by()
+    return {
+        'emprestimos_ativos': Coalesce(
+            Subquery(abertos.values('leitor').annotate(total=Count('pk')).values('total')),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+        'proxima_devolucao': Subquery(
+            abertos.order_by('data_devolucao_prevista').values('data_devolucao_prevista')[:1],
+        ),
+    }
+
+
+def atualizar(leitores):
+    """Recalcula os contadores de empréstimos dos leitores informados (ids ou objetos)"""
+    ids = {getattr(leitor, 'pk', leitor) for leitor in leitores}
+    ids.discard(None)
+    if not ids:
+        return 0
+    return Leitor.objects.filter(pk__in=ids).update(**_contadores())
+
+
+def reparar(batch_size=2000):
+    """
+    Recalcula contadores e saldo de multas de todos os leitores, por faixas
+    de id (um UPDATE por faixa, cada um na sua transação). Retorna quantos
+    leitores foram processados.
+    """
+    valores = {**_contadores(), 'saldo_multas': subconsulta_saldo(OuterRef('pk'))}
+    ids = Leitor.objects.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    ultimo = 0
+    while True:
+        faixa = list(ids.filter(pk__gt=ultimo)[:batch_size])
+        if not faixa:
+            return total
+        total += Leitor.objects.filter(pk__gte=faixa[0], pk__lte=faixa[-1]).update(**valores)
+        ultimo = faixa[-1]
@@ -1,3 +1,594 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+import re
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app_funcionario.models import Funcionario
+from app_leitor.models import Leitor
+from app_livro.models import Livro
+from . import arquivo, balcao, multas, recomendacoes, situacao
+from .consultas import filtrar_emprestimos, recomendados_para_leitor, recomendados_para_livro
+from .forms import EmprestimoForm
+from .management.commands.backfill_renewal_chains import calcular_cadeias
+from .models import LIMITE_EMPRESTIMOS_ATIVOS, Emprestimo, EmprestimoArquivado, EmprestimoHistorico, LancamentoMulta
+from .views import calcular_multa
+
+TABELA = Emprestimo._meta.db_table
+INDICES_ABERTOS = ('emprestimo_aberto_leitor', 'emprestimo_aberto_prevista', 'emprestimo_aberto_por_livro')
+
+
+def criar_usuarios():
+    """Funcionário e leitor de balcão, já nos seus grupos"""
+    funcionario = Funcionario.objects.create_user(
+        'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+    )
+    funcionario.groups.add(Group.objects.get_or_create(name='Funcionarios')[0])
+    leitor = Leitor.objects.create_user(
+        'leitor', password='senha', first_name='Ana', last_name='Souza',
+        cpf='52998224725', telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+    )
+    leitor.groups.add(Group.objects.get_or_create(name='Leitores')[0])
+    return funcionario, leitor
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Planos de execução conferidos no SQLite')
+class IndicesEmprestimosAbertosTest(TestCase):
+    """As consultas sobre empréstimos em aberto usam os índices parciais"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+
+        hoje = date.today()
+        for numero in range(6):
+            livro = Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000, genero='Romance')
+            Emprestimo.objects.create(
+                livro=livro, leitor=cls.leitor, emprestado_por=cls.funcionario,
+                data_devolucao_prevista=hoje + timedelta(days=numero - 3),
+                data_devolucao=hoje if numero % 3 else None,
+            )
+
+    def planos_sobre_abertos(self, consultas):
+        """Plano (EXPLAIN QUERY PLAN) de cada consulta que filtra empréstimos em aberto"""
+        planos = []
+        for consulta in consultas:
+            sql = consulta['sql']
+            if TABELA not in sql or not re.search(r'"?data_devolucao"? IS NULL', sql):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plano = ' | '.join(linha[-1] for linha in cursor.fetchall())
+            planos.append((sql, plano))
+        self.assertTrue(planos, 'Nenhuma consulta sobre empréstimos em aberto foi feita')
+        return planos
+
+    def assertUsaIndicesParciais(self, consultas):
+        for sql, plano in self.planos_sobre_abertos(consultas):
+            linhas = [linha for linha in plano.split(' | ') if f' {TABELA} ' in f' {linha} ']
+            for linha in linhas:
+                self.assertTrue(
+                    any(indice in linha for indice in INDICES_ABERTOS),
+                    f'{sql}\n{plano}',
+                )
+
+    def test_dashboard_do_funcionario(self):
+        self.client.force_login(self.funcionario)
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('app_dashboard:home'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertUsaIndicesParciais(consultas.captured_queries)
+
+    def test_dashboard_do_leitor(self):
+        self.client.force_login(self.leitor)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('app_dashboard:home'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertUsaIndicesParciais(consultas.captured_queries)
+
+    def test_elegibilidade_do_leitor_no_emprestimo(self):
+        # A elegibilidade lê a situação desnormalizada do leitor: nenhuma
+        # consulta a empréstimos
+        livro = Livro.objects.create(titulo='Disponível', autor='Autor', ano=2001, genero='Romance')
+        form = EmprestimoForm(data={'livro': livro.pk, 'leitor': self.leitor.pk, 'dias_emprestimo': 14})
+        with CaptureQueriesContext(connection) as consultas:
+            form.is_valid()
+        self.assertIn('leitor', form.errors)
+        self.assertFalse([consulta for consulta in consultas.captured_queries if TABELA in consulta['sql']])
+
+    def test_situacao_do_leitor_usa_indices_parciais(self):
+        with CaptureQueriesContext(connection) as consultas:
+            situacao.atualizar([self.leitor])
+        self.assertUsaIndicesParciais(consultas.captured_queries)
+        self.leitor.refresh_from_db()
+        self.assertEqual(self.leitor.emprestimos_ativos, 2)
+        self.assertEqual(self.leitor.proxima_devolucao, date.today() - timedelta(days=3))
+
+    def test_listagem_ordenada_pelo_indice_de_recentes(self):
+        plano = Emprestimo.objects.all()[:20].explain()
+        self.assertIn('emprestimo_recentes', plano)
+
+
+class DevolucaoTest(TestCase):
+    """A devolução fecha o empréstimo e libera o livro na mesma transação"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+
+    def setUp(self):
+        self.client.force_login(self.funcionario)
+
+    def test_devolucao_de_duplicata_antiga(self):
+        Livro.objects.create(titulo='Dom Casmurro', autor='Machado de Assis', ano=1899, genero='Romance')
+        duplicata = Livro.objects.create(titulo='Outro', autor='Machado de Assis', ano=1899, genero='Romance')
+        # Duplicata já cadastrada antes da chave de duplicidade (migração 0005)
+        Livro.objects.filter(pk=duplicata.pk).update(titulo='Dom Casmurro', chave_duplicidade=None)
+        emprestimo = balcao.emprestar(Livro.objects.get(pk=duplicata.pk), self.leitor, self.funcionario)
+
+        resposta = self.client.post(
+            reverse('app_emprestimo:devolver', args=[emprestimo.pk]), {'confirmar_devolucao': 'on'},
+        )
+        self.assertRedirects(resposta, reverse('app_emprestimo:listar'))
+        emprestimo.refresh_from_db()
+        self.assertIsNotNone(emprestimo.data_devolucao)
+        self.assertTrue(Livro.objects.get(pk=duplicata.pk).disponivel)
+
+
+@override_settings(MULTA_DIARIA='0.10')
+class AcumuloMultasTest(TestCase):
+    """O acúmulo noturno é idempotente por data e usa a mesma taxa da devolução"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+
+    def setUp(self):
+        self.hoje = date.today()
+        self.livro = Livro.objects.create(titulo='Atrasado', autor='Autor', ano=2000, genero='Romance')
+        self.emprestimo = balcao.emprestar(self.livro, self.leitor, self.funcionario)
+        Emprestimo.objects.filter(pk=self.emprestimo.pk).update(data_devolucao_prevista=self.hoje - timedelta(days=4))
+
+    def lancamentos(self, **filtros):
+        return list(LancamentoMulta.objects.filter(leitor=self.leitor, **filtros).order_by('pk')
+                    .values_list('data', 'origem', 'valor', 'saldo'))
+
+    def test_rodar_duas_vezes_no_mesmo_dia_nao_duplica(self):
+        ontem = self.hoje - timedelta(days=1)
+        self.assertEqual(multas.acumular(hoje=ontem), (1, 1))
+        self.assertEqual(multas.acumular(hoje=ontem), (0, 0))
+        self.assertEqual(multas.acumular(hoje=self.hoje), (1, 1))
+        self.assertEqual(multas.acumular(hoje=self.hoje), (0, 0))
+        self.assertEqual(self.lancamentos(), [
+            (ontem, LancamentoMulta.ORIGEM_ACUMULO, Decimal('0.30'), Decimal('0.30')),
+            (self.hoje, LancamentoMulta.ORIGEM_ACUMULO, Decimal('0.10'), Decimal('0.40')),
+        ])
+        self.emprestimo.refresh_from_db()
+        self.assertEqual(self.emprestimo.multa, Decimal('0.40'))
+
+    def test_indice_unico_por_emprestimo_e_dia(self):
+        multas.acumular(hoje=self.hoje)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LancamentoMulta.objects.create(
+                leitor=self.leitor, emprestimo=self.emprestimo, data=self.hoje,
+                origem=LancamentoMulta.ORIGEM_ACUMULO, valor=Decimal('0.10'), saldo=Decimal('0.50'),
+            )
+
+    def test_devolucao_nao_corrige_o_acumulado(self):
+        multas.acumular(hoje=self.hoje)
+        balcao.processar_lote(balcao.ACAO_DEVOLVER, [str(self.livro.pk)], self.funcionario)
+        self.assertEqual(self.lancamentos(origem=LancamentoMulta.ORIGEM_DEVOLUCAO), [])
+        self.leitor.refresh_from_db()
+        self.assertEqual(self.leitor.saldo_multas, Decimal('0.40'))
+
+
+class LimiteDoLeitorNoLoteTest(TestCase):
+    """O limite de empréstimos é conferido de novo, dentro da transação do lote"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+        cls.livros = [
+            Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000, genero='Romance')
+            for numero in range(2)
+        ]
+
+    def test_leitor_desatualizado_rejeita_o_lote(self):
+        leitor = Leitor.objects.get(pk=self.leitor.pk)
+        # Outro balcão emprestou enquanto este lote era montado
+        Leitor.objects.filter(pk=leitor.pk).update(emprestimos_ativos=LIMITE_EMPRESTIMOS_ATIVOS - 1)
+
+        with self.assertRaises(balcao.LoteRejeitado):
+            balcao.processar_lote(balcao.ACAO_EMPRESTAR, [str(livro.pk) for livro in self.livros],
+                                  self.funcionario, leitor=leitor)
+        self.assertFalse(Emprestimo.objects.exists())
+        self.assertEqual(Livro.objects.filter(disponivel=True).count(), 2)
+        self.assertEqual(Leitor.objects.get(pk=leitor.pk).emprestimos_ativos, LIMITE_EMPRESTIMOS_ATIVOS - 1)
+
+    def test_lote_dentro_do_limite(self):
+        resultados = balcao.processar_lote(balcao.ACAO_EMPRESTAR, [str(livro.pk) for livro in self.livros],
+                                           self.funcionario, leitor=self.leitor)
+        self.assertTrue(all(resultado['ok'] for resultado in resultados))
+        self.assertEqual(Leitor.objects.get(pk=self.leitor.pk).emprestimos_ativos, 2)
+
+
+class LoteRollbackTest(TestCase):
+    """Um lote que esbarra em outro atendimento é desfeito por inteiro"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+
+    def setUp(self):
+        self.livros = [
+            Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000, genero='Romance')
+            for numero in range(2)
+        ]
+        self.identificadores = [str(livro.pk) for livro in self.livros]
+
+    def test_emprestimo_aberto_concorrente_desfaz_o_lote(self):
+        # Outro balcão abriu o empréstimo mas o livro ainda consta disponível
+        Emprestimo.objects.create(
+            livro=self.livros[1], leitor=self.leitor, emprestado_por=self.funcionario,
+            data_devolucao_prevista=date.today() + timedelta(days=14),
+        )
+        Livro.objects.filter(pk=self.livros[1].pk).update(disponivel=True)
+
+        with self.assertRaises(balcao.LoteRejeitado):
+            balcao.processar_lote(balcao.ACAO_EMPRESTAR, self.identificadores, self.funcionario, leitor=self.leitor)
+        self.assertEqual(Emprestimo.objects.count(), 1)
+        self.assertTrue(Livro.objects.get(pk=self.livros[0].pk).disponivel)
+
+    def test_livro_devolvido_em_outro_balcao_desfaz_o_lote(self):
+        balcao.processar_lote(balcao.ACAO_EMPRESTAR, self.identificadores, self.funcionario, leitor=self.leitor)
+        # A devolução do segundo livro já liberou o exemplar
+        Livro.objects.filter(pk=self.livros[1].pk).update(disponivel=True)
+
+        with self.assertRaises(balcao.LoteRejeitado):
+            balcao.processar_lote(balcao.ACAO_DEVOLVER, self.identificadores, self.funcionario)
+        self.assertEqual(Emprestimo.objects.abertos().count(), 2)
+        self.assertFalse(Livro.objects.get(pk=self.livros[0].pk).disponivel)
+        self.assertFalse(LancamentoMulta.objects.exists())
+        self.assertEqual(Leitor.objects.get(pk=self.leitor.pk).emprestimos_ativos, 2)
+
+
+class ArquivoEmprestimosTest(TestCase):
+    """Cadeias antigas vão para o arquivo e continuam no histórico pela visão"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+
+    def emprestimo(self, livro, devolvido=None, **campos):
+        return Emprestimo.objects.create(
+            livro=livro, leitor=self.leitor, emprestado_por=self.funcionario,
+            data_devolucao_prevista=self.hoje - timedelta(days=500), data_devolucao=devolvido, **campos,
+        )
+
+    def setUp(self):
+        self.hoje = date.today()
+        antigo = self.hoje - timedelta(days=400)
+        livros = [
+            Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000, genero='Romance')
+            for numero in range(3)
+        ]
+        # Cadeia antiga inteiramente devolvida, com multa no razão
+        self.original = self.emprestimo(livros[0], antigo)
+        self.renovacao = self.emprestimo(livros[0], antigo, renovacao=self.original, multa=Decimal('1.00'))
+        self.lancamento = LancamentoMulta.objects.create(
+            leitor=self.leitor, emprestimo=self.renovacao, data=antigo,
+            origem=LancamentoMulta.ORIGEM_DEVOLUCAO, valor=Decimal('1.00'), saldo=Decimal('1.00'),
+        )
+        # Devolvido há pouco e cadeia antiga com renovação ainda em aberto
+        self.recente = self.emprestimo(livros[1], self.hoje)
+        self.reaberto = self.emprestimo(livros[2], antigo)
+        self.aberto = self.emprestimo(livros[2], renovacao=self.reaberto)
+
+    def test_arquiva_so_cadeias_encerradas(self):
+        self.assertEqual(arquivo.arquivar(dias=365, hoje=self.hoje), (1, 2))
+        self.assertEqual(
+            set(EmprestimoArquivado.objects.values_list('pk', flat=True)), {self.original.pk, self.renovacao.pk},
+        )
+        self.assertEqual(
+            set(Emprestimo.objects.values_list('pk', flat=True)), {self.recente.pk, self.reaberto.pk, self.aberto.pk},
+        )
+        self.lancamento.refresh_from_db()
+        self.assertIsNone(self.lancamento.emprestimo_id)
+        self.assertEqual(self.lancamento.emprestimo_arquivado_id, self.renovacao.pk)
+        # Rodar de novo não encontra mais nada
+        self.assertEqual(arquivo.arquivar(dias=365, hoje=self.hoje), (0, 0))
+
+    def test_historico_le_as_duas_tabelas(self):
+        arquivo.arquivar(dias=365, hoje=self.hoje)
+        todos = {self.original.pk, self.renovacao.pk, self.recente.pk, self.reaberto.pk, self.aberto.pk}
+
+        historico, _ = filtrar_emprestimos({})
+        self.assertEqual(set(historico.values_list('pk', flat=True)), todos)
+        devolvidos, _ = filtrar_emprestimos({'status': 'devolvido'})
+        self.assertEqual(set(devolvidos.values_list('pk', flat=True)), todos - {self.aberto.pk})
+        ativos, _ = filtrar_emprestimos({'status': 'ativo'})
+        self.assertEqual(list(ativos.values_list('pk', flat=True)), [self.aberto.pk])
+        self.assertEqual(EmprestimoHistorico.objects.get(pk=self.renovacao.pk).multa, Decimal('1.00'))
+
+        self.client.force_login(self.funcionario)
+        resposta = self.client.get(reverse('app_emprestimo:listar'), {'status': 'devolvido'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(
+            {linha.pk for linha in resposta.context['emprestimos']}, todos - {self.aberto.pk},
+        )
+
+
+class ListagemEmprestimosTest(TestCase):
+    """A listagem lê título e leitor por anotações, sem instanciar Emprestimo, Livro nem Leitor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+        livro = Livro.objects.create(titulo='Dom Casmurro', autor='Machado de Assis', ano=1899, genero='Romance')
+        cls.emprestimo = Emprestimo.objects.create(
+            livro=livro, leitor=cls.leitor, emprestado_por=cls.funcionario,
+            data_devolucao_prevista=date.today() - timedelta(days=2),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.funcionario)
+
+    @override_settings(MULTA_DIARIA='0.50')
+    def test_linhas_enxutas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('app_emprestimo:listar'), {'status': 'atrasado'})
+        self.assertEqual(resposta.status_code, 200)
+        linha, = resposta.context['emprestimos']
+        self.assertNotIsInstance(linha, Emprestimo)
+        self.assertEqual((linha.pk, linha.dias_atraso, linha.multa_estimada), (self.emprestimo.pk, 2, Decimal('1.00')))
+        self.assertContains(resposta, 'Dom Casmurro')
+        self.assertContains(resposta, 'Ana Souza')
+        self.assertContains(resposta, reverse('app_emprestimo:devolver', args=[self.emprestimo.pk]))
+        listagem = [consulta['sql'] for consulta in consultas.captured_queries if f'"{TABELA}"' in consulta['sql']]
+        self.assertTrue(listagem)
+        self.assertFalse([sql for sql in listagem if 'password' in sql])
+
+
+class RecomendacoesTest(TestCase):
+    """Vizinhos "quem pegou este livro também pegou" pelo cosseno da coocorrência de leitores"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, leitor = criar_usuarios()
+        cls.leitores = [leitor] + [
+            Leitor.objects.create(
+                username=f'leitor{numero}', first_name='Leitor', last_name=str(numero), cpf=f'{numero:011d}',
+                telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+            )
+            for numero in range(1, 3)
+        ]
+        cls.livros = [
+            Livro.objects.create(titulo=f'Livro {letra}', autor='Autor', ano=2000, genero='Romance')
+            for letra in 'ABCD'
+        ]
+        a, b, c, d = cls.livros
+        hoje = date.today()
+        for leitor, livros in zip(cls.leitores, [(a, b), (a, b, c), (c, d)]):
+            for livro in livros:
+                ultimo = Emprestimo.objects.create(
+                    livro=livro, leitor=leitor, emprestado_por=cls.funcionario,
+                    data_devolucao_prevista=hoje, data_devolucao=hoje,
+                )
+        # Renovação repete o par (leitor, livro) sem contar de novo
+        Emprestimo.objects.create(
+            livro=d, leitor=cls.leitores[2], emprestado_por=cls.funcionario,
+            data_devolucao_prevista=hoje, data_devolucao=hoje, renovacao=ultimo,
+        )
+
+    def vizinhos(self):
+        return {
+            livro: [(outro, round(valor, 6)) for outro, valor in similares]
+            for livro, similares in recomendacoes.calcular_vizinhos(recomendacoes.pares_leitor_livro(), k=2, bloco=2)
+        }
+
+    def test_vizinhos_por_cosseno(self):
+        a, b, c, d = (livro.pk for livro in self.livros)
+        esperado = {
+            a: [(b, 1.0), (c, 0.5)],
+            b: [(a, 1.0), (c, 0.5)],
+            # Empate entre A e B fica com o de menor id
+            c: [(d, 0.707107), (a, 0.5)],
+            d: [(c, 0.707107)],
+        }
+        self.assertEqual(self.vizinhos(), esperado)
+        with mock.patch.object(recomendacoes, 'sparse', None):
+            self.assertEqual(self.vizinhos(), esperado)
+
+    def test_reconstruir_e_ler(self):
+        a, b, c, d = self.livros
+        self.assertEqual(recomendacoes.reconstruir(k=2, batch_size=3), 7)
+        self.assertEqual([r.recomendado for r in recomendados_para_livro(c)], [d, a])
+
+        # Leitor que pegou A e B: C aparece para os dois e soma as pontuações
+        sugeridos = list(recomendados_para_leitor(self.leitores[0]))
+        self.assertEqual(sugeridos, [c])
+        self.assertAlmostEqual(sugeridos[0].pontuacao, 1.0)
+
+        Livro.objects.filter(pk=c.pk).update(disponivel=False)
+        self.assertEqual(list(recomendados_para_leitor(self.leitores[0])), [])
+
+
+class CadeiaRenovacoesTest(TestCase):
+    """Raiz e número da renovação gravados em cada empréstimo, sem percorrer a cadeia"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+        cls.livro = Livro.objects.create(titulo='Dom Casmurro', autor='Machado de Assis', ano=1899,
+                                         genero='Romance', disponivel=False)
+
+    def setUp(self):
+        cache.clear()
+        self.original = Emprestimo.objects.create(
+            livro=self.livro, leitor=self.leitor, emprestado_por=self.funcionario,
+            data_devolucao_prevista=date.today() + timedelta(days=7),
+        )
+
+    def renovar(self, emprestimo):
+        self.client.force_login(self.funcionario)
+        resposta = self.client.post(reverse('app_emprestimo:renovar', args=[emprestimo.pk]), {'dias_renovacao': 7})
+        self.assertRedirects(resposta, reverse('app_emprestimo:listar'))
+        return Emprestimo.objects.get(renovacao=emprestimo)
+
+    def test_renovacao_grava_raiz_e_numero(self):
+        primeira = self.renovar(self.original)
+        segunda = self.renovar(primeira)
+        self.assertEqual((primeira.emprestimo_original_id, primeira.numero_renovacao), (self.original.pk, 1))
+        self.assertEqual((segunda.emprestimo_original_id, segunda.numero_renovacao), (self.original.pk, 2))
+
+        segunda = Emprestimo.objects.get(pk=segunda.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(segunda.emprestimo_original_pk, self.original.pk)
+            self.assertEqual(segunda.contar_renovacoes(), 2)
+            self.assertFalse(segunda.pode_renovar())
+        original = Emprestimo.objects.get(pk=self.original.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(original.get_emprestimo_original(), original)
+            self.assertEqual(original.contar_renovacoes(), 0)
+
+    def test_backfill_das_cadeias_antigas(self):
+        primeira = self.renovar(self.original)
+        segunda = self.renovar(primeira)
+        outro = Emprestimo.objects.create(
+            livro=Livro.objects.create(titulo='Helena', autor='Machado de Assis', ano=1876, genero='Romance'),
+            leitor=self.leitor, emprestado_por=self.funcionario, data_devolucao_prevista=date.today(),
+        )
+        # Como as linhas ficaram antes da migração que criou as colunas
+        Emprestimo.objects.update(emprestimo_original=None, numero_renovacao=0)
+
+        saida = StringIO()
+        call_command('backfill_renewal_chains', batch_size=1, stdout=saida)
+        self.assertIn('2 empréstimos atualizados', saida.getvalue())
+        self.assertEqual(
+            dict(Emprestimo.objects.values_list('pk', 'emprestimo_original_id')),
+            {self.original.pk: None, primeira.pk: self.original.pk, segunda.pk: self.original.pk, outro.pk: None},
+        )
+        self.assertEqual(Emprestimo.objects.get(pk=segunda.pk).numero_renovacao, 2)
+
+    def test_calcular_cadeias_fora_de_ordem(self):
+        self.assertEqual(
+            calcular_cadeias({5: 3, 3: 1, 1: None, 2: None}),
+            {1: (None, 0), 3: (1, 1), 5: (1, 2), 2: (None, 0)},
+        )
+
+
+@override_settings(MULTA_DIARIA='0.50')
+class SituacaoAnotadaTest(TestCase):
+    """com_situacao calcula no banco o mesmo que os métodos de cada empréstimo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+        hoje = date.today()
+
+        def emprestimo(titulo, prevista, devolvido=None, **campos):
+            livro = Livro.objects.create(titulo=titulo, autor='Autor', ano=2000, genero='Romance')
+            return Emprestimo.objects.create(
+                livro=livro, leitor=cls.leitor, emprestado_por=cls.funcionario,
+                data_devolucao_prevista=hoje + timedelta(days=prevista), data_devolucao=devolvido, **campos,
+            )
+
+        cls.em_dia = emprestimo('Em dia', 5)
+        cls.atrasado = emprestimo('Atrasado', -3)
+        cls.devolvido = emprestimo('Devolvido com atraso', -10, hoje - timedelta(days=6), multa=Decimal('2.00'))
+        renovado = emprestimo('Renovado', -20, hoje - timedelta(days=20))
+        renovado = Emprestimo.objects.create(
+            livro=renovado.livro, leitor=cls.leitor, emprestado_por=cls.funcionario, renovacao=renovado,
+            data_devolucao_prevista=hoje - timedelta(days=10), data_devolucao=hoje - timedelta(days=10),
+        )
+        cls.sem_renovacao = Emprestimo.objects.create(
+            livro=renovado.livro, leitor=cls.leitor, emprestado_por=cls.funcionario, renovacao=renovado,
+            data_devolucao_prevista=hoje + timedelta(days=4),
+        )
+
+    def situacao(self, emprestimo):
+        anotado = Emprestimo.objects.com_situacao().get(pk=emprestimo.pk)
+        return anotado.atrasado, anotado.dias_atraso, anotado.multa_estimada, anotado.renovavel
+
+    def test_mesmas_regras_dos_metodos(self):
+        self.assertEqual(self.situacao(self.em_dia), (False, 0, Decimal('0.00'), True))
+        self.assertEqual(self.situacao(self.atrasado), (True, 3, Decimal('1.50'), False))
+        self.assertEqual(self.situacao(self.devolvido), (False, 4, Decimal('2.00'), True))
+        self.assertEqual(self.situacao(self.sem_renovacao), (False, 0, Decimal('0.00'), False))
+        for emprestimo in (self.em_dia, self.atrasado, self.sem_renovacao):
+            atrasado, _, multa, renovavel = self.situacao(emprestimo)
+            self.assertEqual(atrasado, emprestimo.esta_atrasado())
+            self.assertEqual(multa, calcular_multa(emprestimo))
+            self.assertEqual(renovavel, emprestimo.pode_renovar())
+
+    def test_data_de_referencia(self):
+        amanha = date.today() + timedelta(days=6)
+        em_dia = Emprestimo.objects.com_situacao(hoje=amanha).get(pk=self.em_dia.pk)
+        self.assertEqual((em_dia.atrasado, em_dia.dias_atraso, em_dia.multa_estimada), (True, 1, Decimal('0.50')))
+
+    def test_filtra_e_ordena_no_banco(self):
+        with self.assertNumQueries(1):
+            pks = list(Emprestimo.objects.com_situacao()
+                       .filter(multa_estimada__gt=0)
+                       .order_by('-multa_estimada')
+                       .values_list('pk', flat=True))
+        self.assertEqual(pks, [self.devolvido.pk, self.atrasado.pk])
+        atrasados, ordem = filtrar_emprestimos({'status': 'atrasado', 'ordem': 'atraso'})
+        self.assertEqual(list(atrasados.order_by(*ordem).values_list('pk', flat=True)), [self.atrasado.pk])
+
+
+class EmprestimoConcorrenteTest(TestCase):
+    """Dois balcões com o mesmo livro: só um empréstimo é gravado, o outro recebe um erro claro"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario, cls.leitor = criar_usuarios()
+
+    def setUp(self):
+        self.livro = Livro.objects.create(titulo='Dom Casmurro', autor='Machado de Assis', ano=1899, genero='Romance')
+
+    def test_segundo_balcao_perde_a_corrida(self):
+        # Os dois balcões leram o livro ainda disponível
+        primeiro = Livro.objects.get(pk=self.livro.pk)
+        segundo = Livro.objects.get(pk=self.livro.pk)
+        emprestimo = balcao.emprestar(primeiro, self.leitor, self.funcionario, dias=7)
+        with self.assertRaisesMessage(balcao.LivroIndisponivel, balcao.INDISPONIVEL):
+            balcao.emprestar(segundo, self.leitor, self.funcionario)
+
+        self.assertEqual(list(Emprestimo.objects.values_list('pk', flat=True)), [emprestimo.pk])
+        self.assertEqual(emprestimo.data_devolucao_prevista, date.today() + timedelta(days=7))
+        self.assertFalse(Livro.objects.get(pk=self.livro.pk).disponivel)
+        self.assertEqual(Leitor.objects.get(pk=self.leitor.pk).emprestimos_ativos, 1)
+
+    def test_emprestimo_aberto_com_livro_marcado_disponivel(self):
+        aberto = Emprestimo.objects.create(
+            livro=self.livro, leitor=self.leitor, emprestado_por=self.funcionario,
+            data_devolucao_prevista=date.today(),
+        )
+        # disponivel desatualizado: o UPDATE condicional passa, o índice único barra
+        with self.assertRaisesMessage(balcao.LivroIndisponivel, balcao.INDISPONIVEL):
+            balcao.emprestar(self.livro, self.leitor, self.funcionario)
+
+        self.assertEqual(list(Emprestimo.objects.values_list('pk', flat=True)), [aberto.pk])
+        # O UPDATE do livro foi desfeito junto com o empréstimo
+        self.assertTrue(Livro.objects.get(pk=self.livro.pk).disponivel)
+        self.assertEqual(Leitor.objects.get(pk=self.leitor.pk).emprestimos_ativos, 1)
+
+    def test_indice_unico_de_emprestimo_aberto(self):
+        dados = dict(livro=self.livro, leitor=self.leitor, emprestado_por=self.funcionario,
+                     data_devolucao_prevista=date.today())
+        Emprestimo.objects.create(data_devolucao=date.today(), **dados)
+        Emprestimo.objects.create(**dados)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Emprestimo.objects.create(**dados)
@@ -6,6 +6,8 @@ app_name = 'app_emprestimo'
 urlpatterns = [
     path('', views.emprestimo_list, name='listar'),
     path('criar/', views.emprestimo_create, name='criar'),
+    path('exportar/', views.emprestimo_export, name='exportar'),
+    path('lote/', views.emprestimo_lote, name='lote'),
     path('<int:pk>/devolver/', views.emprestimo_devolver, name='devolver'),
     path('<int:pk>/renovar/', views.emprestimo_renovar, name='renovar'),
 ]
\ No newline at end of file
@@ -1,60 +1,50 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
 from django.utils import timezone
-from datetime import datetime, timedelta
-from django.core.exceptions import ValidationError
+from datetime import timedelta
+import json
+from django.db import transaction
 from decimal import Decimal
-from .models import Emprestimo
-from .forms import EmprestimoForm, RenovacaoForm, DevolucaoForm
+from .models import Emprestimo, LancamentoMulta, multa_diaria
+from . import balcao, multas
+from .forms import EmprestimoForm, RenovacaoForm, DevolucaoForm, LoteForm
+from .consultas import COLUNAS_EXPORTACAO, filtrar_emprestimos, para_exportacao, para_listagem
 from app_livro.models import Livro
 from app_leitor.models import Leitor
 from app_funcionario.models import Funcionario
+from biblioteca.exportacao import resposta_exportacao
+from biblioteca.pagination import paginar
 from biblioteca.decorators import funcionario_or_leitor_required, funcionario_required
 
 def calcular_multa(emprestimo):
     """Calcula a multa baseada nos dias de atraso"""
-    if not emprestimo.data_devolucao and emprestimo.data_devolucao_prevista < timezone.now().date():
-        dias_atraso = (timezone.now().date() - emprestimo.data_devolucao_prevista).days
-        return Decimal(str(dias_atraso * 2.00))
+    hoje = timezone.now().date()
+    if not emprestimo.data_devolucao and emprestimo.data_devolucao_prevista < hoje:
+        dias_atraso = (hoje - emprestimo.data_devolucao_prevista).days
     elif emprestimo.data_devolucao and emprestimo.data_devolucao > emprestimo.data_devolucao_prevista:
         dias_atraso = (emprestimo.data_devolucao - emprestimo.data_devolucao_prevista).days
-        return Decimal(str(dias_atraso * 2.00))
-    return Decimal('0.00')
+    else:
+        return Decimal('0.00')
+    return dias_atraso * multa_diaria()
 
 @login_required
 @funcionario_or_leitor_required
 def emprestimo_list(request):
     search = request.GET.get('search', '')
     status = request.GET.get('status', '')
+    ordem_filtro = request.GET.get('ordem', '')
     
-    emprestimos = Emprestimo.objects.select_related('livro', 'leitor', 'emprestado_por')
-    
-    if search:
-        emprestimos = emprestimos.filter(
-            livro__titulo__icontains=search
-        ) | emprestimos.filter(
-            leitor__first_name__icontains=search
-        ) | emprestimos.filter(
-            leitor__last_name__icontains=search
-        )
-    
-    if status == 'ativo':
-        emprestimos = emprestimos.filter(data_devolucao__isnull=True)
-    elif status == 'atrasado':
-        emprestimos = emprestimos.filter(
-            data_devolucao__isnull=True,
-            data_devolucao_prevista__lt=timezone.now().date()
-        )
-    elif status == 'devolvido':
-        emprestimos = emprestimos.filter(data_devolucao__isnull=False)
-    
-    emprestimos = emprestimos.order_by('-data_emprestimo')
+    emprestimos, ordem = filtrar_emprestimos(request.GET)
+    pagina = paginar(request, para_listagem(emprestimos), ordem)
     
     context = {
-        'emprestimos': emprestimos,
+        'emprestimos': pagina.object_list,
+        'pagina': pagina,
         'search': search,
-        'status_filtro': status
+        'status_filtro': status,
+        'ordem_filtro': ordem_filtro,
     }
     return render(request, 'app_emprestimo/list.html', context)
 
@@ -68,29 +58,29 @@ def emprestimo_create(request):
                 # Obter funcionário atual
                 funcionario = Funcionario.objects.get(pk=request.user.pk)
                 
-                # Criar empréstimo
-                dias_emprestimo = form.cleaned_data['dias_emprestimo']
-                data_devolucao_prevista = timezone.now().date() + timedelta(days=dias_emprestimo)
-                
-                emprestimo = form.save(commit=False)
-                emprestimo.emprestado_por = funcionario
-                emprestimo.data_devolucao_prevista = data_devolucao_prevista
-                emprestimo.save()
-                
-                # Marcar livro como indisponível
-                emprestimo.livro.disponivel = False
-                emprestimo.livro.save()
+                # Toma o livro e cria o empréstimo sem travar tabelas; se
+                # outro balcão emprestou o mesmo livro agora, falha aqui
+                balcao.emprestar(
+                    form.cleaned_data['livro'],
+                    form.cleaned_data['leitor'],
+                    funcionario,
+                    dias=form.cleaned_data['dias_emprestimo'],
+                )
                 
                 messages.success(request, 'Empréstimo realizado com sucesso!')
                 return redirect('app_emprestimo:listar')
                 
+            except balcao.LivroIndisponivel as e:
+                form.add_error('livro', str(e))
             except Exception as e:
                 messages.error(request, f'Erro ao criar empréstimo: {e}')
     else:
         form = EmprestimoForm()
     
     context = {
-        'form': form
+        'form': form,
+        'ha_livros_disponiveis': Livro.objects.filter(disponivel=True).exists(),
+        'ha_leitores_ativos': Leitor.objects.filter(ativo=True).exists(),
     }
     return render(request, 'app_emprestimo/form.html', context)
 
@@ -106,13 +96,15 @@ def emprestimo_devolver(request, pk):
                 # Marcar data de devolução
                 emprestimo.data_devolucao = timezone.now().date()
                 
-                # Calcular multa se houver atraso
-                emprestimo.multa = calcular_multa(emprestimo)
-                emprestimo.save()
-                
-                # Marcar livro como disponível
-                emprestimo.livro.disponivel = True
-                emprestimo.livro.save()
+                # Calcular multa se houver atraso; o que passar do já
+                # acumulado pelo processamento noturno vai para o razão
+                with transaction.atomic():
+                    multa_acumulada = emprestimo.multa
+                    emprestimo.multa = calcular_multa(emprestimo)
+                    emprestimo.save()
+                    multas.registrar(emprestimo, emprestimo.multa - multa_acumulada, LancamentoMulta.ORIGEM_DEVOLUCAO)
+                    # Livro disponível na mesma transação, sem regravar a linha inteira
+                    Livro.objects.filter(pk=emprestimo.livro_id, disponivel=False).update(disponivel=True)
                 
                 if emprestimo.multa > 0:
                     messages.warning(request, f'Livro devolvido com multa de R$ {emprestimo.multa:.2f}')
@@ -148,19 +140,21 @@ def emprestimo_renovar(request, pk):
                 dias_renovacao = form.cleaned_data['dias_renovacao']
                 funcionario = Funcionario.objects.get(pk=request.user.pk)
                 
-                # Criar novo empréstimo (renovação) vinculado ao atual
-                novo_emprestimo = Emprestimo(
-                    livro=emprestimo.livro,
-                    leitor=emprestimo.leitor,
-                    emprestado_por=funcionario,
-                    data_devolucao_prevista=emprestimo.data_devolucao_prevista + timedelta(days=dias_renovacao),
-                    renovacao=emprestimo
-                )
-                novo_emprestimo.save()
-                
-                # Marcar empréstimo atual como devolvido
-                emprestimo.data_devolucao = timezone.now().date()
-                emprestimo.save()
+                # O empréstimo atual é fechado antes de abrir a renovação:
+                # só pode haver um empréstimo em aberto por livro
+                with transaction.atomic():
+                    emprestimo.data_devolucao = timezone.now().date()
+                    emprestimo.save()
+                    
+                    # Criar novo empréstimo (renovação) vinculado ao atual
+                    novo_emprestimo = Emprestimo(
+                        livro=emprestimo.livro,
+                        leitor=emprestimo.leitor,
+                        emprestado_por=funcionario,
+                        data_devolucao_prevista=emprestimo.data_devolucao_prevista + timedelta(days=dias_renovacao),
+                        renovacao=emprestimo
+                    )
+                    novo_emprestimo.save()
                 
                 messages.success(request, f'Empréstimo renovado por {dias_renovacao} dias!')
                 return redirect('app_emprestimo:listar')
@@ -175,3 +169,64 @@ def emprestimo_renovar(request, pk):
         'object': emprestimo
     }
     return render(request, 'app_emprestimo/renovar.html', context)
+
+@login_required
+@funcionario_required
+def emprestimo_export(request):
+    emprestimos, ordem = filtrar_emprestimos(request.GET)
+    emprestimos = para_exportacao(emprestimos).order_by(*ordem, 'pk')
+    return resposta_exportacao(request, 'emprestimos', emprestimos, COLUNAS_EXPORTACAO)
+
+def _dados_lote(request):
+    """Dados do lote vindos do formulário ou de um corpo JSON (leitor de código de barras)"""
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        dados = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    if not isinstance(dados, dict):
+        return None
+    identificadores = dados.get('identificadores') or []
+    if isinstance(identificadores, list):
+        dados['identificadores'] = '\n'.join(str(item) for item in identificadores)
+    return dados
+
+@login_required
+@funcionario_required
+def emprestimo_lote(request):
+    resultados = None
+    if request.method == 'POST':
+        dados = _dados_lote(request)
+        json_pedido = request.content_type == 'application/json'
+        if dados is None:
+            return JsonResponse({'erros': {'__all__': ['JSON inválido']}}, status=400)
+        form = LoteForm(dados)
+        if form.is_valid():
+            try:
+                resultados = balcao.processar_lote(
+                    form.cleaned_data['acao'],
+                    form.cleaned_data['identificadores'],
+                    Funcionario.objects.get(pk=request.user.pk),
+                    leitor=form.cleaned_data['leitor'],
+                    dias=form.cleaned_data['dias'],
+                )
+            except balcao.LoteRejeitado as e:
+                if json_pedido:
+                    return JsonResponse({'erros': {'__all__': [str(e)]}}, status=409)
+                messages.error(request, str(e))
+            else:
+                if json_pedido:
+                    return JsonResponse({'resultados': resultados})
+                concluidos = sum(1 for resultado in resultados if resultado['ok'])
+                messages.success(request, f'{concluidos} de {len(resultados)} livros processados')
+        elif json_pedido:
+            return JsonResponse({'erros': form.errors.get_json_data()}, status=400)
+    else:
+        form = LoteForm()
+
+    context = {
+        'form': form,
+        'resultados': resultados,
+    }
+    return render(request, 'app_emprestimo/lote.html', context)
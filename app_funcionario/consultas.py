@@ -0,0 +1,35 @@
+"""
+Filtros e colunas da listagem de funcionários
+
+Como em app_leitor.consultas, a listagem não instancia Funcionario (que
+herda de User): para_listagem projeta só as colunas que o template mostra,
+em tuplas nomeadas.
+"""
+from biblioteca.texto import normalizar
+from .models import Funcionario
+
+# Colunas mostradas na listagem, mais a ordenação usada pela paginação
+COLUNAS_LISTAGEM = (
+    'pk', 'username', 'first_name', 'last_name', 'cargo', 'salario', 'data_admissao', 'ativo', 'nome_normalizado',
+)
+
+
+def filtrar_funcionarios(params):
+    """Aplica o filtro de busca da listagem e retorna (queryset, ordenação)"""
+    search = params.get('search', '')
+    
+    funcionarios = Funcionario.objects.all()
+    
+    if search:
+        funcionarios = funcionarios.filter(
+            nome_normalizado__contains=normalizar(search)
+        ) | funcionarios.filter(
+            cargo__icontains=search
+        )
+    
+    return funcionarios, ['nome_normalizado']
+
+
+def para_listagem(funcionarios):
+    """Linhas leves (tuplas nomeadas) com as colunas da listagem"""
+    return funcionarios.values_list(*COLUNAS_LISTAGEM, named=True)
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from biblioteca.texto import normalizar
 
 class Funcionario(User):
     cargo = models.CharField(max_length=50)
@@ -7,10 +8,19 @@ class Funcionario(User):
     data_admissao = models.DateField()
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
+    # Nome completo sem acentos e em minúsculas para busca e ordenação
+    nome_normalizado = models.CharField(max_length=301, db_index=True, editable=False, default='')
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.cargo}"
     
+    def save(self, *args, **kwargs):
+        self.nome_normalizado = normalizar(f"{self.first_name} {self.last_name}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'nome_normalizado'}
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = 'Funcionário'
         verbose_name_plural = 'Funcionários'
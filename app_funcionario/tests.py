@@ -1,3 +1,45 @@
+from datetime import date
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Funcionario
+
+
+class ListagemFuncionariosTest(TestCase):
+    """A listagem mostra linhas leves (tuplas nomeadas), sem ler a senha nem instanciar Funcionario"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo = Group.objects.create(name='Funcionarios')
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', first_name='Bia', last_name='Lima',
+            cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.funcionario.groups.add(grupo)
+        cls.auxiliar = Funcionario.objects.create(
+            username='auxiliar', first_name='Caio', last_name='Reis',
+            cargo='Auxiliar', salario='2100.50', data_admissao=date(2024, 5, 1),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.funcionario)
 
-# Create your tests here.
+    def test_linhas_enxutas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('app_funcionario:listar'), {'search': 'auxiliar'})
+        self.assertEqual(resposta.status_code, 200)
+        linhas = resposta.context['funcionarios']
+        self.assertEqual([funcionario.pk for funcionario in linhas], [self.auxiliar.pk])
+        self.assertNotIsInstance(linhas[0], Funcionario)
+        self.assertContains(resposta, 'Caio Reis')
+        self.assertContains(resposta, 'R$ 2100,50')
+        self.assertContains(resposta, reverse('app_funcionario:editar', args=[self.auxiliar.pk]))
+        listagem = [consulta['sql'] for consulta in consultas.captured_queries if 'nome_normalizado' in consulta['sql']]
+        self.assertTrue(listagem)
+        self.assertFalse([sql for sql in listagem if 'password' in sql])
@@ -6,6 +6,8 @@ from django.core.exceptions import ValidationError
 from django.db import transaction
 from .models import Funcionario
 from .forms import FuncionarioForm
+from .consultas import filtrar_funcionarios, para_listagem
+from biblioteca.pagination import paginar
 from biblioteca.decorators import funcionario_required
 
 @login_required
@@ -13,21 +15,12 @@ from biblioteca.decorators import funcionario_required
 def funcionario_list(request):
     search = request.GET.get('search', '')
     
-    funcionarios = Funcionario.objects.all()
-    
-    if search:
-        funcionarios = funcionarios.filter(
-            first_name__icontains=search
-        ) | funcionarios.filter(
-            last_name__icontains=search
-        ) | funcionarios.filter(
-            cargo__icontains=search
-        )
-    
-    funcionarios = funcionarios.order_by('first_name')
+    funcionarios, ordem = filtrar_funcionarios(request.GET)
+    pagina = paginar(request, para_listagem(funcionarios), ordem)
     
     context = {
-        'funcionarios': funcionarios,
+        'funcionarios': pagina.object_list,
+        'pagina': pagina,
         'search': search
     }
     return render(request, 'app_funcionario/list.html', context)
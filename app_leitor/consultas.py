@@ -0,0 +1,71 @@
+"""
+Filtros da listagem de leitores, compartilhados com a exportação
+
+A listagem não instancia Leitor: Leitor herda de User, e cada instância
+traria junto a linha inteira de auth_user (hash de senha, last_login...) e
+todas as colunas do perfil. para_listagem projeta só as colunas que o
+template mostra, em tuplas nomeadas (leitor.first_name, leitor.pk etc.).
+"""
+import re
+
+from biblioteca.texto import filtro_prefixo, normalizar
+from .models import Leitor
+
+COLUNAS_EXPORTACAO = [
+    ('id', 'id'),
+    ('username', 'username'),
+    ('nome', 'first_name'),
+    ('sobrenome', 'last_name'),
+    ('email', 'email'),
+    ('cpf', 'cpf'),
+    ('telefone', 'telefone'),
+    ('endereco', 'endereco'),
+    ('data_nascimento', 'data_nascimento'),
+    ('ativo', 'ativo'),
+    ('criado_em', 'criado_em'),
+]
+
+# Colunas mostradas na listagem, mais a ordenação usada pela paginação
+COLUNAS_LISTAGEM = (
+    'pk', 'username', 'first_name', 'last_name', 'email', 'cpf', 'telefone', 'ativo', 'nome_normalizado',
+)
+
+
+def filtrar_leitores(params):
+    """Aplica o filtro de busca da listagem e retorna (queryset, ordenação)"""
+    search = params.get('search', '')
+    
+    leitores = Leitor.objects.all()
+    
+    if search:
+        leitores = leitores.filter(
+            nome_normalizado__contains=normalizar(search)
+        ) | leitores.filter(
+            cpf__icontains=search
+        )
+    
+    return leitores, ['nome_normalizado']
+
+
+def para_listagem(leitores):
+    """Linhas leves (tuplas nomeadas) com as colunas da listagem"""
+    return leitores.values_list(*COLUNAS_LISTAGEM, named=True)
+
+
+def sugerir_leitores(termo, limite=20):
+    """
+    Leitores ativos cujo nome (ou CPF, se o termo for numérico) começa
+    com o termo. Retorna tuplas (id, first_name, last_name).
+    """
+    termo = termo.strip()
+    if not termo:
+        return []
+    digitos = re.sub(r'[.\-\s]', '', termo)
+    if digitos.isdigit():
+        filtro = filtro_prefixo('cpf', digitos)
+        ordem = 'cpf'
+    else:
+        filtro = filtro_prefixo('nome_normalizado', normalizar(termo))
+        ordem = 'nome_normalizado'
+    leitores = Leitor.objects.filter(filtro, ativo=True).order_by(ordem)
+    return list(leitores.values_list('pk', 'first_name', 'last_name')[:limite])
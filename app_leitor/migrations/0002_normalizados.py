@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:58
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar(texto):
+    """Cópia de biblioteca.texto.normalizar como era nesta migração"""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def preencher_normalizados(apps, schema_editor):
+    Leitor = apps.get_model('app_leitor', 'Leitor')
+    registros = []
+    for registro in Leitor.objects.only('first_name', 'last_name').iterator(chunk_size=2000):
+        registro.nome_normalizado = normalizar(f"{registro.first_name} {registro.last_name}")
+        registros.append(registro)
+    Leitor.objects.bulk_update(registros, ['nome_normalizado'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_leitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leitor',
+            name='nome_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=301),
+        ),
+        migrations.RunPython(preencher_normalizados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:25
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_situacao(apps, schema_editor):
+    Leitor = apps.get_model('app_leitor', 'Leitor')
+    Emprestimo = apps.get_model('app_emprestimo', 'Emprestimo')
+    LancamentoMulta = apps.get_model('app_emprestimo', 'LancamentoMulta')
+    abertos = Emprestimo.objects.filter(leitor=OuterRef('pk'), data_devolucao__isnull=True).order_by()
+    decimal = DecimalField(max_digits=10, decimal_places=2)
+    Leitor.objects.update(
+        emprestimos_ativos=Coalesce(
+            Subquery(abertos.values('leitor').annotate(total=Count('pk')).values('total')),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+        proxima_devolucao=Subquery(
+            abertos.order_by('data_devolucao_prevista').values('data_devolucao_prevista')[:1],
+        ),
+        saldo_multas=Coalesce(
+            Subquery(
+                LancamentoMulta.objects.filter(leitor=OuterRef('pk')).order_by('-id').values('saldo')[:1],
+                output_field=decimal,
+            ),
+            Value(Decimal('0.00')),
+            output_field=decimal,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_leitor', '0002_normalizados'),
+        ('app_emprestimo', '0008_indices_emprestimos_abertos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leitor',
+            name='emprestimos_ativos',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='leitor',
+            name='proxima_devolucao',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='leitor',
+            name='saldo_multas',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(preencher_situacao, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:59
+
+import app_leitor.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_leitor', '0003_situacao_circulacao'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leitor',
+            name='telefone',
+            field=models.CharField(max_length=15, validators=[app_leitor.models.validar_telefone]),
+        ),
+    ]
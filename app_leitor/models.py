@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from biblioteca.texto import normalizar
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 import re
@@ -43,6 +44,8 @@ def validar_telefone(telefone):
     if len(apenas_numeros) < 10 or len(apenas_numeros) > 11:
         raise ValidationError('Telefone deve ter 10 ou 11 dígitos (incluindo DDD)')
 
+CAMPOS_CIRCULACAO = ('emprestimos_ativos', 'proxima_devolucao', 'saldo_multas')
+
 class Leitor(User):
     cpf = models.CharField(max_length=11, unique=True, validators=[validar_cpf])
     telefone = models.CharField(max_length=15, validators=[validar_telefone])
@@ -50,10 +53,31 @@ class Leitor(User):
     data_nascimento = models.DateField()
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
+    # Nome completo sem acentos e em minúsculas para busca e ordenação
+    nome_normalizado = models.CharField(max_length=301, db_index=True, editable=False, default='')
+    # Situação de circulação desnormalizada, mantida por app_emprestimo
+    # (situacao.py e multas.py) na mesma transação de cada movimento
+    emprestimos_ativos = models.PositiveSmallIntegerField(default=0, editable=False)
+    proxima_devolucao = models.DateField(null=True, blank=True, editable=False)
+    saldo_multas = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
     
+    def save(self, *args, **kwargs):
+        self.nome_normalizado = normalizar(f"{self.first_name} {self.last_name}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'nome_normalizado'}
+        elif not self._state.adding and self.pk:
+            # Editar o cadastro não regrava os contadores lidos antes, que
+            # podem ter mudado com um empréstimo no meio tempo
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in CAMPOS_CIRCULACAO
+            ]
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = 'Leitor'
         verbose_name_plural = 'Leitores'
@@ -1,3 +1,101 @@
+from datetime import date
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app_funcionario.models import Funcionario
+from biblioteca.pagination import POR_PAGINA
+from .models import Leitor
+
+
+class ListagemLeitoresTest(TestCase):
+    """A listagem mostra linhas leves (tuplas nomeadas), sem ler a senha nem instanciar Leitor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.funcionario.groups.add(Group.objects.create(name='Funcionarios'))
+        for numero in range(POR_PAGINA + 1):
+            Leitor.objects.create(
+                username=f'leitor{numero:02d}', first_name='Leitor', last_name=f'{numero:02d}',
+                cpf=f'{numero:011d}', telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.funcionario)
+
+    def test_linhas_enxutas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('app_leitor:listar'))
+        self.assertEqual(resposta.status_code, 200)
+        linhas = resposta.context['leitores']
+        self.assertEqual(len(linhas), POR_PAGINA)
+        self.assertNotIsInstance(linhas[0], Leitor)
+        primeiro = Leitor.objects.get(username='leitor00')
+        self.assertContains(resposta, 'Leitor 00')
+        self.assertContains(resposta, reverse('app_leitor:editar', args=[primeiro.pk]))
+        listagem = [consulta['sql'] for consulta in consultas.captured_queries if 'nome_normalizado' in consulta['sql']]
+        self.assertTrue(listagem)
+        self.assertFalse([sql for sql in listagem if 'password' in sql])
+
+    def test_proxima_pagina_pelas_linhas_enxutas(self):
+        pagina = self.client.get(reverse('app_leitor:listar')).context['pagina']
+        resposta = self.client.get(reverse('app_leitor:listar') + pagina.next_url)
+        self.assertEqual([leitor.username for leitor in resposta.context['leitores']], [f'leitor{POR_PAGINA:02d}'])
+
+    def test_busca_sem_acentos(self):
+        joao = Leitor.objects.create(
+            username='joao', first_name='João', last_name='Araújo', cpf='52998224725',
+            telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+        )
+        self.assertEqual(joao.nome_normalizado, 'joao araujo')
+        resposta = self.client.get(reverse('app_leitor:listar'), {'search': 'JOAO ARAUJO'})
+        self.assertEqual([leitor.pk for leitor in resposta.context['leitores']], [joao.pk])
+
+
+class AutocompleteLeitoresTest(TestCase):
+    """Sugestões em JSON para o balcão: prefixo do nome ou do CPF, só leitores ativos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.funcionario.groups.add(Group.objects.create(name='Funcionarios'))
+        dados = [
+            ('joao', 'João', 'Araújo', '52998224725', True),
+            ('joana', 'Joana', 'Reis', '11144477735', True),
+            ('jose', 'José', 'Lima', '52911111111', False),
+        ]
+        cls.leitores = {}
+        for username, nome, sobrenome, cpf, ativo in dados:
+            cls.leitores[username] = Leitor.objects.create(
+                username=username, first_name=nome, last_name=sobrenome, cpf=cpf, ativo=ativo,
+                telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1),
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.funcionario)
+
+    def sugerir(self, termo):
+        resposta = self.client.get(reverse('app_leitor:autocomplete'), {'q': termo})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()['resultados']
+
+    def test_prefixo_do_nome_sem_acentos(self):
+        self.assertEqual(self.sugerir('JO'), [
+            {'id': self.leitores['joana'].pk, 'texto': 'Joana Reis'},
+            {'id': self.leitores['joao'].pk, 'texto': 'João Araújo'},
+        ])
 
-# Create your tests here.
+    def test_prefixo_do_cpf_formatado(self):
+        self.assertEqual([item['id'] for item in self.sugerir('529.98')], [self.leitores['joao'].pk])
+        self.assertEqual(self.sugerir('529.11'), [])
@@ -6,6 +6,8 @@ app_name = 'app_leitor'
 urlpatterns = [
     path('', views.leitor_list, name='listar'),
     path('criar/', views.leitor_create, name='criar'),
+    path('exportar/', views.leitor_export, name='exportar'),
+    path('autocomplete/', views.leitor_autocomplete, name='autocomplete'),
     path('<int:pk>/editar/', views.leitor_update, name='editar'),
     path('<int:pk>/deletar/', views.leitor_delete, name='deletar'),
 ]
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User, Group
 from django.contrib import messages
@@ -6,6 +7,9 @@ from django.core.exceptions import ValidationError
 from django.db import transaction
 from .models import Leitor
 from .forms import LeitorForm
+from .consultas import COLUNAS_EXPORTACAO, filtrar_leitores, para_listagem, sugerir_leitores
+from biblioteca.exportacao import resposta_exportacao
+from biblioteca.pagination import paginar
 from biblioteca.decorators import funcionario_required
 
 @login_required
@@ -13,21 +17,12 @@ from biblioteca.decorators import funcionario_required
 def leitor_list(request):
     search = request.GET.get('search', '')
     
-    leitores = Leitor.objects.all()
-    
-    if search:
-        leitores = leitores.filter(
-            first_name__icontains=search
-        ) | leitores.filter(
-            last_name__icontains=search
-        ) | leitores.filter(
-            cpf__icontains=search
-        )
-    
-    leitores = leitores.order_by('first_name')
+    leitores, ordem = filtrar_leitores(request.GET)
+    pagina = paginar(request, para_listagem(leitores), ordem)
     
     context = {
-        'leitores': leitores,
+        'leitores': pagina.object_list,
+        'pagina': pagina,
         'search': search
     }
     return render(request, 'app_leitor/list.html', context)
@@ -117,3 +112,20 @@ def leitor_delete(request, pk):
         messages.success(request, 'Leitor desativado com sucesso!')
         return redirect('app_leitor:listar')
     return render(request, 'app_leitor/confirm_delete.html', {'object': leitor})
+
+@login_required
+@funcionario_required
+def leitor_export(request):
+    leitores, ordem = filtrar_leitores(request.GET)
+    return resposta_exportacao(request, 'leitores', leitores.order_by(*ordem, 'pk'), COLUNAS_EXPORTACAO)
+
+@login_required
+@funcionario_required
+def leitor_autocomplete(request):
+    """Sugestões de leitores ativos por prefixo do nome ou do CPF"""
+    leitores = sugerir_leitores(request.GET.get('q', ''))
+    return JsonResponse({
+        'resultados': [
+            {'id': pk, 'texto': f'{first_name} {last_name}'} for pk, first_name, last_name in leitores
+        ]
+    })
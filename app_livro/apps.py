@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppLivroConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_livro'
+
+    def ready(self):
+        from . import signals  # noqa: F401
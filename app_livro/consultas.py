@@ -0,0 +1,106 @@
+"""
+Filtros da listagem de livros, compartilhados com a exportação
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from biblioteca.texto import filtro_prefixo, normalizar
+from .models import Livro, LivroSimilar, filtro_isbn, normalizar_isbn
+from .search import buscar_livros
+from .trigramas import buscar_aproximado
+
+COLUNAS_EXPORTACAO = [
+    ('id', 'id'),
+    ('titulo', 'titulo'),
+    ('autor', 'autor'),
+    ('ano', 'ano'),
+    ('genero', 'genero'),
+    ('categoria', 'categoria__nome'),
+    ('isbn', 'isbn'),
+    ('editora', 'editora'),
+    ('disponivel', 'disponivel'),
+    ('criado_em', 'criado_em'),
+]
+
+# Ordenação dos resultados da busca aproximada (por trigramas)
+ORDEM_APROXIMADA = ['-similaridade']
+
+
+def isbn_ou_vazio(termo):
+    """Retorna o ISBN-13 canônico se o termo de busca for um ISBN válido"""
+    if not termo or not termo.replace('-', '').replace(' ', '').upper().rstrip('X').isdigit():
+        return ''
+    try:
+        return normalizar_isbn(termo)
+    except ValidationError:
+        return ''
+
+
+def filtrar_livros(params, apenas_disponiveis=False):
+    """
+    Aplica os filtros da listagem (search e facetas) e retorna
+    (queryset, ordenação) para paginação ou exportação.
+    """
+    search = params.get('search', '')
+    categoria_id = params.get('categoria', '')
+    genero = params.get('genero', '')
+    editora = params.get('editora', '')
+    decada = params.get('decada', '')
+    disponivel = params.get('disponivel', '')
+    
+    livros = Livro.objects.all()
+    
+    # Leitores veem apenas livros disponíveis
+    if apenas_disponiveis:
+        livros = livros.filter(disponivel=True)
+    
+    if categoria_id.isdigit():
+        livros = livros.filter(categoria_id=categoria_id)
+    if genero:
+        livros = livros.filter(genero=genero)
+    if editora:
+        livros = livros.filter(editora=editora)
+    if decada.isdigit():
+        livros = livros.filter(ano__gte=int(decada), ano__lt=int(decada) + 10)
+    if disponivel in ('0', '1'):
+        livros = livros.filter(disponivel=disponivel == '1')
+    
+    isbn = isbn_ou_vazio(search)
+    if isbn:
+        # Código lido no balcão: consulta direta pelo índice único de ISBN
+        return livros.filter(filtro_isbn(isbn)), ['titulo_normalizado']
+    if search:
+        # Busca textual ordenada por relevância
+        encontrados = buscar_livros(livros, search)
+        if encontrados.exists():
+            return encontrados, ['relevancia']
+        # Nada encontrado: provável erro de digitação, busca por trigramas
+        return buscar_aproximado(livros, search), ORDEM_APROXIMADA
+    return livros, ['titulo_normalizado']
+
+
+def sugerir_livros(termo, limite=20):
+    """
+    Livros disponíveis cujo título (ou ISBN, se o termo for numérico)
+    começa com o termo. Retorna tuplas (id, titulo, autor).
+    """
+    termo = termo.strip()
+    if not termo:
+        return []
+    digitos = termo.replace('-', '').replace(' ', '')
+    if digitos.isdigit():
+        filtro = filtro_prefixo('isbn', digitos) & ~Q(isbn='')
+        ordem = 'isbn'
+    else:
+        filtro = filtro_prefixo('titulo_normalizado', normalizar(termo))
+        ordem = 'titulo_normalizado'
+    livros = Livro.objects.filter(filtro, disponivel=True).order_by(ordem)
+    return list(livros.values_list('pk', 'titulo', 'autor')[:limite])
+
+
+def similares_a(livro, limite=6):
+    """Livros mais parecidos pelo conteúdo, calculados por similares.py"""
+    return (LivroSimilar.objects
+            .filter(livro=livro)
+            .select_related('similar')
+            .order_by('posicao')[:limite])
@@ -0,0 +1,119 @@
+"""
+Navegação facetada do acervo (categoria, gênero, editora, década e
+disponibilidade) com contagens em cache
+
+Cada faceta é contada por uma consulta agrupada só pela sua coluna. O
+resultado fica em cache por (filtros, versão do catálogo); qualquer escrita
+em Livro ou Emprestimo incrementa a versão depois do commit
+(transaction.on_commit), invalidando as contagens anteriores. Incrementar
+antes do commit deixaria uma leitura concorrente guardar as contagens
+antigas sob a versão nova.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, ExpressionWrapper, F, IntegerField
+
+CHAVE_VERSAO = 'catalogo:versao'
+TEMPO_CACHE = 10 * 60
+VALORES_POR_FACETA = 10
+
+FACETAS = (
+    ('categoria', 'Categoria'),
+    ('genero', 'Gênero'),
+    ('editora', 'Editora'),
+    ('decada', 'Década'),
+    ('disponivel', 'Disponibilidade'),
+)
+
+
+def versao_catalogo():
+    # Começa pelo horário atual para que uma versão perdida do cache não
+    # reaproveite contagens antigas
+    return cache.get_or_set(CHAVE_VERSAO, lambda: int(time.time() * 1000), None)
+
+
+def invalidar():
+    """Marca o catálogo como alterado (chamado pelos sinais de Livro e Emprestimo)"""
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, int(time.time() * 1000), None)
+
+
+def _chave(params, apenas_disponiveis):
+    filtros = sorted((k, v) for k, v in params.items() if k != 'cursor' and v)
+    texto = repr((filtros, apenas_disponiveis))
+    return f'catalogo:facetas:{versao_catalogo()}:{hashlib.md5(texto.encode()).hexdigest()}'
+
+
+def _rotulo(faceta, valor, nome_categoria=None):
+    if faceta == 'categoria':
+        return nome_categoria or 'Sem categoria'
+    if faceta == 'decada':
+        return f'{valor}s'
+    if faceta == 'disponivel':
+        return 'Disponível' if valor else 'Emprestado'
+    return valor or 'Não informado'
+
+
+def contar_facetas(livros, params, apenas_disponiveis=False):
+    """
+    Retorna {faceta: [(valor, rótulo, total), ...]} para o queryset já
+    filtrado, usando o cache quando possível.
+    """
+    chave = _chave(params, apenas_disponiveis)
+    facetas = cache.get(chave)
+    if facetas is not None:
+        return facetas
+
+    livros = livros.order_by()
+    facetas = {}
+    for faceta, _ in FACETAS:
+        # Um GROUP BY por faceta: tantas linhas quantos valores distintos
+        # da coluna, e só as VALORES_POR_FACETA mais frequentes saem do banco
+        if faceta == 'categoria':
+            grupos = livros.values_list('categoria_id', 'categoria__nome')
+        elif faceta == 'decada':
+            grupos = livros.annotate(
+                decada=ExpressionWrapper(F('ano') / 10 * 10, output_field=IntegerField()),
+            ).values_list('decada')
+        else:
+            grupos = livros.values_list(faceta)
+        coluna = 'categoria_id' if faceta == 'categoria' else faceta
+        grupos = grupos.annotate(total=Count('id')).order_by('-total', coluna)[:VALORES_POR_FACETA]
+        facetas[faceta] = [
+            (grupo[0], _rotulo(faceta, grupo[0], grupo[1] if faceta == 'categoria' else None), grupo[-1])
+            for grupo in grupos
+        ]
+    cache.set(chave, facetas, TEMPO_CACHE)
+    return facetas
+
+
+def _valor_parametro(faceta, valor):
+    if faceta == 'disponivel':
+        return '1' if valor else '0'
+    return '' if valor is None else str(valor)
+
+
+def montar_links(request, facetas):
+    """Acrescenta a cada valor de faceta o link que aplica (ou remove) o filtro"""
+    resultado = []
+    for faceta, titulo in FACETAS:
+        selecionado = request.GET.get(faceta, '')
+        itens = []
+        for valor, rotulo, total in facetas.get(faceta, []):
+            valor_parametro = _valor_parametro(faceta, valor)
+            if not valor_parametro:
+                continue
+            params = request.GET.copy()
+            params.pop('cursor', None)
+            ativo = selecionado == valor_parametro
+            if ativo:
+                params.pop(faceta, None)
+            else:
+                params[faceta] = valor_parametro
+            itens.append({'rotulo': rotulo, 'total': total, 'ativo': ativo, 'url': f'?{params.urlencode()}'})
+        resultado.append({'nome': faceta, 'titulo': titulo, 'itens': itens})
+    return resultado
@@ -1,11 +1,22 @@
 from django import forms
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from .models import Livro
+from .models import Livro, chave_duplicidade, filtro_isbn, normalizar_isbn
 from app_categoria.models import Categoria
-import re
 
 class LivroForm(forms.ModelForm):
+    # Aceita ISBN com hífens/espaços; o valor salvo é o ISBN-13 canônico
+    isbn = forms.CharField(
+        max_length=17,
+        required=False,
+        label='ISBN',
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Digite o ISBN (opcional)',
+            'pattern': '[0-9Xx\\- ]{10,17}'
+        })
+    )
+
     class Meta:
         model = Livro
         fields = ['titulo', 'autor', 'ano', 'genero', 'categoria', 'isbn', 'editora', 'disponivel']
@@ -35,11 +46,6 @@ class LivroForm(forms.ModelForm):
             'categoria': forms.Select(attrs={
                 'class': 'form-control'
             }),
-            'isbn': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'Digite o ISBN (opcional)',
-                'pattern': '[0-9X-]{10,17}'
-            }),
             'editora': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Digite o nome da editora (opcional)'
@@ -54,7 +60,6 @@ class LivroForm(forms.ModelForm):
             'ano': 'Ano de Publicação',
             'genero': 'Gênero',
             'categoria': 'Categoria',
-            'isbn': 'ISBN',
             'editora': 'Editora',
             'disponivel': 'Disponível',
         }
@@ -102,22 +107,11 @@ class LivroForm(forms.ModelForm):
         if not isbn:
             return isbn
         
-        # Remove hífens e espaços
-        isbn_limpo = re.sub(r'[-\s]', '', isbn)
-        
-        if len(isbn_limpo) not in [10, 13]:
-            raise forms.ValidationError('ISBN deve ter 10 ou 13 dígitos')
-        
-        # Verifica se são apenas números (exceto X no final para ISBN-10)
-        if len(isbn_limpo) == 10:
-            if not isbn_limpo[:-1].isdigit() or (isbn_limpo[-1] not in '0123456789X'):
-                raise forms.ValidationError('ISBN-10 inválido')
-        else:
-            if not isbn_limpo.isdigit():
-                raise forms.ValidationError('ISBN-13 deve conter apenas números')
+        # Valida o dígito verificador e converte para ISBN-13
+        isbn_limpo = normalizar_isbn(isbn)
         
         # Verifica se já existe um livro com este ISBN (exceto o atual, se estiver editando)
-        existing = Livro.objects.filter(isbn=isbn_limpo)
+        existing = Livro.objects.filter(filtro_isbn(isbn_limpo))
         if self.instance and self.instance.pk:
             existing = existing.exclude(pk=self.instance.pk)
         
@@ -140,11 +134,7 @@ class LivroForm(forms.ModelForm):
 
         # Verificar se já existe um livro com título e autor idênticos
         if titulo and autor and ano:
-            existing = Livro.objects.filter(
-                titulo__iexact=titulo,
-                autor__iexact=autor,
-                ano=ano
-            )
+            existing = Livro.objects.filter(chave_duplicidade=chave_duplicidade(titulo, autor, ano))
             if self.instance and self.instance.pk:
                 existing = existing.exclude(pk=self.instance.pk)
             
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_funcionario.models import Funcionario
+from app_leitor.models import Leitor
+from app_livro.models import Livro
+from biblioteca.texto import normalizar
+
+
+def _nome(registro):
+    return normalizar(f"{registro.first_name} {registro.last_name}")
+
+
+class Command(BaseCommand):
+    help = 'Preenche as colunas normalizadas (sem acentos) de livros, leitores e funcionários'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        alvos = [
+            (Livro, ['titulo', 'autor'], {
+                'titulo_normalizado': lambda livro: normalizar(livro.titulo),
+                'autor_normalizado': lambda livro: normalizar(livro.autor),
+            }),
+            (Leitor, ['first_name', 'last_name'], {'nome_normalizado': _nome}),
+            (Funcionario, ['first_name', 'last_name'], {'nome_normalizado': _nome}),
+        ]
+        for model, origem, campos in alvos:
+            atualizados = 0
+            lote = []
+            registros = model.objects.only(*origem, *campos).order_by('pk').iterator(chunk_size=batch_size)
+            for registro in registros:
+                alterado = False
+                for campo, calcular in campos.items():
+                    valor = calcular(registro)
+                    if getattr(registro, campo) != valor:
+                        setattr(registro, campo, valor)
+                        alterado = True
+                if alterado:
+                    lote.append(registro)
+                if len(lote) >= batch_size:
+                    atualizados += self._salvar(model, lote, campos)
+                    lote = []
+            atualizados += self._salvar(model, lote, campos)
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {atualizados} registros atualizados')
+        self.stdout.write(self.style.SUCCESS('Colunas normalizadas preenchidas.'))
+
+    def _salvar(self, model, lote, campos):
+        if not lote:
+            return 0
+        with transaction.atomic():
+            model.objects.bulk_update(lote, list(campos))
+        return len(lote)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from app_livro import similares
+
+
+class Command(BaseCommand):
+    help = 'Calcula os livros similares pelo conteúdo (TF-IDF) dos livros novos ou alterados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true',
+                            help='Recalcula todo o acervo em vez de só os livros alterados')
+        parser.add_argument('--similares', type=int, default=similares.SIMILARES_POR_LIVRO,
+                            help='Quantidade de similares guardados por livro')
+        parser.add_argument('--bloco', type=int, default=similares.LIVROS_POR_BLOCO,
+                            help='Livros comparados com o acervo a cada multiplicação')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if similares.sparse is None:
+            self.stdout.write(self.style.WARNING(
+                'NumPy/SciPy não instalados; usando o cálculo em Python puro.'
+            ))
+        processados, regravados = similares.processar(
+            completo=options['completo'],
+            k=options['similares'],
+            bloco=options['bloco'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{processados} livros processados, {regravados} listas de similares gravadas.'
+        ))
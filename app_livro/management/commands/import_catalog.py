@@ -0,0 +1,221 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app_categoria.models import Categoria
+from app_livro import facetas, search, trigramas
+from app_livro.models import Livro, chave_duplicidade, normalizar_isbn
+from biblioteca.texto import normalizar
+
+CAMPOS_OBRIGATORIOS = ('titulo', 'autor', 'ano', 'genero')
+# Campos de texto com tamanho máximo: valores maiores são rejeitados, como no LivroForm
+CAMPOS_LIMITADOS = ('titulo', 'autor', 'genero', 'editora')
+
+# Ids buscados de volta pela chave de duplicidade, por consulta
+LOTE_IDS = 500
+
+# Ordem das colunas de cada linha montada por _montar_livro
+COLUNAS = (
+    'titulo', 'autor', 'ano', 'genero', 'categoria', 'isbn', 'editora', 'disponivel',
+    'titulo_normalizado', 'autor_normalizado', 'chave_duplicidade', 'criado_em',
+    'atualizado_em',
+)
+
+
+def ler_csv(arquivo, delimitador):
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    for numero, linha in enumerate(leitor, start=2):
+        yield numero, linha
+
+
+def ler_jsonl(arquivo):
+    for numero, linha in enumerate(arquivo, start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield numero, json.loads(linha)
+        except json.JSONDecodeError as e:
+            yield numero, e
+
+
+class Command(BaseCommand):
+    help = 'Importa livros em massa a partir de um arquivo CSV ou JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo .csv ou .jsonl')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Padrão: deduzido pela extensão')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Livros por transação')
+        parser.add_argument('--delimitador', default=',', help='Delimitador do CSV')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--rejeitados', help='Arquivo JSONL para gravar as linhas rejeitadas')
+        parser.add_argument('--dry-run', action='store_true', help='Valida sem gravar no banco')
+
+    def handle(self, *args, **options):
+        caminho = Path(options['arquivo'])
+        if not caminho.exists():
+            raise CommandError(f'Arquivo não encontrado: {caminho}')
+        formato = options['formato'] or ('jsonl' if caminho.suffix.lower() in ('.jsonl', '.ndjson') else 'csv')
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+
+        self._carregar_indices()
+        self.ano_atual = timezone.now().year
+        self.importados = 0
+        self.rejeitados = 0
+        self.inicio = time.monotonic()
+
+        saida_rejeitados = open(options['rejeitados'], 'w', encoding='utf-8') if options['rejeitados'] else None
+        try:
+            with caminho.open(encoding=options['encoding'], newline='') as arquivo:
+                if formato == 'csv':
+                    linhas = ler_csv(arquivo, options['delimitador'])
+                else:
+                    linhas = ler_jsonl(arquivo)
+
+                lote = []
+                for numero, dados in linhas:
+                    try:
+                        if isinstance(dados, Exception):
+                            raise ValidationError(f'JSON inválido: {dados}')
+                        lote.append(self._montar_livro(dados))
+                    except ValidationError as e:
+                        self.rejeitados += 1
+                        if saida_rejeitados:
+                            saida_rejeitados.write(json.dumps(
+                                {'linha': numero, 'erros': e.messages, 'dados': dados if isinstance(dados, dict) else None},
+                                ensure_ascii=False, default=str
+                            ) + '\n')
+                        continue
+                    if len(lote) >= self.batch_size:
+                        self._gravar(lote)
+                        lote = []
+                self._gravar(lote)
+        finally:
+            if saida_rejeitados:
+                saida_rejeitados.close()
+            if self.importados and not self.dry_run:
+                facetas.invalidar()
+
+        duracao = time.monotonic() - self.inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.importados} livros importados, {self.rejeitados} rejeitados em {duracao:.1f}s'
+            + (' (dry-run)' if self.dry_run else '')
+        ))
+
+    def _carregar_indices(self):
+        """Índices em memória para deduplicar sem consultar o banco por linha"""
+        self.isbns = set(Livro.objects.exclude(isbn='').values_list('isbn', flat=True).iterator())
+        self.chaves = set(
+            Livro.objects.exclude(chave_duplicidade=None).values_list('chave_duplicidade', flat=True).iterator()
+        )
+        self.categorias = {nome.casefold(): pk for pk, nome in Categoria.objects.values_list('pk', 'nome')}
+
+        opts = Livro._meta
+        self.tabela = connection.ops.quote_name(opts.db_table)
+        colunas = ', '.join(connection.ops.quote_name(opts.get_field(nome).column) for nome in COLUNAS)
+        self.sql_insert = f'INSERT INTO {self.tabela} ({colunas}) VALUES ({", ".join(["%s"] * len(COLUNAS))})'
+
+    def _montar_livro(self, dados):
+        """Aplica as mesmas regras de LivroForm e normalizar_isbn e devolve os valores da linha"""
+        valores = {campo: str(dados.get(campo) or '').strip() for campo in
+                   ('titulo', 'autor', 'ano', 'genero', 'categoria', 'isbn', 'editora', 'disponivel')}
+
+        erros = [f'Campo obrigatório ausente: {campo}' for campo in CAMPOS_OBRIGATORIOS if not valores[campo]]
+        for campo in CAMPOS_LIMITADOS:
+            limite = Livro._meta.get_field(campo).max_length
+            if len(valores[campo]) > limite:
+                erros.append(f'Campo {campo} com mais de {limite} caracteres ({len(valores[campo])})')
+        if erros:
+            raise ValidationError(erros)
+
+        try:
+            ano = int(valores['ano'])
+        except ValueError:
+            raise ValidationError('Ano inválido')
+        if ano > self.ano_atual:
+            raise ValidationError('Ano do livro não pode ser futuro')
+        if ano < 1000:
+            raise ValidationError('Ano inválido')
+
+        isbn = normalizar_isbn(valores['isbn'])
+        if isbn and isbn in self.isbns:
+            raise ValidationError('Já existe um livro cadastrado com este ISBN')
+
+        chave = chave_duplicidade(valores['titulo'], valores['autor'], ano)
+        if chave in self.chaves:
+            raise ValidationError('Já existe um livro cadastrado com este título, autor e ano')
+
+        categoria_id = None
+        if valores['categoria']:
+            categoria_id = self.categorias.get(valores['categoria'].casefold())
+            if categoria_id is None:
+                raise ValidationError(f'Categoria inexistente: {valores["categoria"]}')
+
+        titulo = valores['titulo']
+        autor = valores['autor']
+
+        # Registra no índice para deduplicar também dentro do próprio arquivo
+        if isbn:
+            self.isbns.add(isbn)
+        self.chaves.add(chave)
+        return [
+            titulo,
+            autor,
+            ano,
+            valores['genero'],
+            categoria_id,
+            isbn,
+            valores['editora'],
+            valores['disponivel'].lower() not in ('0', 'false', 'nao', 'não', 'n'),
+            normalizar(titulo),
+            normalizar(autor),
+            chave,
+        ]
+
+    def _gravar(self, lote):
+        """
+        Grava um lote numa única transação.
+
+        Usa executemany com um INSERT preparado em vez de bulk_create: no
+        SQLite o bulk_create fica limitado a 999 parâmetros por comando
+        (~90 livros) e gasta a maior parte do tempo compilando SQL. Os ids
+        gravados são buscados de volta pela chave de duplicidade (única), e
+        só esses livros entram no índice de busca (INSERT ... SELECT) e no de
+        trigramas (executemany), mesmo com outras escritas ao mesmo tempo.
+        """
+        if not lote:
+            return
+        if not self.dry_run:
+            agora = connection.ops.adapt_datetimefield_value(timezone.now())
+            for linha in lote:
+                linha.extend((agora, agora))
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.executemany(self.sql_insert, lote)
+                ids = self._ids_gravados(lote)
+                search.indexar_ids(ids)
+                trigramas.indexar_ids(ids)
+        self.importados += len(lote)
+        duracao = time.monotonic() - self.inicio
+        self.stdout.write(
+            f'{self.importados} importados, {self.rejeitados} rejeitados '
+            f'({self.importados / duracao if duracao else 0:.0f} livros/s)'
+        )
+
+    def _ids_gravados(self, lote):
+        """Ids dos livros do lote, pela chave de duplicidade de cada linha"""
+        posicao = COLUNAS.index('chave_duplicidade')
+        chaves = [linha[posicao] for linha in lote]
+        ids = []
+        for inicio in range(0, len(chaves), LOTE_IDS):
+            ids.extend(Livro.objects.filter(
+                chave_duplicidade__in=chaves[inicio:inicio + LOTE_IDS],
+            ).values_list('pk', flat=True))
+        return ids
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app_livro import search, trigramas
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os índices de busca textual e de trigramas do acervo de livros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = trigramas.reconstruir_indice(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} livros no índice de trigramas.'))
+        if not search.fts_disponivel():
+            self.stdout.write(self.style.WARNING('Banco de dados sem suporte a FTS5; índice textual ignorado.'))
+            return
+        total = search.reconstruir_indice(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} livros indexados.'))
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'app_livro_livro_fts'
+
+
+def criar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "titulo, autor, genero, editora, categoria, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, titulo, autor, genero, editora, categoria) "
+        "SELECT l.id, l.titulo, l.autor, l.genero, l.editora, COALESCE(c.nome, '') "
+        "FROM app_livro_livro l LEFT JOIN app_categoria_categoria c ON c.id = l.categoria_id"
+    )
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
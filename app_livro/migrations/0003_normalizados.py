@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:58
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar(texto):
+    """Cópia de biblioteca.texto.normalizar como era nesta migração"""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def preencher_normalizados(apps, schema_editor):
+    Livro = apps.get_model('app_livro', 'Livro')
+    livros = []
+    for livro in Livro.objects.only('titulo', 'autor').iterator(chunk_size=2000):
+        livro.titulo_normalizado = normalizar(livro.titulo)
+        livro.autor_normalizado = normalizar(livro.autor)
+        livros.append(livro)
+    Livro.objects.bulk_update(livros, ['titulo_normalizado', 'autor_normalizado'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0002_livro_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livro',
+            name='autor_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='livro',
+            name='titulo_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(preencher_normalizados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:01
+
+import re
+
+from django.db import migrations, models
+
+
+def _digito_isbn13(doze_digitos):
+    soma = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(doze_digitos))
+    return str((10 - soma % 10) % 10)
+
+
+def normalizar_isbn(isbn):
+    """
+    Cópia de app_livro.models.normalizar_isbn como era nesta migração:
+    ISBN-13 canônico, ou None se o ISBN for inválido.
+    """
+    isbn_limpo = re.sub(r'[-\s]', '', isbn).upper()
+    if len(isbn_limpo) == 10:
+        if not isbn_limpo[:-1].isdigit() or isbn_limpo[-1] not in '0123456789X':
+            return None
+        soma = sum((10 - i) * (10 if d == 'X' else int(d)) for i, d in enumerate(isbn_limpo))
+        if soma % 11 != 0:
+            return None
+        base = '978' + isbn_limpo[:9]
+        return base + _digito_isbn13(base)
+    if len(isbn_limpo) != 13 or not isbn_limpo.isdigit():
+        return None
+    if _digito_isbn13(isbn_limpo[:12]) != isbn_limpo[12]:
+        return None
+    return isbn_limpo
+
+
+def canonizar_isbns(apps, schema_editor):
+    """
+    Converte os ISBNs existentes para ISBN-13. ISBNs inválidos ficam
+    apenas sem hífens; se dois livros passarem a ter o mesmo ISBN, o
+    mais antigo o mantém e os demais ficam sem ISBN para permitir o
+    índice único.
+    """
+    Livro = apps.get_model('app_livro', 'Livro')
+    vistos = set()
+    alterados = []
+    for livro in Livro.objects.exclude(isbn='').only('isbn').order_by('pk').iterator():
+        isbn = normalizar_isbn(livro.isbn)
+        if isbn is None:
+            isbn = livro.isbn.replace('-', '').replace(' ', '')[:13]
+        if isbn in vistos:
+            isbn = ''
+        vistos.add(isbn)
+        if isbn != livro.isbn:
+            livro.isbn = isbn
+            alterados.append(livro)
+    Livro.objects.bulk_update(alterados, ['isbn'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0003_normalizados'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonizar_isbns, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='livro',
+            constraint=models.UniqueConstraint(condition=models.Q(('isbn', ''), _negated=True), fields=('isbn',), name='livro_isbn_unico', violation_error_message='Já existe um livro cadastrado com este ISBN'),
+        ),
+    ]
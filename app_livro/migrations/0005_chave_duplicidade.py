@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:02
+
+import hashlib
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar(texto):
+    """Cópia de biblioteca.texto.normalizar como era nesta migração"""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def chave_duplicidade(titulo, autor, ano):
+    """Cópia de app_livro.models.chave_duplicidade como era nesta migração"""
+    texto = f'{normalizar(titulo)}|{normalizar(autor)}|{ano}'
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+
+def preencher_chaves(apps, schema_editor):
+    """
+    Calcula a chave dos livros existentes. Duplicatas já cadastradas
+    ficam com a chave nula (o mais antigo fica com a chave).
+    """
+    Livro = apps.get_model('app_livro', 'Livro')
+    vistas = set()
+    livros = []
+    for livro in Livro.objects.only('titulo', 'autor', 'ano').order_by('pk').iterator(chunk_size=2000):
+        chave = chave_duplicidade(livro.titulo, livro.autor, livro.ano)
+        livro.chave_duplicidade = None if chave in vistas else chave
+        vistas.add(chave)
+        livros.append(livro)
+    Livro.objects.bulk_update(livros, ['chave_duplicidade'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0004_isbn_canonico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livro',
+            name='chave_duplicidade',
+            field=models.CharField(editable=False, max_length=40, null=True, unique=True),
+        ),
+        migrations.RunPython(preencher_chaves, migrations.RunPython.noop),
+    ]
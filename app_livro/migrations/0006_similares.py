@@ -0,0 +1,51 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0005_chave_duplicidade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livro',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='ProcessamentoSimilares',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iniciado_em', models.DateTimeField()),
+                ('completo', models.BooleanField(default=False)),
+                ('livros_processados', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Processamento de similares',
+                'verbose_name_plural': 'Processamentos de similares',
+                'get_latest_by': 'iniciado_em',
+            },
+        ),
+        migrations.CreateModel(
+            name='LivroSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveSmallIntegerField()),
+                ('pontuacao', models.FloatField()),
+                ('livro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='app_livro.livro')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_a', to='app_livro.livro')),
+            ],
+            options={
+                'verbose_name': 'Livro similar',
+                'verbose_name_plural': 'Livros similares',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='livrosimilar',
+            constraint=models.UniqueConstraint(fields=('livro', 'posicao'), name='livro_similar_posicao'),
+        ),
+    ]
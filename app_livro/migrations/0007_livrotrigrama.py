@@ -0,0 +1,61 @@
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def normalizar(texto):
+    """Cópia de biblioteca.texto.normalizar como era nesta migração"""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def trigramas(texto):
+    """Cópia de biblioteca.texto.trigramas como era nesta migração"""
+    resultado = set()
+    for palavra in normalizar(texto).split():
+        palavra = f'  {palavra} '
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+def preencher_trigramas(apps, schema_editor):
+    Livro = apps.get_model('app_livro', 'Livro')
+    LivroTrigrama = apps.get_model('app_livro', 'LivroTrigrama')
+    lote = []
+    for pk, titulo, autor in Livro.objects.values_list('pk', 'titulo_normalizado', 'autor_normalizado').iterator(chunk_size=2000):
+        lote.extend(LivroTrigrama(livro_id=pk, trigrama=t) for t in trigramas(titulo) | trigramas(autor))
+        if len(lote) >= 20000:
+            LivroTrigrama.objects.bulk_create(lote)
+            lote = []
+    LivroTrigrama.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0006_similares'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LivroTrigrama',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('livro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigramas', to='app_livro.livro')),
+            ],
+            options={
+                'verbose_name': 'Trigrama de livro',
+                'verbose_name_plural': 'Trigramas de livros',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='livrotrigrama',
+            constraint=models.UniqueConstraint(fields=('trigrama', 'livro'), name='livro_trigrama_unico'),
+        ),
+        migrations.RunPython(preencher_trigramas, migrations.RunPython.noop),
+    ]
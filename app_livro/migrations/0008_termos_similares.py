@@ -0,0 +1,41 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_livro', '0007_livrotrigrama'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermoAcervo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=120, unique=True)),
+                ('documentos', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Termo do acervo',
+                'verbose_name_plural': 'Termos do acervo',
+            },
+        ),
+        migrations.CreateModel(
+            name='LivroTermo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=120)),
+                ('peso', models.FloatField()),
+                ('livro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termos', to='app_livro.livro')),
+            ],
+            options={
+                'verbose_name': 'Termo de livro',
+                'verbose_name_plural': 'Termos de livros',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='livrotermo',
+            constraint=models.UniqueConstraint(fields=('termo', 'livro'), name='livro_termo_unico'),
+        ),
+    ]
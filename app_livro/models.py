@@ -2,14 +2,24 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from app_categoria.models import Categoria
+from biblioteca.texto import normalizar
+import hashlib
 import re
 
-def validar_isbn(isbn):
+def _digito_isbn13(doze_digitos):
+    soma = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(doze_digitos))
+    return str((10 - soma % 10) % 10)
+
+def normalizar_isbn(isbn):
+    """
+    Valida o ISBN (inclusive o dígito verificador) e devolve a forma
+    canônica de 13 dígitos. ISBN-10 é convertido para ISBN-13.
+    """
     if not isbn:  # ISBN é opcional
-        return
+        return ''
     
     # Remove hífens e espaços
-    isbn_limpo = re.sub(r'[-\s]', '', isbn)
+    isbn_limpo = re.sub(r'[-\s]', '', isbn).upper()
     
     if len(isbn_limpo) not in [10, 13]:
         raise ValidationError('ISBN deve ter 10 ou 13 dígitos')
@@ -18,9 +28,35 @@ def validar_isbn(isbn):
     if len(isbn_limpo) == 10:
         if not isbn_limpo[:-1].isdigit() or (isbn_limpo[-1] not in '0123456789X'):
             raise ValidationError('ISBN-10 inválido')
-    else:
-        if not isbn_limpo.isdigit():
-            raise ValidationError('ISBN-13 deve conter apenas números')
+        soma = sum((10 - i) * (10 if d == 'X' else int(d)) for i, d in enumerate(isbn_limpo))
+        if soma % 11 != 0:
+            raise ValidationError('ISBN-10 inválido (dígito verificador incorreto)')
+        base = '978' + isbn_limpo[:9]
+        return base + _digito_isbn13(base)
+    
+    if not isbn_limpo.isdigit():
+        raise ValidationError('ISBN-13 deve conter apenas números')
+    if _digito_isbn13(isbn_limpo[:12]) != isbn_limpo[12]:
+        raise ValidationError('ISBN-13 inválido (dígito verificador incorreto)')
+    return isbn_limpo
+
+def validar_isbn(isbn):
+    normalizar_isbn(isbn)
+
+def filtro_isbn(isbn):
+    """
+    Filtro por ISBN canônico que repete a condição do índice parcial
+    livro_isbn_unico, para que o SQLite consiga usá-lo.
+    """
+    return models.Q(isbn=isbn) & ~models.Q(isbn='')
+
+def chave_duplicidade(titulo, autor, ano):
+    """
+    Chave que identifica o mesmo livro (título, autor e ano), ignorando
+    acentos, maiúsculas e espaços extras.
+    """
+    texto = f'{normalizar(titulo)}|{normalizar(autor)}|{ano}'
+    return hashlib.sha1(texto.encode()).hexdigest()
 
 class Livro(models.Model):
     titulo = models.CharField(max_length=200)
@@ -32,6 +68,80 @@ class Livro(models.Model):
     editora = models.CharField(max_length=100, blank=True)
     disponivel = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+    # Colunas sem acentos e em minúsculas para busca e ordenação
+    titulo_normalizado = models.CharField(max_length=200, db_index=True, editable=False, default='')
+    autor_normalizado = models.CharField(max_length=100, db_index=True, editable=False, default='')
+    # Hash de (título, autor, ano) normalizados; único para impedir duplicatas
+    chave_duplicidade = models.CharField(max_length=40, unique=True, null=True, editable=False)
+    
+    CAMPOS_NORMALIZADOS = {'titulo_normalizado', 'autor_normalizado', 'chave_duplicidade'}
+    CAMPOS_IDENTIDADE = ('titulo', 'autor', 'ano')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        livro = super().from_db(db, field_names, values)
+        # Título, autor e ano como estão no banco (None se algum veio adiado)
+        if all(campo in livro.__dict__ for campo in cls.CAMPOS_IDENTIDADE):
+            livro._identidade_salva = livro._identidade()
+        return livro
+    
+    def _identidade(self):
+        return tuple(getattr(self, campo) for campo in self.CAMPOS_IDENTIDADE)
+    
+    def atualizar_normalizados(self):
+        self.titulo_normalizado = normalizar(self.titulo)
+        self.autor_normalizado = normalizar(self.autor)
+        # A chave só muda junto com título, autor ou ano. Duplicatas antigas
+        # ficaram com a chave nula na migração 0005 e continuam assim
+        # enquanto a chave calculada pertencer a outro livro.
+        if not self._state.adding and self._identidade() == getattr(self, '_identidade_salva', None):
+            return
+        chave = chave_duplicidade(self.titulo, self.autor, self.ano)
+        if (not self._state.adding and self.chave_duplicidade is None
+                and Livro.objects.filter(chave_duplicidade=chave).exclude(pk=self.pk).exists()):
+            return
+        self.chave_duplicidade = chave
+    
+    def atualizar_isbn(self):
+        """
+        Grava o ISBN sempre como ISBN-13 canônico, qualquer que seja o
+        caminho (formulário, admin, importação ou ORM). Um ISBN inválido
+        fica como está: quem aponta o erro é o validador do campo.
+        """
+        try:
+            self.isbn = normalizar_isbn(self.isbn)
+        except ValidationError:
+            pass
+    
+    @classmethod
+    def buscar_por_isbn(cls, isbn):
+        """Busca pelo ISBN (10 ou 13, com ou sem hífens) usando o índice único"""
+        try:
+            isbn = normalizar_isbn(isbn)
+        except ValidationError:
+            return None
+        if not isbn:
+            return None
+        return cls.objects.filter(filtro_isbn(isbn)).first()
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'isbn' in update_fields:
+            self.atualizar_isbn()
+        if update_fields is None:
+            self.atualizar_normalizados()
+        elif set(update_fields) & set(self.CAMPOS_IDENTIDADE):
+            self.atualizar_normalizados()
+            kwargs['update_fields'] = set(update_fields) | self.CAMPOS_NORMALIZADOS
+        super().save(*args, **kwargs)
+        self._identidade_salva = self._identidade()
+    
+    def clean_fields(self, exclude=None):
+        # Antes dos validadores, para que a restrição de ISBN único compare a forma canônica
+        if not exclude or 'isbn' not in exclude:
+            self.atualizar_isbn()
+        super().clean_fields(exclude=exclude)
     
     def clean(self):
         if self.ano > timezone.now().year:
@@ -45,3 +155,88 @@ class Livro(models.Model):
     class Meta:
         verbose_name = 'Livro'
         verbose_name_plural = 'Livros'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['isbn'],
+                condition=~models.Q(isbn=''),
+                name='livro_isbn_unico',
+                violation_error_message='Já existe um livro cadastrado com este ISBN',
+            ),
+        ]
+
+class LivroSimilar(models.Model):
+    """
+    Livros mais parecidos com cada livro pelo conteúdo (título, autor,
+    gênero, editora e descrição da categoria), gerados pelo comando
+    build_similar_books.
+    """
+    # Coberto pelo índice único (livro, posicao), que também serve a ordenação
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='similares', db_index=False)
+    similar = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='similar_a')
+    posicao = models.PositiveSmallIntegerField()
+    pontuacao = models.FloatField()
+    
+    def __str__(self):
+        return f"{self.livro_id} -> {self.similar_id} ({self.pontuacao:.3f})"
+    
+    class Meta:
+        verbose_name = 'Livro similar'
+        verbose_name_plural = 'Livros similares'
+        constraints = [
+            models.UniqueConstraint(fields=['livro', 'posicao'], name='livro_similar_posicao'),
+        ]
+
+class LivroTrigrama(models.Model):
+    """
+    Índice de trigramas do título e autor normalizados, usado na busca
+    tolerante a erros de digitação (trigramas.py).
+    """
+    # A busca usa o índice único (trigrama, livro); o índice de livro serve à
+    # manutenção a cada gravação e ao CASCADE
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='trigramas')
+    trigrama = models.CharField(max_length=3)
+    
+    class Meta:
+        verbose_name = 'Trigrama de livro'
+        verbose_name_plural = 'Trigramas de livros'
+        constraints = [
+            models.UniqueConstraint(fields=['trigrama', 'livro'], name='livro_trigrama_unico'),
+        ]
+
+class LivroTermo(models.Model):
+    """
+    Vetor TF-IDF de cada livro (um termo por linha, peso já normalizado),
+    guardado pelo build_similar_books para que só os livros alterados sejam
+    revetorizados. Pelo índice único (termo, livro) a execução incremental
+    lê só os livros que têm algum termo em comum com os alterados.
+    """
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='termos')
+    termo = models.CharField(max_length=120)
+    peso = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Termo de livro'
+        verbose_name_plural = 'Termos de livros'
+        constraints = [
+            models.UniqueConstraint(fields=['termo', 'livro'], name='livro_termo_unico'),
+        ]
+
+class TermoAcervo(models.Model):
+    """Em quantos livros cada termo aparece (o IDF dos vetores em LivroTermo)"""
+    termo = models.CharField(max_length=120, unique=True)
+    documentos = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = 'Termo do acervo'
+        verbose_name_plural = 'Termos do acervo'
+
+class ProcessamentoSimilares(models.Model):
+    """Execuções do cálculo de similares; a última marca até onde o acervo foi processado"""
+    iniciado_em = models.DateTimeField()
+    completo = models.BooleanField(default=False)
+    livros_processados = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Processamento de similares'
+        verbose_name_plural = 'Processamentos de similares'
+        get_latest_by = 'iniciado_em'
@@ -0,0 +1,147 @@
+"""
+Índice de busca textual (FTS5 do SQLite) para o acervo de livros
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from biblioteca.texto import normalizar
+
+FTS_TABLE = 'app_livro_livro_fts'
+FTS_COLUNAS = ('titulo', 'autor', 'genero', 'editora', 'categoria')
+
+
+def fts_disponivel():
+    """Indica se o banco atual suporta o índice FTS5"""
+    return connection.vendor == 'sqlite'
+
+
+def montar_consulta(termo, colunas=None):
+    """
+    Converte o texto digitado pelo usuário em uma expressão MATCH do FTS5.
+    Cada palavra vira um prefixo entre aspas, combinadas com AND.
+    """
+    palavras = re.findall(r'\w+', termo or '')
+    if not palavras:
+        return ''
+    consulta = ' '.join(f'"{palavra}"*' for palavra in palavras)
+    if colunas:
+        consulta = '{%s} : (%s)' % (' '.join(colunas), consulta)
+    return consulta
+
+
+def _valores(livro):
+    return (
+        livro.pk,
+        livro.titulo,
+        livro.autor,
+        livro.genero,
+        livro.editora,
+        livro.categoria.nome if livro.categoria_id else '',
+    )
+
+
+def indexar_livros(livros):
+    """Insere ou substitui os livros informados no índice"""
+    if not fts_disponivel():
+        return
+    valores = [_valores(livro) for livro in livros]
+    if not valores:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(v[0],) for v in valores])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FTS_COLUNAS)}) VALUES (%s, %s, %s, %s, %s, %s)',
+            valores
+        )
+
+
+def indexar_livro(livro):
+    indexar_livros([livro])
+
+
+def remover_livro(livro_id):
+    """Remove um livro do índice"""
+    if not fts_disponivel():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [livro_id])
+
+
+def indexar_ids(ids, lote=500):
+    """Indexa de uma vez os livros informados, direto da tabela (importação em massa)"""
+    if not fts_disponivel():
+        return
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(ids), lote):
+            parte = ids[inicio:inicio + lote]
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FTS_COLUNAS)}) '
+                'SELECT l.id, l.titulo, l.autor, l.genero, l.editora, COALESCE(c.nome, \'\') '
+                'FROM app_livro_livro l LEFT JOIN app_categoria_categoria c ON c.id = l.categoria_id '
+                f'WHERE l.id IN ({", ".join(["%s"] * len(parte))})',
+                parte
+            )
+
+
+def reconstruir_indice(batch_size=2000):
+    """Recria o índice completo a partir da tabela de livros"""
+    from .models import Livro
+
+    if not fts_disponivel():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    total = 0
+    lote = []
+    for livro in Livro.objects.select_related('categoria').order_by('pk').iterator(chunk_size=batch_size):
+        lote.append(livro)
+        if len(lote) >= batch_size:
+            indexar_livros(lote)
+            total += len(lote)
+            lote = []
+    indexar_livros(lote)
+    total += len(lote)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def buscar_livros(queryset, termo):
+    """
+    Filtra o queryset de livros pelo termo e ordena por relevância (bm25).
+    Sem suporte a FTS5, busca nas colunas normalizadas de título e autor.
+    """
+    if not fts_disponivel():
+        termo = normalizar(termo)
+        return queryset.filter(Q(titulo_normalizado__contains=termo) | Q(autor_normalizado__contains=termo)).annotate(
+            relevancia=Value(0.0, output_field=FloatField())
+        )
+
+    consulta = montar_consulta(termo)
+    if not consulta:
+        return queryset.none()
+    tabela = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {tabela}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[consulta],
+    ).annotate(
+        relevancia=RawSQL(f'{FTS_TABLE}.rank', [], output_field=FloatField())
+    ).order_by('relevancia', 'pk')
+
+
+def ids_por_titulo(termo):
+    """
+    Subconsulta SQL (sql, params) com os ids dos livros cujo título
+    corresponde ao termo, para uso em filtros de outras tabelas.
+    Retorna None quando o índice não pode ser usado.
+    """
+    if not fts_disponivel():
+        return None
+    consulta = montar_consulta(termo, colunas=['titulo'])
+    if not consulta:
+        return None
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [consulta]
@@ -0,0 +1,52 @@
+"""
+Sinais que mantêm os índices de busca do acervo sincronizados
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from app_categoria.models import Categoria
+from .models import Livro
+from . import facetas, search, trigramas
+
+
+@receiver(post_save, sender=Livro)
+def indexar_livro(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.indexar_livro(instance)
+    trigramas.indexar_livro(instance)
+    transaction.on_commit(facetas.invalidar)
+
+
+@receiver(post_delete, sender=Livro)
+def remover_livro_do_indice(sender, instance, **kwargs):
+    search.remover_livro(instance.pk)
+    transaction.on_commit(facetas.invalidar)
+
+
+@receiver(post_save, sender=Categoria)
+def reindexar_livros_da_categoria(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    livros = Livro.objects.filter(categoria=instance)
+    # A descrição da categoria entra no cálculo de similares pelo conteúdo
+    livros.update(atualizado_em=timezone.now())
+    search.indexar_livros(livros.select_related('categoria'))
+    transaction.on_commit(facetas.invalidar)
+
+
+@receiver(pre_delete, sender=Categoria)
+def guardar_livros_da_categoria(sender, instance, **kwargs):
+    # A categoria vira NULL nos livros (SET_NULL) sem disparar post_save
+    instance._livros_ids = list(Livro.objects.filter(categoria=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Categoria)
+def reindexar_livros_sem_categoria(sender, instance, **kwargs):
+    ids = getattr(instance, '_livros_ids', None)
+    if ids:
+        Livro.objects.filter(pk__in=ids).update(atualizado_em=timezone.now())
+        search.indexar_livros(Livro.objects.filter(pk__in=ids))
+    transaction.on_commit(facetas.invalidar)
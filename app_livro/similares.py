@@ -0,0 +1,320 @@
+"""
+Livros similares pelo conteúdo.
+
+Cada livro vira um vetor TF-IDF com os termos do título, autor, gênero,
+editora e da descrição da categoria. Cada campo tem vocabulário próprio,
+para que "Machado" no título não case com "Machado" autor. A similaridade é
+o cosseno entre os vetores; os k mais próximos de cada livro ficam na tabela
+LivroSimilar, que as páginas leem pelo índice (livro, posicao).
+
+Os vetores ficam gravados em LivroTermo e a frequência de cada termo no
+acervo (o IDF) em TermoAcervo. O processamento é incremental: só os livros
+criados ou alterados desde o último processamento (atualizado_em) são
+revetorizados, e só são lidos os vetores dos livros que têm algum termo em
+comum com eles. Os demais livros só são regravados quando um alterado entra
+na sua lista ou sai dela. Os pesos já gravados não acompanham as mudanças
+do IDF (nem os livros excluídos saem da frequência dos termos); rode com
+--completo de tempos em tempos para recalcular tudo.
+
+Com NumPy/SciPy instalados cada bloco é uma multiplicação de matrizes
+esparsas, e os k maiores de cada linha saem direto dos valores não nulos do
+resultado, sem montar a matriz densa; sem eles o mesmo cálculo é feito em
+Python puro com um índice invertido, o que serve para acervos pequenos.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from biblioteca.texto import normalizar
+from .models import Livro, LivroSimilar, LivroTermo, ProcessamentoSimilares, TermoAcervo
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+SIMILARES_POR_LIVRO = 10
+LIVROS_POR_BLOCO = 256
+LOTE_CONSULTA = 500
+
+# (prefixo do termo, campo)
+CAMPOS = (
+    ('t', 'titulo'),
+    ('a', 'autor'),
+    ('g', 'genero'),
+    ('e', 'editora'),
+    ('c', 'categoria__descricao'),
+)
+PALAVRAS_VAZIAS = frozenset(
+    'a as o os e de da das do dos em no na nos nas um uma uns umas '
+    'para por com sem que se ao aos the of and'.split()
+)
+# Palavras maiores que isso não cabem em LivroTermo.termo (e não são palavras)
+TAMANHO_PALAVRA = 100
+_PALAVRA = re.compile(r'\w+')
+
+
+def termos(valores):
+    """Contagem dos termos de um livro, prefixados pelo campo de origem"""
+    contagem = Counter()
+    for (prefixo, _), valor in zip(CAMPOS, valores):
+        for palavra in _PALAVRA.findall(normalizar(valor or '')):
+            if 1 < len(palavra) <= TAMANHO_PALAVRA and palavra not in PALAVRAS_VAZIAS:
+                contagem[f'{prefixo}:{palavra}'] += 1
+    return contagem
+
+
+def vetorizar(documento, frequencia, total):
+    """
+    Vetor TF-IDF (tf sublinear, idf suavizado) com norma 1 de um documento;
+    `frequencia` é o número de documentos com cada termo, de `total`
+    """
+    pesos = {
+        termo: (1 + math.log(n)) * (math.log((1 + total) / (1 + frequencia[termo])) + 1)
+        for termo, n in documento.items()
+    }
+    norma = math.sqrt(sum(peso * peso for peso in pesos.values())) or 1.0
+    return {termo: peso / norma for termo, peso in pesos.items()}
+
+
+def _escolher(colunas, valores, k, limiar):
+    """Posições dos k maiores valores e das que passam do próprio limiar"""
+    if len(valores) > k:
+        topo = np.argpartition(-valores, k)[:k]
+    else:
+        topo = np.arange(len(valores))
+    return np.union1d(topo, np.nonzero(valores > limiar[colunas])[0])
+
+
+def _linhas_scipy(vetores, linhas, k, limiar, bloco):
+    vocabulario = {}
+    indptr, indices, dados = [0], [], []
+    for vetor in vetores:
+        for termo, peso in vetor.items():
+            indices.append(vocabulario.setdefault(termo, len(vocabulario)))
+            dados.append(peso)
+        indptr.append(len(indices))
+    matriz = sparse.csr_matrix((dados, indices, indptr), shape=(len(vetores), len(vocabulario)))
+    transposta = matriz.T.tocsr()
+    limiar = np.asarray(limiar)
+    linhas = np.asarray(linhas, dtype=np.int64)
+
+    for inicio in range(0, len(linhas), bloco):
+        parte = linhas[inicio:inicio + bloco]
+        # Continua esparsa: cada linha só tem os livros com algum termo em comum
+        similaridades = (matriz[parte] @ transposta).tocsr()
+        similaridades.sort_indices()
+        for r, i in enumerate(parte):
+            fatia = slice(similaridades.indptr[r], similaridades.indptr[r + 1])
+            colunas = similaridades.indices[fatia]
+            valores = similaridades.data[fatia]
+            outros = (colunas != i) & (valores > 0)
+            colunas, valores = colunas[outros], valores[outros]
+            escolhidos = _escolher(colunas, valores, k, limiar)
+            yield int(i), [(int(colunas[p]), float(valores[p])) for p in escolhidos]
+
+
+def _linhas_python(vetores, linhas, k, limiar, bloco=None):
+    invertido = defaultdict(list)
+    for j, vetor in enumerate(vetores):
+        for termo, peso in vetor.items():
+            invertido[termo].append((j, peso))
+
+    for i in linhas:
+        acumulado = defaultdict(float)
+        for termo, peso in vetores[i].items():
+            for j, outro in invertido[termo]:
+                acumulado[j] += peso * outro
+        acumulado.pop(i, None)
+        escolhidos = dict(heapq.nlargest(k, acumulado.items(), key=itemgetter(1)))
+        escolhidos.update((j, valor) for j, valor in acumulado.items() if valor > limiar[j])
+        yield i, list(escolhidos.items())
+
+
+def similaridades(vetores, linhas, k=SIMILARES_POR_LIVRO, limiar=None, bloco=LIVROS_POR_BLOCO):
+    """
+    Para cada documento em `linhas`, gera (linha, [(outra, similaridade)]) com
+    os k mais similares a ele e, além deles, todo documento j cuja
+    similaridade passa de limiar[j].
+    """
+    if limiar is None:
+        limiar = [math.inf] * len(vetores)
+    calcular = _linhas_scipy if sparse is not None else _linhas_python
+    return calcular(vetores, linhas, k, limiar, bloco)
+
+
+def _em_lotes(itens, tamanho=LOTE_CONSULTA):
+    itens = list(itens)
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def _documentos(livros):
+    """(ids, contagens de termos) dos livros, na ordem de pk"""
+    ids, documentos = [], []
+    campos = [campo for _, campo in CAMPOS]
+    for pk, *valores in livros.values_list('pk', *campos).order_by('pk').iterator(chunk_size=2000):
+        ids.append(pk)
+        documentos.append(termos(valores))
+    return ids, documentos
+
+
+def _termos_gravados(ids, vetores, batch_size):
+    return LivroTermo.objects.bulk_create((
+        LivroTermo(livro_id=pk, termo=termo, peso=peso)
+        for pk, vetor in zip(ids, vetores)
+        for termo, peso in vetor.items()
+    ), batch_size=batch_size)
+
+
+def _completo(k, bloco, batch_size):
+    """Vetoriza todo o acervo e recalcula todas as listas"""
+    ids, documentos = _documentos(Livro.objects.all())
+    frequencia = Counter()
+    for documento in documentos:
+        frequencia.update(documento.keys())
+    vetores = [vetorizar(documento, frequencia, len(ids)) for documento in documentos]
+
+    novas = {
+        ids[i]: [(ids[j], valor) for j, valor in heapq.nlargest(k, pares, key=itemgetter(1))]
+        for i, pares in similaridades(vetores, range(len(ids)), k, None, bloco)
+    }
+
+    def gravar():
+        LivroTermo.objects.all().delete()
+        _termos_gravados(ids, vetores, batch_size)
+        TermoAcervo.objects.all().delete()
+        TermoAcervo.objects.bulk_create(
+            (TermoAcervo(termo=termo, documentos=n) for termo, n in frequencia.items()),
+            batch_size=batch_size,
+        )
+        LivroSimilar.objects.all().delete()
+
+    return len(ids), novas, gravar
+
+
+def _incremental(desde, k, bloco, batch_size):
+    """
+    Revetoriza os livros alterados desde `desde` e recalcula as listas que
+    eles podem mudar, lendo só os vetores gravados que têm termos em comum
+    """
+    # atualizado_em é preenchido também na criação (inclusive pela importação)
+    alterados, documentos = _documentos(Livro.objects.filter(atualizado_em__gte=desde))
+    ids_alterados = set(alterados)
+
+    # Frequência dos termos: sai o vetor antigo dos alterados, entra o novo
+    variacao = Counter()
+    for lote in _em_lotes(alterados):
+        variacao.subtract(LivroTermo.objects.filter(livro_id__in=lote).values_list('termo', flat=True))
+    for documento in documentos:
+        variacao.update(documento.keys())
+    gravada = {}
+    for lote in _em_lotes(variacao):
+        for termo, pk, n in TermoAcervo.objects.filter(termo__in=lote).values_list('termo', 'pk', 'documentos'):
+            gravada[termo] = (pk, n)
+    frequencia = {termo: gravada.get(termo, (None, 0))[1] + n for termo, n in variacao.items()}
+    vetores_alterados = [vetorizar(documento, frequencia, Livro.objects.count()) for documento in documentos]
+
+    # Dos demais livros basta a parte do vetor nos termos dos alterados
+    parciais = defaultdict(dict)
+    for lote in _em_lotes(set().union(*documentos)):
+        for livro, termo, peso in LivroTermo.objects.filter(termo__in=lote).values_list('livro_id', 'termo', 'peso'):
+            if livro not in ids_alterados:
+                parciais[livro][termo] = peso
+    ids = alterados + list(parciais)
+    vetores = vetores_alterados + list(parciais.values())
+
+    # Um livro de fora só troca a lista se um alterado superar o último
+    # colocado dela (qualquer pontuação serve se a lista não está cheia)
+    limiar = [math.inf] * len(alterados) + [0.0] * len(parciais)
+    posicao = {pk: j for j, pk in enumerate(ids)}
+    for lote in _em_lotes(parciais):
+        minimos = (LivroSimilar.objects.filter(livro_id__in=lote).values('livro')
+                   .annotate(minimo=Min('pontuacao'), total=Count('id'))
+                   .values_list('livro', 'minimo', 'total'))
+        for livro, minimo, total in minimos:
+            if total >= k:
+                limiar[posicao[livro]] = minimo
+    # Livros que listam um alterado precisam da pontuação nova dele, qualquer que seja
+    listam_alterado = set()
+    for lote in _em_lotes(alterados):
+        listam_alterado.update(LivroSimilar.objects.filter(similar_id__in=lote).values_list('livro_id', flat=True))
+    listam_alterado -= ids_alterados
+    for livro in listam_alterado:
+        if livro in posicao:
+            limiar[posicao[livro]] = 0.0
+
+    novas = {}
+    candidatos = defaultdict(list)
+    for i, pares in similaridades(vetores, range(len(alterados)), k, limiar, bloco):
+        novas[ids[i]] = [(ids[j], valor) for j, valor in heapq.nlargest(k, pares, key=itemgetter(1))]
+        for j, valor in pares:
+            if valor > limiar[j]:
+                candidatos[ids[j]].append((ids[i], valor))
+
+    afetados = set(candidatos) | listam_alterado
+    anteriores = defaultdict(list)
+    for lote in _em_lotes(afetados):
+        for livro, similar, pontuacao in LivroSimilar.objects.filter(
+            livro_id__in=lote,
+        ).values_list('livro_id', 'similar_id', 'pontuacao'):
+            if similar not in ids_alterados:
+                anteriores[livro].append((similar, pontuacao))
+    for livro in afetados:
+        novas[livro] = heapq.nlargest(k, anteriores[livro] + candidatos[livro], key=itemgetter(1))
+
+    def gravar():
+        for lote in _em_lotes(alterados):
+            LivroTermo.objects.filter(livro_id__in=lote).delete()
+        _termos_gravados(alterados, vetores_alterados, batch_size)
+        mudaram = [termo for termo, n in variacao.items() if n]
+        for lote in _em_lotes(termo for termo in mudaram if frequencia[termo] <= 0):
+            TermoAcervo.objects.filter(termo__in=lote).delete()
+        TermoAcervo.objects.bulk_update([
+            TermoAcervo(pk=gravada[termo][0], termo=termo, documentos=frequencia[termo])
+            for termo in mudaram if frequencia[termo] > 0 and termo in gravada
+        ], ['documentos'], batch_size=batch_size)
+        TermoAcervo.objects.bulk_create((
+            TermoAcervo(termo=termo, documentos=frequencia[termo])
+            for termo in mudaram if frequencia[termo] > 0 and termo not in gravada
+        ), batch_size=batch_size)
+        for lote in _em_lotes(novas):
+            LivroSimilar.objects.filter(livro_id__in=lote).delete()
+
+    return len(alterados), novas, gravar
+
+
+def processar(completo=False, k=SIMILARES_POR_LIVRO, bloco=LIVROS_POR_BLOCO, batch_size=2000):
+    """
+    Recalcula os similares dos livros alterados desde o último processamento
+    (ou de todos, se `completo`). Retorna (livros processados, livros
+    com a lista regravada).
+    """
+    inicio = timezone.now()
+    ultimo = ProcessamentoSimilares.objects.order_by('-iniciado_em').first()
+    # Sem vetores gravados (processamentos anteriores a LivroTermo) não há como ser incremental
+    completo = completo or ultimo is None or not TermoAcervo.objects.exists()
+    if completo:
+        processados, novas, gravar = _completo(k, bloco, batch_size)
+    else:
+        processados, novas, gravar = _incremental(ultimo.iniciado_em, k, bloco, batch_size)
+
+    with transaction.atomic():
+        gravar()
+        linhas = (
+            LivroSimilar(livro_id=livro, similar_id=similar, posicao=posicao_lista, pontuacao=valor)
+            for livro, lista in novas.items()
+            for posicao_lista, (similar, valor) in enumerate(lista, 1)
+        )
+        LivroSimilar.objects.bulk_create(linhas, batch_size=batch_size)
+        ProcessamentoSimilares.objects.create(
+            iniciado_em=inicio, completo=completo, livros_processados=processados,
+        )
+    return processados, len(novas)
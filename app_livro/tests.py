@@ -1,3 +1,437 @@
-from django.test import TestCase
+import json
+import tempfile
+from collections import Counter
+from datetime import date
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app_categoria.models import Categoria
+from app_funcionario.models import Funcionario
+from app_leitor.models import Leitor
+from biblioteca.pagination import codificar_cursor, paginar
+from biblioteca.texto import normalizar
+
+from . import facetas, search, similares, trigramas
+from .consultas import ORDEM_APROXIMADA, filtrar_livros
+from .forms import LivroForm
+from .models import Livro, LivroSimilar, LivroTermo, LivroTrigrama, TermoAcervo, chave_duplicidade, normalizar_isbn
+
+
+class ChaveDuplicidadeTest(TestCase):
+    """Duplicatas antigas (chave nula desde a migração 0005) continuam editáveis"""
+
+    def setUp(self):
+        self.original = Livro.objects.create(titulo='Dom Casmurro', autor='Machado de Assis', ano=1899, genero='Romance')
+        self.duplicata = Livro.objects.create(titulo='Dom Casmurro (2)', autor='Machado de Assis', ano=1899, genero='Romance')
+        # Como a migração deixou as duplicatas já cadastradas
+        Livro.objects.filter(pk=self.duplicata.pk).update(titulo='Dom Casmurro', chave_duplicidade=None)
+
+    def test_duplicata_antiga_salva_sem_mudar_a_chave(self):
+        livro = Livro.objects.get(pk=self.duplicata.pk)
+        livro.editora = 'Garnier'
+        livro.save()
+        livro.disponivel = False
+        livro.save(update_fields=['disponivel'])
+        self.assertIsNone(Livro.objects.get(pk=self.duplicata.pk).chave_duplicidade)
+
+    def test_duplicata_antiga_renomeada_ganha_chave(self):
+        livro = Livro.objects.get(pk=self.duplicata.pk)
+        livro.titulo = 'Dom Casmurro - edição crítica'
+        livro.save()
+        self.assertEqual(
+            Livro.objects.get(pk=self.duplicata.pk).chave_duplicidade,
+            chave_duplicidade(livro.titulo, livro.autor, livro.ano),
+        )
+
+    def test_chave_recalculada_quando_titulo_muda(self):
+        livro = Livro.objects.get(pk=self.original.pk)
+        livro.ano = 1900
+        livro.save()
+        self.assertEqual(livro.chave_duplicidade, chave_duplicidade('Dom Casmurro', 'Machado de Assis', 1900))
+
+
+class ColunasNormalizadasTest(TestCase):
+    """Título, autor e nomes sem acentos e em minúsculas para busca e ordenação"""
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar('  José   SARAMAGO '), 'jose saramago')
+        self.assertEqual(normalizar('Ação e Reação'), 'acao e reacao')
+        self.assertEqual(normalizar(None), '')
+
+    def test_preenchidas_ao_salvar(self):
+        livro = Livro.objects.create(titulo='Ensaio sobre a Cegueira', autor='José Saramago', ano=1995, genero='Romance')
+        self.assertEqual((livro.titulo_normalizado, livro.autor_normalizado), ('ensaio sobre a cegueira', 'jose saramago'))
+        livro.autor = 'JOSÉ SARAMAGO'
+        livro.save(update_fields=['autor'])
+        self.assertEqual(Livro.objects.get(pk=livro.pk).autor_normalizado, 'jose saramago')
+
+    def test_busca_e_ordenacao_sem_acentos(self):
+        for titulo in ('Azul', 'Água Viva', 'abelha'):
+            Livro.objects.create(titulo=titulo, autor='Autor', ano=1970, genero='Romance')
+        livros, ordem = filtrar_livros({})
+        self.assertEqual([livro.titulo for livro in livros.order_by(*ordem)], ['abelha', 'Água Viva', 'Azul'])
+        self.assertEqual(list(Livro.objects.filter(titulo_normalizado__contains=normalizar('AGUA'))),
+                         list(Livro.objects.filter(titulo='Água Viva')))
+
+    def test_backfill_preenche_registros_antigos(self):
+        livro = Livro.objects.create(titulo='Memórias Póstumas', autor='Machado de Assis', ano=1881, genero='Romance')
+        funcionario = Funcionario.objects.create(username='ana', first_name='Ângela', last_name='Sá',
+                                                 cargo='Auxiliar', salario='2000.00', data_admissao=date(2020, 1, 1))
+        leitor = Leitor.objects.create(username='joao', first_name='João', last_name='Araújo', cpf='52998224725',
+                                       telefone='11999990000', endereco='Rua A', data_nascimento=date(1990, 1, 1))
+        # Como as linhas ficaram antes da migração que criou as colunas
+        Livro.objects.update(titulo_normalizado='', autor_normalizado='')
+        Funcionario.objects.update(nome_normalizado='')
+        Leitor.objects.update(nome_normalizado='')
+
+        call_command('backfill_normalized', batch_size=1, stdout=StringIO())
+        livro.refresh_from_db()
+        self.assertEqual((livro.titulo_normalizado, livro.autor_normalizado), ('memorias postumas', 'machado de assis'))
+        self.assertEqual(Funcionario.objects.get(pk=funcionario.pk).nome_normalizado, 'angela sa')
+        self.assertEqual(Leitor.objects.get(pk=leitor.pk).nome_normalizado, 'joao araujo')
+
+
+class AutocompleteTest(TestCase):
+    """Sugestões em JSON para o balcão: prefixo do título ou do ISBN, só livros disponíveis"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionario = Funcionario.objects.create_user(
+            'balcao', password='senha', cargo='Bibliotecário', salario='3000.00', data_admissao=date(2020, 1, 1),
+        )
+        cls.funcionario.groups.add(Group.objects.create(name='Funcionarios'))
+        cls.memorias = Livro.objects.create(titulo='Memórias Póstumas', autor='Machado de Assis', ano=1881,
+                                            genero='Romance', isbn='0306406152')
+        Livro.objects.create(titulo='Memorial de Aires', autor='Machado de Assis', ano=1908, genero='Romance',
+                             disponivel=False)
+        Livro.objects.create(titulo='As Memórias', autor='Outro', ano=1950, genero='Romance')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.funcionario)
+
+    def sugerir(self, termo):
+        resposta = self.client.get(reverse('app_livro:autocomplete'), {'q': termo})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()['resultados']
+
+    def test_prefixo_do_titulo_sem_acentos(self):
+        self.assertEqual(self.sugerir('MEMO'), [
+            {'id': self.memorias.pk, 'texto': 'Memórias Póstumas - Machado de Assis'},
+        ])
+
+    def test_prefixo_do_isbn(self):
+        self.assertEqual([item['id'] for item in self.sugerir('978-0306')], [self.memorias.pk])
+        self.assertEqual(self.sugerir('978-1'), [])
+
+    def test_termo_vazio(self):
+        self.assertEqual(self.sugerir('  '), [])
+
+    def test_exige_funcionario(self):
+        self.client.logout()
+        resposta = self.client.get(reverse('app_livro:autocomplete'), {'q': 'memo'})
+        self.assertEqual(resposta.status_code, 302)
+
+
+class BuscaTextualTest(TestCase):
+    """Busca pelo índice FTS5 ordenada por relevância, com volta à busca aproximada"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.poesia = Categoria.objects.create(nome='Poesia')
+        cls.sertoes = Livro.objects.create(titulo='Os Sertões', autor='Euclides da Cunha', ano=1902, genero='Ensaio')
+        cls.citado = Livro.objects.create(titulo='Estudos', autor='Sertões Sertanejos', ano=1950,
+                                          genero='Ensaio', editora='Sertões')
+        cls.poemas = Livro.objects.create(titulo='Lira', autor='Gonzaga', ano=1792, genero='Lírica',
+                                          categoria=cls.poesia)
+
+    def test_montar_consulta(self):
+        self.assertEqual(search.montar_consulta('dom  casmurro!'), '"dom"* "casmurro"*')
+        self.assertEqual(search.montar_consulta('dom', colunas=['titulo']), '{titulo} : ("dom"*)')
+        self.assertEqual(search.montar_consulta('?!'), '')
+
+    def test_ordena_por_relevancia_sem_acentos(self):
+        livros, ordem = filtrar_livros({'search': 'sertoes'})
+        self.assertEqual(ordem, ['relevancia'])
+        self.assertEqual(list(livros.order_by(*ordem, 'pk')), [self.citado, self.sertoes])
+
+    def test_prefixo_e_nome_da_categoria(self):
+        livros, _ = filtrar_livros({'search': 'poes'})
+        self.assertEqual(list(livros), [self.poemas])
+
+        self.poesia.nome = 'Versos'
+        self.poesia.save()
+        livros, _ = filtrar_livros({'search': 'versos'})
+        self.assertEqual(list(livros), [self.poemas])
+
+    def test_sem_resultado_usa_busca_aproximada(self):
+        livros, ordem = filtrar_livros({'search': 'os sertoez'})
+        self.assertEqual(ordem, ORDEM_APROXIMADA)
+        self.assertEqual(list(livros.order_by(*ordem))[0], self.sertoes)
+
+    def test_livro_removido_sai_do_indice(self):
+        self.sertoes.delete()
+        self.assertFalse(search.buscar_livros(Livro.objects.all(), 'euclides').exists())
+
+
+class BuscaAproximadaTest(TestCase):
+    """Os filtros da listagem valem antes do limite de candidatos da busca aproximada"""
+
+    def test_candidatos_restritos_ao_queryset(self):
+        for numero in range(3):
+            Livro.objects.create(titulo='Dom Casmuro', autor=f'Autor {numero}', ano=1900 + numero,
+                                 genero='Romance', disponivel=False)
+        disponivel = Livro.objects.create(titulo='Dom Casmurra', autor='Outro', ano=1950, genero='Romance')
+
+        with mock.patch.object(trigramas, 'LIMITE_CANDIDATOS', 2):
+            resultado = trigramas.buscar_aproximado(Livro.objects.filter(disponivel=True), 'dom casmuro')
+        self.assertEqual([livro.pk for livro in resultado], [disponivel.pk])
+
+
+class SimilaresTest(TestCase):
+    """A execução incremental revetoriza só os livros alterados e mantém o IDF gravado"""
+
+    def setUp(self):
+        self.livros = [
+            Livro.objects.create(titulo=titulo, autor=autor, ano=1900, genero=genero)
+            for titulo, autor, genero in [
+                ('Dom Casmurro', 'Machado de Assis', 'Romance'),
+                ('Memórias Póstumas de Brás Cubas', 'Machado de Assis', 'Romance'),
+                ('Quincas Borba', 'Machado de Assis', 'Romance'),
+                ('O Cortiço', 'Aluísio Azevedo', 'Romance'),
+                ('Os Sertões', 'Euclides da Cunha', 'Ensaio'),
+                ('Grande Sertão: Veredas', 'Guimarães Rosa', 'Romance'),
+            ]
+        ]
+        similares.processar(completo=True)
+
+    def similares_de(self, livro):
+        return list(LivroSimilar.objects.filter(livro=livro).order_by('posicao').values_list('similar_id', flat=True))
+
+    def test_incremental_revetoriza_so_os_alterados(self):
+        sertoes, cortico = self.livros[4], self.livros[3]
+        termos_antes = set(LivroTermo.objects.exclude(livro=cortico).values_list('pk', flat=True))
+        Livro.objects.filter(pk=cortico.pk).update(autor='Euclides da Cunha', genero='Ensaio', atualizado_em=timezone.now())
+
+        self.assertEqual(similares.processar()[0], 1)
+        self.assertEqual(set(LivroTermo.objects.exclude(livro=cortico).values_list('pk', flat=True)), termos_antes)
+        self.assertIn('a:euclides', LivroTermo.objects.filter(livro=cortico).values_list('termo', flat=True))
+        self.assertEqual(self.similares_de(cortico)[0], sertoes.pk)
+        self.assertEqual(self.similares_de(sertoes)[0], cortico.pk)
+        # A frequência gravada continua a dos vetores gravados
+        frequencia = Counter(LivroTermo.objects.values_list('termo', flat=True))
+        self.assertEqual(dict(TermoAcervo.objects.values_list('termo', 'documentos')), dict(frequencia))
+
+    def test_matrizes_esparsas_e_python_puro_concordam(self):
+        if similares.sparse is None:
+            self.skipTest('NumPy/SciPy não instalados')
+        vetores = [dict(LivroTermo.objects.filter(livro=livro).values_list('termo', 'peso')) for livro in self.livros]
+        limiar = [0.5] * len(vetores)
+
+        def calcular():
+            return {
+                i: sorted((j, round(valor, 9)) for j, valor in pares)
+                for i, pares in similares.similaridades(vetores, range(len(vetores)), 2, limiar, bloco=4)
+            }
+
+        esparso = calcular()
+        with mock.patch.object(similares, 'sparse', None):
+            self.assertEqual(calcular(), esparso)
+
+
+class PaginacaoKeysetTest(TestCase):
+    """Cursores com empates, de volta para trás e adulterados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Sete livros em três anos: empates atravessam as páginas
+        for numero in range(7):
+            Livro.objects.create(titulo=f'Livro {numero}', autor='Autor', ano=2000 + numero % 3, genero='Romance')
+        cls.ordem_esperada = list(Livro.objects.order_by('-ano', '-pk').values_list('pk', flat=True))
+
+    def pagina(self, url=''):
+        return paginar(RequestFactory().get(f'/livros/{url}'), Livro.objects.all(), ['-ano'], por_pagina=3)
+
+    def test_empates_nao_repetem_nem_pulam_livros(self):
+        vistos, pagina = [], self.pagina()
+        self.assertFalse(pagina.has_previous)
+        while True:
+            vistos.extend(livro.pk for livro in pagina)
+            if not pagina.has_next:
+                break
+            pagina = self.pagina(pagina.next_url)
+        self.assertEqual(vistos, self.ordem_esperada)
+
+    def test_voltar_devolve_a_pagina_anterior(self):
+        primeira = self.pagina()
+        segunda = self.pagina(primeira.next_url)
+        terceira = self.pagina(segunda.next_url)
+        self.assertEqual([livro.pk for livro in self.pagina(terceira.previous_url)], [livro.pk for livro in segunda])
+        voltando = self.pagina(segunda.previous_url)
+        self.assertEqual([livro.pk for livro in voltando], [livro.pk for livro in primeira])
+        self.assertFalse(voltando.has_previous)
+        self.assertTrue(voltando.has_next)
+
+    def test_cursor_adulterado_volta_a_primeira_pagina(self):
+        primeira = [livro.pk for livro in self.pagina()]
+        for cursor in ['lixo', codificar_cursor('n', ['abc', 'def']), codificar_cursor('n', [2000])]:
+            with self.subTest(cursor=cursor):
+                pagina = self.pagina(f'?cursor={cursor}')
+                self.assertEqual([livro.pk for livro in pagina], primeira)
+                self.assertFalse(pagina.has_previous)
+
+
+class FacetasTest(TestCase):
+    """Contagens por faceta, uma consulta agrupada por coluna, invalidadas depois do commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.romance = Categoria.objects.create(nome='Romance')
+        dados = [
+            ('Dom Casmurro', 1899, 'Romance', 'Garnier', True),
+            ('Quincas Borba', 1891, 'Romance', 'Garnier', False),
+            ('Os Sertões', 1902, 'Ensaio', '', True),
+        ]
+        for titulo, ano, genero, editora, disponivel in dados:
+            Livro.objects.create(titulo=titulo, autor='Autor', ano=ano, genero=genero, editora=editora,
+                                 disponivel=disponivel, categoria=cls.romance if genero == 'Romance' else None)
+
+    def setUp(self):
+        cache.clear()
+
+    def contar(self, params=None):
+        params = params or {}
+        livros, _ = filtrar_livros(params)
+        return facetas.contar_facetas(livros, params)
+
+    def test_contagens_por_faceta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            contagens = self.contar()
+        self.assertEqual(len(consultas), len(facetas.FACETAS))
+        self.assertEqual(contagens['categoria'], [(self.romance.pk, 'Romance', 2), (None, 'Sem categoria', 1)])
+        self.assertEqual(contagens['genero'], [('Romance', 'Romance', 2), ('Ensaio', 'Ensaio', 1)])
+        self.assertEqual(contagens['editora'], [('Garnier', 'Garnier', 2), ('', 'Não informado', 1)])
+        self.assertEqual(contagens['decada'], [(1890, '1890s', 2), (1900, '1900s', 1)])
+        self.assertEqual(contagens['disponivel'], [(True, 'Disponível', 2), (False, 'Emprestado', 1)])
+
+    def test_contagens_da_busca(self):
+        contagens = self.contar({'search': 'casmurro'})
+        self.assertEqual(contagens['genero'], [('Romance', 'Romance', 1)])
+        self.assertEqual(contagens['disponivel'], [(True, 'Disponível', 1)])
+
+    def test_cache_invalidado_so_depois_do_commit(self):
+        self.contar()
+        with CaptureQueriesContext(connection) as consultas:
+            self.contar()
+        self.assertEqual(len(consultas), 0)
+
+        versao = facetas.versao_catalogo()
+        with self.captureOnCommitCallbacks(execute=True):
+            Livro.objects.create(titulo='Grande Sertão', autor='Guimarães Rosa', ano=1956, genero='Romance')
+            # Antes do commit uma leitura concorrente ainda usa a versão antiga
+            self.assertEqual(facetas.versao_catalogo(), versao)
+        self.assertNotEqual(facetas.versao_catalogo(), versao)
+        self.assertEqual(self.contar()['genero'], [('Romance', 'Romance', 3), ('Ensaio', 'Ensaio', 1)])
+
+
+class IsbnCanonicoTest(TestCase):
+    """Todo ISBN gravado é o ISBN-13 canônico, pelo formulário ou pelo ORM"""
+
+    def test_normalizar_isbn(self):
+        self.assertEqual(normalizar_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalizar_isbn('978 0 306 40615 7'), '9780306406157')
+        self.assertEqual(normalizar_isbn('080442957X'), '9780804429573')
+        for invalido in ('0-306-40615-3', '9780306406158', '12345', '97803064061ab'):
+            with self.subTest(isbn=invalido), self.assertRaises(ValidationError):
+                normalizar_isbn(invalido)
+
+    def test_orm_grava_a_forma_canonica(self):
+        livro = Livro.objects.create(titulo='Livro', autor='Autor', ano=2000, genero='Romance', isbn='0-306-40615-2')
+        self.assertEqual(Livro.objects.get(pk=livro.pk).isbn, '9780306406157')
+        self.assertEqual(Livro.buscar_por_isbn('978-0-306-40615-7'), livro)
+        # A mesma obra em outra grafia esbarra no índice único
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Livro.objects.create(titulo='Outro', autor='Autor', ano=2001, genero='Romance', isbn='0306406152')
+
+    def test_full_clean_valida_a_forma_canonica(self):
+        Livro.objects.create(titulo='Livro', autor='Autor', ano=2000, genero='Romance', isbn='9780306406157')
+        livro = Livro(titulo='Outro', autor='Autor', ano=2001, genero='Romance', isbn='0-306-40615-2')
+        with self.assertRaises(ValidationError):
+            livro.full_clean()
+        livro = Livro(titulo='Outro', autor='Autor', ano=2001, genero='Romance', isbn='0-306-40615-3')
+        with self.assertRaises(ValidationError) as erro:
+            livro.full_clean()
+        self.assertIn('isbn', erro.exception.message_dict)
+
+    def test_formulario(self):
+        dados = {'titulo': 'Livro', 'autor': 'Autor', 'ano': 2000, 'genero': 'Romance', 'disponivel': True}
+        form = LivroForm(data={**dados, 'isbn': '0-306-40615-2'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().isbn, '9780306406157')
+        form = LivroForm(data={**dados, 'titulo': 'Outro', 'isbn': '978-0-306-40615-7'})
+        self.assertIn('isbn', form.errors)
+        form = LivroForm(data={**dados, 'titulo': 'Outro', 'isbn': '0-306-40615-3'})
+        self.assertIn('isbn', form.errors)
+
+
+class ImportacaoCatalogoTest(TestCase):
+    """import_catalog aplica as regras do LivroForm, deduplica e indexa só o que gravou"""
+
+    CABECALHO = 'titulo,autor,ano,genero,categoria,isbn,editora\n'
+
+    def importar(self, linhas, **opcoes):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        arquivo = Path(pasta.name) / 'livros.csv'
+        arquivo.write_text(self.CABECALHO + ''.join(f'{linha}\n' for linha in linhas), encoding='utf-8')
+        rejeitados = Path(pasta.name) / 'rejeitados.jsonl'
+        call_command('import_catalog', str(arquivo), rejeitados=str(rejeitados), stdout=StringIO(), **opcoes)
+        return [json.loads(linha) for linha in rejeitados.read_text(encoding='utf-8').splitlines()]
+
+    def test_deduplica_e_rejeita_linhas_invalidas(self):
+        Categoria.objects.create(nome='Romance')
+        Livro.objects.create(titulo='Dom Casmurro', autor='Machado de Assis', ano=1899, genero='Romance')
+        rejeitados = self.importar([
+            'Quincas Borba,Machado de Assis,1891,Romance,romance,0-306-40615-2,Garnier',
+            'Dom  CASMURRO,Machado de Assis,1899,Romance,,,',
+            'Outro,Autor,1950,Ensaio,,9780306406157,',
+            'Quincas Borba,Machado de Assis,1891,Romance,,,',
+            f'{"Longo " * 40},Autor,1950,Ensaio,,,',
+            'Sem ano,Autor,,Ensaio,,,',
+            'Futuro,Autor,3000,Ensaio,,,',
+            'Sem categoria,Autor,1950,Ensaio,Inexistente,,',
+        ], batch_size=2)
+        self.assertEqual([rejeitado['linha'] for rejeitado in rejeitados], [3, 4, 5, 6, 7, 8, 9])
+        self.assertIn('Campo titulo com mais de 200 caracteres (239)', rejeitados[3]['erros'])
+        self.assertEqual(Livro.objects.count(), 2)
+        livro = Livro.objects.get(titulo='Quincas Borba')
+        self.assertEqual((livro.isbn, livro.categoria.nome, livro.editora), ('9780306406157', 'Romance', 'Garnier'))
+        self.assertEqual(livro.chave_duplicidade, chave_duplicidade('Quincas Borba', 'Machado de Assis', 1891))
+
+    def test_indexa_exatamente_os_livros_gravados(self):
+        with mock.patch.object(search, 'indexar_ids', wraps=search.indexar_ids) as indexar:
+            self.importar([f'Livro {numero},Autor {numero},2000,Romance,,,' for numero in range(5)], batch_size=2)
+        importados = list(Livro.objects.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(len(indexar.call_args_list), 3)
+        self.assertEqual(sorted(pk for chamada in indexar.call_args_list for pk in chamada.args[0]), importados)
+        self.assertEqual(
+            set(LivroTrigrama.objects.values_list('livro_id', flat=True)), set(importados),
+        )
+        if search.fts_disponivel():
+            self.assertEqual(list(search.buscar_livros(Livro.objects.all(), 'autor 3').values_list('titulo', flat=True)),
+                             ['Livro 3'])
+
+    def test_dry_run_nao_grava(self):
+        self.importar(['Livro,Autor,2000,Romance,,,'], dry_run=True)
+        self.assertFalse(Livro.objects.exists())
@@ -0,0 +1,136 @@
+"""
+Busca aproximada por trigramas, tolerante a erros de digitação
+("dom casmuro" encontra "Dom Casmurro").
+
+O índice fica na tabela LivroTrigrama, mantida a cada gravação de livro
+(signals.py) e na importação em massa. A busca gera candidatos pelo índice
+(livros com mais trigramas em comum com o termo) e só então calcula a
+similaridade de cada candidato para ordenar o resultado.
+"""
+import math
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, FloatField, Value, When
+
+from biblioteca.texto import normalizar, similaridade_trigramas, trigramas
+from .models import Livro, LivroTrigrama
+
+# Similaridade mínima para um livro aparecer no resultado (a mesma do pg_trgm)
+LIMIAR = 0.3
+LIMITE_CANDIDATOS = 200
+
+
+def trigramas_do_livro(titulo, autor):
+    return trigramas(titulo) | trigramas(autor)
+
+
+def melhor_similaridade(consulta, palavras, texto):
+    """
+    Maior similaridade entre os trigramas da consulta e o texto inteiro ou
+    qualquer trecho dele com o mesmo número de palavras da consulta, para
+    que títulos longos não diluam a pontuação (como o word_similarity do
+    pg_trgm).
+    """
+    melhor = similaridade_trigramas(consulta, trigramas(texto))
+    termos = texto.split()
+    tamanho = min(palavras, len(termos))
+    for inicio in range(len(termos) - tamanho + 1):
+        trecho = trigramas(' '.join(termos[inicio:inicio + tamanho]))
+        melhor = max(melhor, similaridade_trigramas(consulta, trecho))
+    return melhor
+
+
+def _inserir(pares):
+    """Insere (livro_id, trigrama) com um INSERT preparado (importação e reconstrução)"""
+    if not pares:
+        return
+    tabela = LivroTrigrama._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {tabela} (livro_id, trigrama) VALUES (%s, %s)', pares)
+
+
+def indexar_livro(livro):
+    """Atualiza os trigramas do livro, gravando só o que mudou"""
+    novos = trigramas_do_livro(livro.titulo_normalizado, livro.autor_normalizado)
+    atuais = set(LivroTrigrama.objects.filter(livro=livro).values_list('trigrama', flat=True))
+    if novos == atuais:
+        return
+    with transaction.atomic():
+        removidos = atuais - novos
+        if removidos:
+            LivroTrigrama.objects.filter(livro=livro, trigrama__in=removidos).delete()
+        LivroTrigrama.objects.bulk_create(
+            LivroTrigrama(livro=livro, trigrama=trigrama) for trigrama in novos - atuais
+        )
+
+
+def _indexar(livros, batch_size):
+    total = 0
+    pares = []
+    for pk, titulo, autor in livros.values_list('pk', 'titulo_normalizado', 'autor_normalizado').iterator(chunk_size=batch_size):
+        pares.extend((pk, trigrama) for trigrama in trigramas_do_livro(titulo, autor))
+        total += 1
+        if len(pares) >= batch_size * 20:
+            _inserir(pares)
+            pares = []
+    _inserir(pares)
+    return total
+
+
+def indexar_ids(ids, batch_size=2000, lote=500):
+    """Indexa de uma vez os livros informados (importação em massa)"""
+    total = 0
+    for inicio in range(0, len(ids), lote):
+        total += _indexar(Livro.objects.filter(pk__in=ids[inicio:inicio + lote]).order_by('pk'), batch_size)
+    return total
+
+
+def reconstruir_indice(batch_size=2000):
+    """Recria o índice de trigramas a partir da tabela de livros"""
+    with transaction.atomic():
+        LivroTrigrama.objects.all().delete()
+        return _indexar(Livro.objects.order_by('pk'), batch_size)
+
+
+def buscar_aproximado(queryset, termo):
+    """
+    Filtra o queryset de livros pelos títulos e autores parecidos com o termo
+    e anota a similaridade (0 a 1) em `similaridade`.
+    """
+    # Anotação também no resultado vazio, para a ordenação por similaridade
+    vazio = queryset.annotate(similaridade=Value(0.0, output_field=FloatField())).none()
+    consulta = trigramas(termo)
+    if not consulta:
+        return vazio
+
+    # Candidatos pelo índice, já restritos aos livros do queryset (filtros de
+    # disponibilidade e facetas) antes do limite: um livro precisa ter pelo
+    # menos LIMIAR dos trigramas do termo para atingir a similaridade mínima
+    minimo = max(1, math.ceil(len(consulta) * LIMIAR))
+    candidatos = (LivroTrigrama.objects
+                  .filter(trigrama__in=consulta, livro__in=queryset.order_by().values('pk'))
+                  .values('livro_id')
+                  .annotate(comuns=Count('id'))
+                  .filter(comuns__gte=minimo)
+                  .order_by('-comuns', 'livro_id')
+                  .values_list('livro_id', flat=True)[:LIMITE_CANDIDATOS])
+
+    palavras = len(normalizar(termo).split())
+    pontuacoes = {}
+    for pk, titulo, autor in Livro.objects.filter(pk__in=list(candidatos)).values_list(
+        'pk', 'titulo_normalizado', 'autor_normalizado',
+    ):
+        similaridade = max(
+            melhor_similaridade(consulta, palavras, titulo),
+            melhor_similaridade(consulta, palavras, autor),
+            melhor_similaridade(consulta, palavras, f'{titulo} {autor}'),
+        )
+        if similaridade >= LIMIAR:
+            pontuacoes[pk] = similaridade
+
+    if not pontuacoes:
+        return vazio
+    return queryset.filter(pk__in=pontuacoes).annotate(similaridade=Case(
+        *(When(pk=pk, then=Value(valor)) for pk, valor in pontuacoes.items()),
+        output_field=FloatField(),
+    ))
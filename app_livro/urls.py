@@ -6,6 +6,9 @@ app_name = 'app_livro'
 urlpatterns = [
     path('', views.livro_list, name='listar'),
     path('criar/', views.livro_create, name='criar'),
+    path('exportar/', views.livro_export, name='exportar'),
+    path('autocomplete/', views.livro_autocomplete, name='autocomplete'),
+    path('<int:pk>/', views.livro_detail, name='detalhe'),
     path('<int:pk>/editar/', views.livro_update, name='editar'),
     path('<int:pk>/deletar/', views.livro_delete, name='deletar'),
 ]
\ No newline at end of file
@@ -1,48 +1,73 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from .models import Livro
 from .forms import LivroForm
+from .consultas import COLUNAS_EXPORTACAO, ORDEM_APROXIMADA, filtrar_livros, similares_a, sugerir_livros
+from .facetas import FACETAS, contar_facetas, montar_links
 from app_categoria.models import Categoria
+from app_emprestimo.consultas import recomendados_para_livro
+from biblioteca.exportacao import resposta_exportacao
+from biblioteca.pagination import paginar
 from biblioteca.decorators import funcionario_or_leitor_required, funcionario_required
+from biblioteca.papeis import FUNCIONARIOS
 
 @login_required
 @funcionario_or_leitor_required
 def livro_list(request):
     search = request.GET.get('search', '')
-    categoria_id = request.GET.get('categoria', '')
-    
-    livros = Livro.objects.all()
     
     # Se não for funcionário, mostrar apenas livros disponíveis
-    if not request.user.groups.filter(name='Funcionarios').exists():
-        livros = livros.filter(disponivel=True)
-    
-    if search:
-        livros = livros.filter(titulo__icontains=search) | livros.filter(autor__icontains=search)
-    
-    if categoria_id:
-        livros = livros.filter(categoria_id=categoria_id)
-    
-    livros = livros.order_by('titulo')
-    categorias = Categoria.objects.all().order_by('nome')
+    apenas_disponiveis = FUNCIONARIOS not in request.papeis
+    livros, ordem = filtrar_livros(request.GET, apenas_disponiveis=apenas_disponiveis)
+    pagina = paginar(request, livros.select_related('categoria'), ordem)
+    facetas = contar_facetas(livros, request.GET, apenas_disponiveis)
+    filtros_ativos = {nome: request.GET[nome] for nome, _ in FACETAS if request.GET.get(nome)}
     
     context = {
-        'livros': livros,
-        'categorias': categorias,
+        'livros': pagina.object_list,
+        'pagina': pagina,
+        'facetas': montar_links(request, facetas),
+        'filtros_ativos': filtros_ativos,
         'search': search,
-        'categoria_selecionada': categoria_id
+        'aproximado': ordem == ORDEM_APROXIMADA,
     }
     return render(request, 'app_livro/list.html', context)
 
+@login_required
+@funcionario_or_leitor_required
+def livro_detail(request, pk):
+    livro = get_object_or_404(Livro.objects.select_related('categoria'), pk=pk)
+    context = {
+        'livro': livro,
+        'recomendacoes': recomendados_para_livro(livro),
+        'similares': similares_a(livro),
+    }
+    return render(request, 'app_livro/detail.html', context)
+
+def _salvar(form):
+    """
+    Salva o livro. Se outro cadastro simultâneo gravar o mesmo ISBN ou
+    título/autor/ano entre a validação e o save, o índice único do banco
+    rejeita e o erro volta para o formulário.
+    """
+    try:
+        with transaction.atomic():
+            form.save()
+    except IntegrityError:
+        form.add_error(None, 'Já existe um livro cadastrado com este ISBN ou com este título, autor e ano')
+        return False
+    return True
+
 @login_required
 @funcionario_required
 def livro_create(request):
     if request.method == 'POST':
         form = LivroForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and _salvar(form):
             messages.success(request, 'Livro criado com sucesso!')
             return redirect('app_livro:listar')
     else:
@@ -58,8 +83,7 @@ def livro_update(request, pk):
     
     if request.method == 'POST':
         form = LivroForm(request.POST, instance=livro)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and _salvar(form):
             messages.success(request, 'Livro atualizado com sucesso!')
             return redirect('app_livro:listar')
     else:
@@ -77,3 +101,18 @@ def livro_delete(request, pk):
         messages.success(request, 'Livro excluído com sucesso!')
         return redirect('app_livro:listar')
     return render(request, 'app_livro/confirm_delete.html', {'object': livro})
+
+@login_required
+@funcionario_required
+def livro_export(request):
+    livros, ordem = filtrar_livros(request.GET)
+    return resposta_exportacao(request, 'livros', livros.order_by(*ordem, 'pk'), COLUNAS_EXPORTACAO)
+
+@login_required
+@funcionario_required
+def livro_autocomplete(request):
+    """Sugestões de livros disponíveis por prefixo do título ou do ISBN"""
+    livros = sugerir_livros(request.GET.get('q', ''))
+    return JsonResponse({
+        'resultados': [{'id': pk, 'texto': f'{titulo} - {autor}'} for pk, titulo, autor in livros]
+    })
@@ -0,0 +1,31 @@
+"""
+Sinais que descartam os papéis guardados em cache (biblioteca.papeis)
+quando a participação em grupos muda
+"""
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from biblioteca import papeis
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_papeis(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add/remove/clear
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            papeis.invalidar([instance.pk])
+    elif action == 'pre_clear':
+        # group.user_set.clear(): os membros ainda estão lá
+        papeis.invalidar(instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        papeis.invalidar(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidar_papeis_do_grupo(sender, instance, raw=False, created=False, **kwargs):
+    # Grupo renomeado ou excluído muda os papéis de todos os membros
+    if raw or created:
+        return
+    papeis.invalidar(instance.user_set.values_list('pk', flat=True))
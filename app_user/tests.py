@@ -1,3 +1,45 @@
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from biblioteca import papeis
+
+TABELA_GRUPOS = User.groups.through._meta.db_table
+
+
+class PapeisDoUsuarioTest(TestCase):
+    """Os grupos do usuário são consultados no máximo uma vez e descartados quando mudam"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.funcionarios = Group.objects.create(name=papeis.FUNCIONARIOS)
+        cls.leitores = Group.objects.create(name=papeis.LEITORES)
+        cls.usuario = User.objects.create_user('balcao', password='senha')
+        cls.usuario.groups.add(cls.funcionarios)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def consultas_de_grupos(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return [consulta['sql'] for consulta in consultas.captured_queries if TABELA_GRUPOS in consulta['sql']]
+
+    def test_grupos_consultados_uma_vez(self):
+        self.assertEqual(len(self.consultas_de_grupos(reverse('app_livro:listar'))), 1)
+        self.assertEqual(self.consultas_de_grupos(reverse('app_livro:listar')), [])
+
+    def test_mudanca_de_grupo_invalida(self):
+        self.assertEqual(papeis.papeis_do_usuario(User.objects.get(pk=self.usuario.pk)), {papeis.FUNCIONARIOS})
+        self.leitores.user_set.add(self.usuario)
+        self.assertEqual(
+            papeis.papeis_do_usuario(User.objects.get(pk=self.usuario.pk)),
+            {papeis.FUNCIONARIOS, papeis.LEITORES},
+        )
+        self.usuario.groups.clear()
+        self.assertEqual(papeis.papeis_do_usuario(User.objects.get(pk=self.usuario.pk)), set())
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Os contadores ao vivo do painel (app_dashboard.views.eventos) são uma view
+assíncrona de server-sent events: em produção, sirva o projeto por aqui
+(ex.: uvicorn biblioteca.asgi:application) para que cada aba aberta seja
+só uma tarefa no laço de eventos, e não um worker WSGI preso.
 """
 
 import os
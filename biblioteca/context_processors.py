@@ -1,6 +1,7 @@
 """
 Context processors para disponibilizar informações globais nos templates
 """
+from .papeis import FUNCIONARIOS, LEITORES, papeis_do_usuario
 
 def user_groups(request):
     """
@@ -12,11 +13,11 @@ def user_groups(request):
     }
     
     if request.user.is_authenticated:
-        user_groups = request.user.groups.values_list('name', flat=True)
+        user_groups = papeis_do_usuario(request.user)
         context.update({
-            'user_is_funcionario': 'Funcionarios' in user_groups,
-            'user_is_leitor': 'Leitores' in user_groups,
-            'user_groups': list(user_groups),
+            'user_is_funcionario': FUNCIONARIOS in user_groups,
+            'user_is_leitor': LEITORES in user_groups,
+            'user_groups': sorted(user_groups),
         })
     
     return context
\ No newline at end of file
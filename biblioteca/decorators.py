@@ -1,5 +1,8 @@
 """
 Decorators para controle de acesso baseado em grupos
+
+Os grupos do usuário vêm de biblioteca.papeis (resolvidos uma vez por
+requisição, com cache curto por usuário).
 """
 
 from django.contrib.auth.decorators import user_passes_test
@@ -7,14 +10,14 @@ from django.contrib.auth.mixins import UserPassesTestMixin
 from django.core.exceptions import PermissionDenied
 from functools import wraps
 
+from .papeis import FUNCIONARIOS, LEITORES, papeis_do_usuario
+
 def funcionario_required(view_func):
     """
     Decorator que permite acesso apenas para usuários do grupo 'Funcionarios'
     """
     def check_funcionario(user):
-        if not user.is_authenticated:
-            return False
-        return user.groups.filter(name='Funcionarios').exists()
+        return FUNCIONARIOS in papeis_do_usuario(user)
     
     return user_passes_test(check_funcionario)(view_func)
 
@@ -23,9 +26,7 @@ def leitor_required(view_func):
     Decorator que permite acesso apenas para usuários do grupo 'Leitores'
     """
     def check_leitor(user):
-        if not user.is_authenticated:
-            return False
-        return user.groups.filter(name='Leitores').exists()
+        return LEITORES in papeis_do_usuario(user)
     
     return user_passes_test(check_leitor)(view_func)
 
@@ -34,9 +35,7 @@ def funcionario_or_leitor_required(view_func):
     Decorator que permite acesso para usuários dos grupos 'Funcionarios' ou 'Leitores'
     """
     def check_funcionario_or_leitor(user):
-        if not user.is_authenticated:
-            return False
-        return user.groups.filter(name__in=['Funcionarios', 'Leitores']).exists()
+        return not papeis_do_usuario(user).isdisjoint({FUNCIONARIOS, LEITORES})
     
     return user_passes_test(check_funcionario_or_leitor)(view_func)
 
@@ -45,21 +44,18 @@ class FuncionarioRequiredMixin(UserPassesTestMixin):
     Mixin para Class-Based Views que requer usuário do grupo 'Funcionarios'
     """
     def test_func(self):
-        return self.request.user.is_authenticated and \
-               self.request.user.groups.filter(name='Funcionarios').exists()
+        return FUNCIONARIOS in papeis_do_usuario(self.request.user)
 
 class LeitorRequiredMixin(UserPassesTestMixin):
     """
     Mixin para Class-Based Views que requer usuário do grupo 'Leitores'
     """
     def test_func(self):
-        return self.request.user.is_authenticated and \
-               self.request.user.groups.filter(name='Leitores').exists()
+        return LEITORES in papeis_do_usuario(self.request.user)
 
 class FuncionarioOrLeitorRequiredMixin(UserPassesTestMixin):
     """
     Mixin para Class-Based Views que requer usuário dos grupos 'Funcionarios' ou 'Leitores'
     """
     def test_func(self):
-        return self.request.user.is_authenticated and \
-               self.request.user.groups.filter(name__in=['Funcionarios', 'Leitores']).exists()
\ No newline at end of file
+        return not papeis_do_usuario(self.request.user).isdisjoint({FUNCIONARIOS, LEITORES})
\ No newline at end of file
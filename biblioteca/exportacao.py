@@ -0,0 +1,77 @@
+"""
+Exportação em streaming (CSV/JSONL) das tabelas da biblioteca
+
+As linhas são lidas com iterator(chunk_size=...) e escritas conforme
+são geradas, então o consumo de memória não depende do tamanho da tabela.
+"""
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+LINHAS_POR_BLOCO = 500
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Eco:
+    """Pseudo-arquivo que devolve o texto escrito, para usar com csv.writer"""
+
+    def write(self, valor):
+        return valor
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    return valor
+
+
+def gerar_csv(cabecalho, linhas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(cabecalho)
+    for linha in linhas:
+        yield escritor.writerow([_texto(valor) for valor in linha])
+
+
+def gerar_jsonl(cabecalho, linhas):
+    for linha in linhas:
+        yield json.dumps(dict(zip(cabecalho, linha)), ensure_ascii=False, default=str) + '\n'
+
+
+def gerar(formato, cabecalho, linhas):
+    """Gera o conteúdo em blocos de várias linhas para reduzir o número de escritas"""
+    gerador = gerar_jsonl if formato == 'jsonl' else gerar_csv
+    bloco = []
+    for texto in gerador(cabecalho, linhas):
+        bloco.append(texto)
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def linhas(queryset, colunas, chunk_size=CHUNK_SIZE):
+    """Itera as colunas (campos ou anotações) do queryset sem carregar tudo na memória"""
+    return queryset.values_list(*[campo for _, campo in colunas]).iterator(chunk_size=chunk_size)
+
+
+def resposta_exportacao(request, nome, queryset, colunas):
+    """StreamingHttpResponse com o queryset no formato pedido em ?formato= (csv ou jsonl)"""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        formato = 'csv'
+    cabecalho = [titulo for titulo, _ in colunas]
+    resposta = StreamingHttpResponse(
+        gerar(formato, cabecalho, linhas(queryset, colunas)),
+        content_type=FORMATOS[formato],
+    )
+    arquivo = f'{nome}_{timezone.now():%Y%m%d_%H%M}.{formato}'
+    resposta['Content-Disposition'] = f'attachment; filename="{arquivo}"'
+    return resposta
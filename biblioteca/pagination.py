@@ -0,0 +1,126 @@
+"""
+Paginação por cursor (keyset) para as listagens
+
+Em vez de OFFSET/LIMIT, cada página é buscada a partir dos valores de
+ordenação do último registro exibido, com o id como desempate. Assim
+qualquer página custa o mesmo que a primeira.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+POR_PAGINA = 25
+
+
+def _serializar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f'Valor não serializável no cursor: {valor!r}')
+
+
+def codificar_cursor(direcao, valores):
+    dados = json.dumps({'d': direcao, 'v': valores}, default=_serializar, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        dados = json.loads(dados)
+        return dados['d'], list(dados['v'])
+    except (ValueError, TypeError, KeyError):
+        return None, None
+
+
+class PaginaKeyset:
+    """Página de resultados com links para a página anterior e a próxima"""
+
+    def __init__(self, request, object_list, has_next, has_previous, cursor_proximo, cursor_anterior):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_url = self._url(request, cursor_proximo) if has_next else None
+        self.previous_url = self._url(request, cursor_anterior) if has_previous else None
+
+    @staticmethod
+    def _url(request, cursor):
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        return f'?{params.urlencode()}'
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _campo(queryset, nome):
+    if nome in queryset.query.annotations:
+        return queryset.query.annotations[nome].output_field
+    if nome == 'pk':
+        return queryset.model._meta.pk
+    return queryset.model._meta.get_field(nome)
+
+
+def _filtro_apos(chaves, valores, reverso):
+    """
+    Monta a condição lexicográfica (k1, k2, ...) > (v1, v2, ...)
+    respeitando a direção de cada chave.
+    """
+    filtro = Q()
+    for i, (nome, descendente) in enumerate(chaves):
+        crescente = descendente == reverso
+        condicao = Q(**{f'{nome}__{"gt" if crescente else "lt"}': valores[i]})
+        for j in range(i):
+            condicao &= Q(**{chaves[j][0]: valores[j]})
+        filtro |= condicao
+    return filtro
+
+
+def paginar(request, queryset, ordem, por_pagina=POR_PAGINA):
+    """
+    Pagina o queryset pela ordenação informada (ex.: ['-data_emprestimo']),
+    acrescentando o id como desempate estável.
+    """
+    chaves = [(campo.lstrip('-'), campo.startswith('-')) for campo in ordem]
+    if chaves[-1][0] not in ('pk', 'id'):
+        chaves.append(('pk', chaves[-1][1]))
+
+    direcao, valores = decodificar_cursor(request.GET.get('cursor', ''))
+    if valores is not None and len(valores) == len(chaves):
+        try:
+            valores = [_campo(queryset, nome).to_python(valor) for (nome, _), valor in zip(chaves, valores)]
+        except (ValidationError, ValueError, TypeError):
+            # Cursor adulterado ou de outra ordenação: volta à primeira página
+            direcao, valores = None, None
+    else:
+        direcao, valores = None, None
+
+    reverso = direcao == 'p'
+    ordenacao = [('-' if descendente != reverso else '') + nome for nome, descendente in chaves]
+    if valores is not None:
+        queryset = queryset.filter(_filtro_apos(chaves, valores, reverso))
+    registros = list(queryset.order_by(*ordenacao)[:por_pagina + 1])
+
+    tem_mais = len(registros) > por_pagina
+    registros = registros[:por_pagina]
+    if reverso:
+        registros.reverse()
+        has_next, has_previous = True, tem_mais
+    else:
+        has_next, has_previous = tem_mais, valores is not None
+
+    def valores_de(obj):
+        return [getattr(obj, nome) for nome, _ in chaves]
+
+    cursor_proximo = codificar_cursor('n', valores_de(registros[-1])) if registros else None
+    cursor_anterior = codificar_cursor('p', valores_de(registros[0])) if registros else None
+    return PaginaKeyset(request, registros, has_next and bool(registros), has_previous and bool(registros),
+                        cursor_proximo, cursor_anterior)
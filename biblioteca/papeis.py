@@ -0,0 +1,62 @@
+"""
+Papéis (grupos) do usuário resolvidos uma vez por requisição
+
+Os decorators, mixins, views e o context processor perguntavam ao banco
+pelos grupos do usuário várias vezes na mesma requisição. Agora todos leem
+papeis_do_usuario: o conjunto de nomes de grupo fica guardado no próprio
+objeto do usuário (que vive só durante a requisição) e num cache curto por
+usuário, apagado pelos sinais de app_user quando a participação em grupos
+muda. PapeisMiddleware expõe o conjunto como request.papeis.
+"""
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+FUNCIONARIOS = 'Funcionarios'
+LEITORES = 'Leitores'
+
+TEMPO_CACHE = 5 * 60
+
+# Atributo do objeto do usuário com os papéis já resolvidos na requisição
+ATRIBUTO = '_papeis'
+
+
+def _chave(user_id):
+    return f'papeis:{user_id}'
+
+
+def papeis_do_usuario(user):
+    """Nomes dos grupos do usuário (conjunto vazio para anônimos)"""
+    if not user.is_authenticated:
+        return frozenset()
+    papeis = getattr(user, ATRIBUTO, None)
+    if papeis is None:
+        papeis = cache.get(_chave(user.pk))
+        if papeis is None:
+            papeis = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(_chave(user.pk), papeis, TEMPO_CACHE)
+        setattr(user, ATRIBUTO, papeis)
+    return papeis
+
+
+def e_funcionario(user):
+    return FUNCIONARIOS in papeis_do_usuario(user)
+
+
+def e_leitor(user):
+    return LEITORES in papeis_do_usuario(user)
+
+
+def invalidar(user_ids):
+    """Descarta os papéis guardados dos usuários informados"""
+    cache.delete_many([_chave(user_id) for user_id in user_ids])
+
+
+class PapeisMiddleware:
+    """Disponibiliza request.papeis, resolvido na primeira leitura"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.papeis = SimpleLazyObject(lambda: papeis_do_usuario(request.user))
+        return self.get_response(request)
@@ -54,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'biblioteca.papeis.PapeisMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -142,4 +143,18 @@ LOGIN_REDIRECT_URL = 'app_dashboard:home'
 LOGOUT_REDIRECT_URL = 'app_user:login'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Cache (contagens de facetas do acervo e outros dados derivados)
+# Com vários processos em produção, use um backend compartilhado
+# (Redis/Memcached) para que a invalidação alcance todos eles.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'biblioteca',
+    }
+}
+
+# Multa por dia de atraso na devolução, em reais (string para manter o
+# valor decimal exato)
+MULTA_DIARIA = '2.00'
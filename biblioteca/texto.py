@@ -0,0 +1,48 @@
+"""
+Utilitários de texto compartilhados entre os apps
+"""
+import unicodedata
+
+from django.db.models import Q
+
+
+def normalizar(texto):
+    """
+    Remove acentos e converte para minúsculas ("José Saramago" -> "jose saramago").
+    Usado nas colunas normalizadas de busca e ordenação.
+    """
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def filtro_prefixo(campo, prefixo):
+    """
+    Filtro "começa com" escrito como intervalo (campo >= prefixo AND
+    campo < prefixo + U+FFFF), que o banco resolve pelo índice do campo.
+    O LIKE 'x%' do SQLite não usa índice por ser case-insensitive.
+    """
+    return Q(**{f'{campo}__gte': prefixo, f'{campo}__lt': prefixo + '\uffff'})
+
+
+def trigramas(texto):
+    """
+    Conjunto de trigramas das palavras do texto normalizado, com dois
+    espaços antes e um depois de cada palavra ("casa" -> "  c", " ca",
+    "cas", "asa", "sa "), como no pg_trgm do PostgreSQL.
+    """
+    resultado = set()
+    for palavra in normalizar(texto).split():
+        palavra = f'  {palavra} '
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+def similaridade_trigramas(a, b):
+    """Proporção de trigramas em comum entre dois conjuntos (0 a 1)"""
+    if not a or not b:
+        return 0.0
+    comuns = len(a & b)
+    return comuns / (len(a) + len(b) - comuns)
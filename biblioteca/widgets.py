@@ -0,0 +1,31 @@
+"""
+Widgets compartilhados entre os formulários
+"""
+from django import forms
+from django.core.exceptions import ValidationError
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select que renderiza apenas a opção selecionada. As demais opções são
+    buscadas sob demanda no endpoint JSON informado em data-autocomplete-url,
+    então a página não depende do tamanho do queryset do campo.
+    """
+
+    def __init__(self, url, attrs=None):
+        attrs = dict(attrs or {})
+        attrs['data-autocomplete-url'] = url
+        super().__init__(attrs=attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        selecionados = [v for v in value if v not in ('', None)]
+        opcoes = [self.create_option(name, '', self.choices.field.empty_label or '', not selecionados, 0)]
+        if selecionados:
+            field = self.choices.field
+            try:
+                objetos = list(field.queryset.filter(pk__in=selecionados))
+            except (ValueError, TypeError, ValidationError):
+                objetos = []
+            for indice, obj in enumerate(objetos, start=1):
+                opcoes.append(self.create_option(name, obj.pk, field.label_from_instance(obj), True, indice))
+        return [(None, opcoes, 0)]
@@ -158,7 +158,7 @@ def create_test_data():
         {"titulo": "História do Brasil", "autor": "Boris Fausto", "ano": 2006, "genero": "História", "categoria": historia, "isbn": "9788531410260", "editora": "Edusp"},
         {"titulo": "O Pequeno Príncipe", "autor": "Antoine de Saint-Exupéry", "ano": 1943, "genero": "Infantil", "categoria": infantil, "isbn": "9788525412348", "editora": "Globo"},
         {"titulo": "Django for Beginners", "autor": "William Vincent", "ano": 2022, "genero": "Programação", "categoria": tecnico, "isbn": "9781735467207", "editora": "Django Books"},
-        {"titulo": "Capitães da Areia", "autor": "Jorge Amado", "ano": 1937, "genero": "Romance", "categoria": romance, "isbn": "9788535909818", "editora": "Companhia das Letras"},
+        {"titulo": "Capitães da Areia", "autor": "Jorge Amado", "ano": 1937, "genero": "Romance", "categoria": romance, "isbn": "9788535909814", "editora": "Companhia das Letras"},
     ]
     
     for livro_data in livros_data: